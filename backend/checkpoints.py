@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+# Per-task checkpoints for incremental report runs: where the last run stopped
+# in the input (byte offset / row count), what file it was (inode, head hash or
+# S3 ETag) and the handler's running state.
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_DIR = os.environ.get('REPORT_CHECKPOINT_DIR') or os.path.join(REPO_ROOT, 'resources', 'checkpoints')
+
+# Bytes hashed at the start of a file to detect in-place rewrites that keep the inode
+HEAD_BYTES = 4096
+
+
+def _path(task_id: str, report_type: str, directory: str) -> str:
+    safe = re.sub(r'[^\w.\-]', '_', f"{task_id}--{report_type}")
+    return os.path.join(directory, safe + '.json')
+
+
+def load(task_id: str, report_type: str, directory: str = DEFAULT_DIR) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_path(task_id, report_type, directory), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def save(task_id: str, report_type: str, checkpoint: Dict[str, Any], directory: str = DEFAULT_DIR):
+    path = _path(task_id, report_type, directory)
+    os.makedirs(directory, exist_ok=True)
+    checkpoint = dict(checkpoint, updated=datetime.utcnow().isoformat() + "Z")
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def clear(task_id: str, report_type: str, directory: str = DEFAULT_DIR):
+    try:
+        os.remove(_path(task_id, report_type, directory))
+    except OSError:
+        pass
+
+
+def head_hash(path: str, length: int) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read(min(length, HEAD_BYTES))).hexdigest()
+
+
+def local_resume_offset(path: str, checkpoint: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Return the checkpoint if `path` is the same file grown by appends, else None (full rescan)."""
+    if not checkpoint or checkpoint.get('path') != os.path.realpath(path):
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    offset = int(checkpoint.get('offset') or 0)
+    if st.st_ino != checkpoint.get('inode') or st.st_size < offset:
+        return None
+    if head_hash(path, offset) != checkpoint.get('headHash'):
+        return None
+    return checkpoint
@@ -0,0 +1,101 @@
+import hashlib
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+# Process-wide pool of AWS clients and keep-alive HTTP sessions. Lambda keeps
+# module state between warm invocations and the local scheduler runs tasks in
+# threads of one process, so both reuse connections and resolved credentials.
+# boto3 and requests are imported when the first client/session is built, so
+# importing this module costs nothing on cold start.
+
+DEFAULT_POOL_SIZE = 10
+
+
+def _fingerprint(credentials: Optional[Dict[str, str]]) -> str:
+    if not credentials:
+        return "default-chain"
+    raw = "\0".join(credentials.get(k) or "" for k in ("aws_access_key_id", "aws_secret_access_key", "aws_session_token"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ClientPool:
+    def __init__(self, max_pool_connections: int = DEFAULT_POOL_SIZE, http_pool_size: int = DEFAULT_POOL_SIZE):
+        self.max_pool_connections = max_pool_connections
+        self.http_pool_size = http_pool_size
+        # (service, region, endpoint, config, credential fingerprint) -> client
+        self._clients: Dict[Tuple[str, str, str, str, str], Any] = {}
+        self._session = None
+        self._lock = threading.Lock()
+        self.stats = {"clientsCreated": 0, "clientsRebuilt": 0, "sessionsCreated": 0}
+
+    def configure(self, max_pool_connections: Optional[int] = None, http_pool_size: Optional[int] = None):
+        """Change pool sizes; clients and sessions built afterwards pick them up."""
+        with self._lock:
+            if max_pool_connections and max_pool_connections != self.max_pool_connections:
+                self.max_pool_connections = max_pool_connections
+                self._clients.clear()
+            if http_pool_size and http_pool_size != self.http_pool_size:
+                self.http_pool_size = http_pool_size
+                self._session = None
+
+    def client(self, service: str, region: str, credentials: Optional[Dict[str, str]] = None,
+               endpoint_url: Optional[str] = None, **config_kwargs):
+        """Return a cached boto3 client, rebuilding it when the explicit credentials change.
+
+        Callers with explicit credentials and callers on the default credential
+        chain get separate clients, so alternating between them reuses both.
+        Clients built from the default credential chain rely on botocore's own
+        refresh; call invalidate() after an expired-token error to force a rebuild.
+        """
+        try:
+            import boto3
+            from botocore.config import Config as BotoConfig
+        except Exception:
+            raise RuntimeError("boto3 is not installed")
+        fp = _fingerprint(credentials)
+        base = (service, region or "", endpoint_url or "", repr(sorted(config_kwargs.items())))
+        key = base + (fp,)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                return client
+            # rotated explicit credentials replace the client built from the previous ones
+            stale = [k for k in self._clients if k[:4] == base and k[4] != "default-chain" and fp != "default-chain"]
+            for k in stale:
+                del self._clients[k]
+            cfg = BotoConfig(max_pool_connections=self.max_pool_connections, **config_kwargs)
+            # boto3.Session is not thread-safe; build each client from its own session under the lock
+            session = boto3.session.Session(**(credentials or {}))
+            client = session.client(service, region_name=region, endpoint_url=endpoint_url or None, config=cfg)
+            self._clients[key] = client
+            self.stats["clientsRebuilt" if stale else "clientsCreated"] += 1
+            return client
+
+    def invalidate(self, service: Optional[str] = None):
+        with self._lock:
+            for key in [k for k in self._clients if service is None or k[0] == service]:
+                del self._clients[key]
+
+    def http_session(self):
+        """Shared requests.Session with a sized keep-alive connection pool."""
+        try:
+            import requests
+            from requests.adapters import HTTPAdapter
+        except Exception:
+            raise RuntimeError("requests is not installed")
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.http_pool_size, pool_maxsize=self.http_pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+                self.stats["sessionsCreated"] += 1
+            return self._session
+
+
+_pool = ClientPool()
+
+
+def get_pool() -> ClientPool:
+    return _pool
@@ -0,0 +1,114 @@
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+
+# numpy is imported by available() on first use, not at import time
+np = None
+_np_missing = False
+
+# Optional columnar execution: rows are decoded into typed NumPy arrays in
+# fixed-size batches so handlers can use vectorized predicates and reductions.
+
+DEFAULT_BATCH_SIZE = 65536
+
+# column name -> logical type; handlers declare their own via COLUMNAR_SCHEMA
+DEFAULT_SCHEMA: Dict[str, str] = {"amount": "float64", "date": "datetime64[D]", "account": "str"}
+
+
+def available() -> bool:
+    global np, _np_missing
+    if np is None and not _np_missing:
+        try:
+            import numpy
+            np = numpy
+        except Exception:
+            _np_missing = True
+    return np is not None
+
+
+class ColumnBatch:
+    """A slice of the input: typed column arrays plus the raw rows they came from.
+
+    `offset` is the global index of the first row, so handlers can report
+    row indexes that match the row-at-a-time path.
+    """
+
+    def __init__(self, offset: int, rows: List[Dict[str, Any]], columns: Dict[str, Any]):
+        self.offset = offset
+        self.rows = rows
+        self.columns = columns
+        self.size = len(rows)
+
+    def __getitem__(self, name: str):
+        return self.columns[name]
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def _as_float(v) -> float:
+    if isinstance(v, (int, float)):
+        return float(v)
+    return float("nan")
+
+
+def _as_int(v) -> int:
+    if isinstance(v, (int, float)):
+        return int(v)
+    return 0
+
+
+def _as_date(v) -> str:
+    if isinstance(v, str) and len(v) >= 10:
+        return v[:10]
+    return "NaT"
+
+
+def _as_str(v) -> str:
+    if v is None:
+        return ""
+    return v if isinstance(v, str) else str(v)
+
+
+def _decode_column(rows: List[Any], name: str, kind: str, n: int):
+    values = (row.get(name) if isinstance(row, dict) else None for row in rows)
+    if kind == "float64":
+        return np.fromiter((_as_float(v) for v in values), dtype=np.float64, count=n)
+    if kind == "int64":
+        return np.fromiter((_as_int(v) for v in values), dtype=np.int64, count=n)
+    if kind.startswith("datetime64"):
+        dates = [_as_date(v) for v in values]
+        try:
+            return np.array(dates, dtype=kind)
+        except ValueError:
+            out = np.empty(n, dtype=kind)
+            for i, d in enumerate(dates):
+                try:
+                    out[i] = np.datetime64(d)
+                except ValueError:
+                    out[i] = np.datetime64("NaT")
+            return out
+    return np.array([_as_str(v) for v in values], dtype=str)
+
+
+def iter_batches(rows: Iterable[Dict[str, Any]], schema: Optional[Dict[str, str]] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[ColumnBatch]:
+    """Decode a row iterator into ColumnBatch objects of at most batch_size rows."""
+    if not available():
+        raise RuntimeError("numpy is required for the columnar engine")
+    schema = schema or DEFAULT_SCHEMA
+    batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+    offset = 0
+    chunk: List[Dict[str, Any]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= batch_size:
+            yield _make_batch(offset, chunk, schema)
+            offset += len(chunk)
+            chunk = []
+    if chunk:
+        yield _make_batch(offset, chunk, schema)
+
+
+def _make_batch(offset: int, chunk: List[Dict[str, Any]], schema: Dict[str, str]) -> ColumnBatch:
+    n = len(chunk)
+    columns = {name: _decode_column(chunk, name, kind, n) for name, kind in schema.items()}
+    return ColumnBatch(offset, chunk, columns)
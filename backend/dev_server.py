@@ -0,0 +1,183 @@
+import json
+import logging
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Any, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+from backend import metrics
+
+# Local dev/API server: one thread per connection (bounded), HTTP/1.1 keep-alive,
+# path routing and graceful shutdown. Requests are delegated to lambda_handler
+# with an API Gateway-like event so local behaviour matches the deployed Lambda.
+# Stream routes answer with server-sent events (chunked) from a stream handler.
+
+logger = logging.getLogger("handler")
+
+ROUTES = ("/", "/chat", "/upload", "/presign")
+# GET routes served by the dev server itself
+GET_ROUTES = ("/metrics",)
+# POST routes answered as text/event-stream by the stream handler
+STREAM_ROUTES = ("/chat/stream", "/stream")
+
+
+class DevServer(ThreadingHTTPServer):
+    # join in-flight request threads on server_close() so shutdown drains them
+    daemon_threads = False
+    block_on_close = True
+    request_queue_size = 128
+
+    def __init__(self, address, handler_cls, lambda_handler: Callable[[Dict[str, Any], Any], Dict[str, Any]],
+                 max_workers: int = 32, keepalive_timeout: float = 15.0,
+                 stream_handler: Optional[Callable[[Dict[str, Any]], Iterator[Tuple[str, Dict[str, Any]]]]] = None):
+        super().__init__(address, handler_cls)
+        self.lambda_handler = lambda_handler
+        self.stream_handler = stream_handler
+        self.keepalive_timeout = keepalive_timeout
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def process_request(self, request, client_address):
+        # cap concurrent connections; extra clients wait in the listen backlog
+        self._slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
+
+class DevHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        # idle keep-alive connections are closed after this many seconds to free worker slots
+        self.timeout = self.server.keepalive_timeout
+        super().setup()
+
+    def _send(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_OPTIONS(self):
+        self._send(200, b"", {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type",
+        })
+
+    def _not_found(self, path: str):
+        self._send(404, json.dumps({"ok": False, "error": f"No route for {path}"}).encode("utf-8"),
+                   {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"})
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.rstrip("/") or "/"
+        if path == "/metrics":
+            body = metrics.render_prometheus().encode("utf-8")
+            self._send(200, body, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+            return
+        self._not_found(path)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, event: Dict[str, Any]):
+        # SSE over chunked encoding keeps the connection reusable once the reply is complete
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = self.server.stream_handler(event)
+        try:
+            with metrics.span("http.stream"):
+                try:
+                    for name, data in events:
+                        self._write_chunk(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+                except (BrokenPipeError, ConnectionResetError):
+                    raise
+                except Exception as e:
+                    logger.exception("Stream for %s failed", event.get("path"))
+                    metrics.incr("http.errors")
+                    self._write_chunk(f"event: error\ndata: {json.dumps({'ok': False, 'error': str(e)})}\n\n"
+                                      .encode("utf-8"))
+                self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # client went away; closing the generator stops the upstream model stream
+            self.close_connection = True
+        finally:
+            events.close()
+
+    def do_POST(self):
+        path = urlsplit(self.path).path.rstrip("/") or "/"
+        length = int(self.headers.get("content-length", 0))
+        body = self.rfile.read(length)
+        streaming = path in STREAM_ROUTES and self.server.stream_handler is not None
+        if path not in ROUTES and not streaming:
+            self._not_found(path)
+            return
+        event = {"body": body.decode("utf-8"), "path": path, "httpMethod": "POST", "headers": dict(self.headers)}
+        if streaming:
+            metrics.incr("http.requests")
+            self._stream(event)
+            return
+        metrics.incr("http.requests")
+        try:
+            with metrics.span("http.request"):
+                resp = self.server.lambda_handler(event, None)
+        except Exception as e:
+            logger.exception("Request to %s failed", path)
+            resp = {"statusCode": 500, "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+                    "body": json.dumps({"ok": False, "error": str(e)})}
+        if resp.get("statusCode", 200) >= 500:
+            metrics.incr("http.errors")
+        self._send(resp.get("statusCode", 200), resp.get("body", "").encode("utf-8"), resp.get("headers", {}))
+
+    def log_message(self, fmt, *args):
+        logger.debug("%s - %s", self.address_string(), fmt % args)
+
+
+def serve(lambda_handler: Callable[[Dict[str, Any], Any], Dict[str, Any]], host: str = "0.0.0.0", port: int = 8000,
+          max_workers: int = 32, keepalive_timeout: float = 15.0,
+          stream_handler: Optional[Callable[[Dict[str, Any]], Iterator[Tuple[str, Dict[str, Any]]]]] = None):
+    """Run the dev server until SIGINT/SIGTERM, then drain in-flight requests."""
+    server = DevServer((host, port), DevHandler, lambda_handler, max_workers=max_workers,
+                       keepalive_timeout=keepalive_timeout, stream_handler=stream_handler)
+
+    def _stop(signum, frame):
+        logger.info("Shutting down dev server (signal %s); waiting for in-flight requests", signum)
+        # shutdown() blocks until serve_forever returns, so it cannot run on the serving thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    for sig in (signal.SIGINT, getattr(signal, "SIGTERM", None)):
+        if sig is not None:
+            try:
+                signal.signal(sig, _stop)
+            except ValueError:
+                pass  # not on the main thread
+    streams = ", ".join(STREAM_ROUTES) if stream_handler else "none"
+    logger.info("Starting local dev server at http://%s:%s (POST %s; SSE %s; GET %s; max_workers=%s)", host, port,
+                ", ".join(ROUTES), streams, ", ".join(GET_ROUTES), max_workers)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        logger.info("Dev server stopped")
+
+
+if __name__ == "__main__":
+    from backend.handler import run_dev_server
+    run_dev_server()
@@ -0,0 +1,98 @@
+import base64
+import json
+import struct
+import zlib
+from typing import Dict, Any, Iterable, Iterator, Tuple
+
+# AWS event stream framing (application/vnd.amazon.eventstream), as returned by
+# Bedrock's invoke-with-response-stream when it is called over plain HTTPS
+# (bearer tokens) instead of through botocore, which decodes it itself.
+#
+# Each message: total length (4 bytes), headers length (4), prelude CRC32 (4),
+# headers, payload, message CRC32 (4); integers are big-endian. Headers are
+# name length (1), name, value type (1) and a type-specific value.
+
+_PRELUDE = struct.Struct(">III")
+# fixed-size header value types -> byte width (0/1 are booleans without a value)
+_FIXED = {0: 0, 1: 0, 2: 1, 3: 2, 4: 4, 5: 8, 8: 8, 9: 16}
+
+
+class EventStreamError(Exception):
+    """A malformed frame, or an exception message sent by the service."""
+
+
+def _headers(data: bytes) -> Dict[str, Any]:
+    headers: Dict[str, Any] = {}
+    pos = 0
+    while pos < len(data):
+        n = data[pos]
+        name = data[pos + 1:pos + 1 + n].decode("utf-8")
+        pos += 1 + n
+        kind = data[pos]
+        pos += 1
+        if kind in (6, 7):
+            size = int.from_bytes(data[pos:pos + 2], "big")
+            value = data[pos + 2:pos + 2 + size]
+            headers[name] = value.decode("utf-8") if kind == 7 else value
+            pos += 2 + size
+        elif kind in _FIXED:
+            size = _FIXED[kind]
+            headers[name] = kind == 0 if kind < 2 else int.from_bytes(data[pos:pos + size], "big", signed=kind != 9)
+            pos += size
+        else:
+            raise EventStreamError(f"unknown header value type {kind}")
+    return headers
+
+
+def iter_messages(chunks: Iterable[bytes]) -> Iterator[Tuple[Dict[str, Any], bytes]]:
+    """(headers, payload) for every complete message in a stream of byte chunks."""
+    buf = bytearray()
+    for chunk in chunks:
+        buf += chunk
+        while len(buf) >= 16:
+            total, header_len, prelude_crc = _PRELUDE.unpack_from(buf)
+            if zlib.crc32(bytes(buf[:8])) != prelude_crc:
+                raise EventStreamError("prelude checksum mismatch")
+            if len(buf) < total:
+                break
+            message = bytes(buf[:total])
+            del buf[:total]
+            if zlib.crc32(message[:-4]) != int.from_bytes(message[-4:], "big"):
+                raise EventStreamError("message checksum mismatch")
+            yield _headers(message[12:12 + header_len]), message[12 + header_len:-4]
+    if buf:
+        raise EventStreamError(f"stream ended inside a message ({len(buf)} bytes left)")
+
+
+def iter_chunks(chunks: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """Decoded JSON of each Bedrock "chunk" event; service exceptions are raised."""
+    for headers, payload in iter_messages(chunks):
+        kind = headers.get(":message-type")
+        if kind == "exception" or kind == "error":
+            name = headers.get(":exception-type") or headers.get(":error-code") or "error"
+            try:
+                detail = json.loads(payload).get("message") or payload.decode("utf-8", "replace")
+            except Exception:
+                detail = payload.decode("utf-8", "replace")
+            raise EventStreamError(f"{name}: {detail}")
+        if headers.get(":event-type") != "chunk":
+            continue
+        body = json.loads(payload)
+        yield json.loads(base64.b64decode(body["bytes"])) if "bytes" in body else body
+
+
+def encode_message(headers: Dict[str, str], payload: bytes) -> bytes:
+    """One frame with string headers (what a Bedrock-compatible mock server sends)."""
+    raw = b"".join(bytes([len(k)]) + k.encode("utf-8") + b"\x07" + len(v.encode("utf-8")).to_bytes(2, "big")
+                   + v.encode("utf-8") for k, v in headers.items())
+    total = 12 + len(raw) + len(payload) + 4
+    prelude = struct.pack(">II", total, len(raw))
+    prelude += zlib.crc32(prelude).to_bytes(4, "big")
+    message = prelude + raw + payload
+    return message + zlib.crc32(message).to_bytes(4, "big")
+
+
+def encode_chunk(event: Dict[str, Any]) -> bytes:
+    payload = json.dumps({"bytes": base64.b64encode(json.dumps(event).encode("utf-8")).decode("ascii")})
+    return encode_message({":event-type": "chunk", ":content-type": "application/json", ":message-type": "event"},
+                          payload.encode("utf-8"))
@@ -2,30 +2,51 @@ import os
 import sys
 import json
 import logging
-import boto3
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import functools
+import importlib.util
 from datetime import datetime
 import uuid
 from urllib.parse import quote
 import base64
 import re
+import time
+from typing import Iterator, Tuple
 
 # Ensure repository root on sys.path for imports when running directly
 REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if REPO_ROOT not in sys.path:
     sys.path.insert(0, REPO_ROOT)
 
-# Optional external dependencies
-try:
-    import requests  # for bearer token flow (not mandatory)
-except Exception:
-    requests = None
+# Cold start: boto3/requests are imported by backend.clients on first use and
+# report_executor (with numpy/pyarrow/openpyxl behind it) on the first
+# [Run Report], so [Task Status] and [Task Scheduler] load none of them.
+# backend.retrieval is likewise imported by the upload and attachment paths only.
+from backend import metrics
+from backend.clients import get_pool
+from backend.notification_store import get_store as get_notification_store
+from backend.task_store import get_store as get_task_store
+from backend.response_cache import ResponseCache, make_key
+from backend.singleflight import SingleFlight
 
-# Import report executor (used for [Run Report])
-try:
-    from backend.report_executor import execute as execute_report
-except Exception:
-    execute_report = None
+execute_report = None
+
+
+def _report_executor():
+    """Import report_executor on first use; None when it cannot be loaded."""
+    global execute_report
+    if execute_report is None:
+        try:
+            from backend.report_executor import execute
+        except Exception as e:
+            logger.warning('Report executor unavailable: %s', e)
+            return None
+        execute_report = execute
+    return execute_report
+
+
+@functools.lru_cache(maxsize=None)
+def _module_available(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
 
 # Logger setup
 logger = logging.getLogger("handler")
@@ -53,32 +74,64 @@ def _cfg(key, default=''):
     return os.environ.get(key, default)
 
 
-def _bool_cfg(key, default=False):
-    val = _cfg(key, None)
+def as_bool(val, default=False):
+    """Parse a flag from config, a request body or tasks.json ("false", "0", 1, true...)."""
     if val is None:
         return default
     if isinstance(val, bool):
         return val
     if isinstance(val, str):
-        return val.lower() in ('1', 'true', 'yes', 'on')
+        return val.strip().lower() in ('1', 'true', 'yes', 'on')
     try:
         return bool(int(val))
     except Exception:
         return default
 
+
+# Parsed flags/ints are cached for the life of the process (a Lambda container);
+# credentials go through _cfg on every call so rotated keys are still picked up.
+@functools.lru_cache(maxsize=None)
+def _bool_cfg(key, default=False):
+    return as_bool(_cfg(key, None), default)
+
 AWS_ACCESS_KEY_ID = _cfg('AWS_ACCESS_KEY_ID') or ''
 AWS_SECRET_ACCESS_KEY = _cfg('AWS_SECRET_ACCESS_KEY') or ''
 AWS_SESSION_TOKEN = _cfg('AWS_SESSION_TOKEN') or ''
 AWS_REGION = _cfg('AWS_REGION') or 'us-east-1'
 BEDROCK_MODEL_ID = _cfg('BEDROCK_MODEL_ID') or 'deepseek-chat:1.0'
+# Optional endpoint override, e.g. a local stub for tests and benchmarks
+BEDROCK_ENDPOINT_URL = _cfg('BEDROCK_ENDPOINT_URL') or ''
+
+
+@functools.lru_cache(maxsize=None)
+def _int_cfg(key, default):
+    try:
+        return int(_cfg(key, default) or default)
+    except Exception:
+        return default
+
+
+# Connection pools shared across lambda_handler invocations and scheduler threads
+get_pool().configure(max_pool_connections=_int_cfg('BEDROCK_MAX_POOL_CONNECTIONS', 10),
+                     http_pool_size=_int_cfg('HTTP_POOL_SIZE', 10))
+
+# Response cache for identical model calls; RESPONSE_CACHE_PATH enables the on-disk tier
+response_cache = ResponseCache(ttl=_int_cfg('RESPONSE_CACHE_TTL', 300),
+                               max_entries=_int_cfg('RESPONSE_CACHE_MAX_ENTRIES', 1024),
+                               max_bytes=_int_cfg('RESPONSE_CACHE_MAX_BYTES', 16 * 1024 * 1024),
+                               disk_path=_cfg('RESPONSE_CACHE_PATH') or None)
+# Identical prompts in flight at the same time (e.g. one scheduler tick) share one model call
+inflight_calls = SingleFlight()
 
 RESULTS_DIR = os.path.join(REPO_ROOT, 'results')
 RESOURCES_DIR = os.path.join(REPO_ROOT, 'resources')
 USER_STORAGE_DIR = os.path.join(REPO_ROOT, 'UserStorage')
 TASKS_PATH = os.path.join(REPO_ROOT, 'tasks.json')
 TASKS_FALLBACK_PATH = os.path.join(RESOURCES_DIR, 'tasks.json')
+TASKS_DB_PATH = os.path.join(RESOURCES_DIR, 'tasks.db')
 SCHEDULER_STATE_PATH = os.path.join(RESOURCES_DIR, 'scheduler_state.json')
-NOTIFICATIONS_PATH = os.path.join(RESOURCES_DIR, 'notifications.json')
+NOTIFICATIONS_DB_PATH = os.path.join(RESOURCES_DIR, 'notifications.db')
+RETRIEVAL_DB_PATH = os.path.join(RESOURCES_DIR, 'retrieval.db')
 
 
 def _ensure_parent_dir(path: str):
@@ -99,17 +152,23 @@ def _extract_bearer_token(raw: str) -> str:
     return token.strip()
 
 
+def _bedrock_base_url() -> str:
+    if BEDROCK_ENDPOINT_URL:
+        return BEDROCK_ENDPOINT_URL.rstrip('/')
+    return f"https://bedrock-runtime.{AWS_REGION}.amazonaws.com"
+
+
 def _invoke_with_bearer(model_id: str, payload: dict, token: str):
-    if not requests:
+    if not _module_available('requests'):
         return {"ok": False, "model_response": f"(mock) echo: {payload['messages'][-1]['content']}"}
     token = _extract_bearer_token(token)
     if not token:
         return {"ok": False, "model_response": f"(mock) echo: {payload['messages'][-1]['content']}"}
     encoded_model = quote(model_id, safe='')
-    url = f"https://bedrock-runtime.{AWS_REGION}.amazonaws.com/model/{encoded_model}/invoke"
+    url = f"{_bedrock_base_url()}/model/{encoded_model}/invoke"
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
     try:
-        resp = requests.post(url, data=json.dumps(payload), headers=headers, timeout=60)
+        resp = get_pool().http_session().post(url, data=json.dumps(payload), headers=headers, timeout=60)
         resp.raise_for_status()
         try:
             body = resp.json()
@@ -121,50 +180,251 @@ def _invoke_with_bearer(model_id: str, payload: dict, token: str):
         return {"ok": False, "model_response": f"(mock) echo: {payload['messages'][-1]['content']}", "error": str(e)}
 
 
-def call_bedrock(prompt: str):
-    """Invoke Bedrock or return mock if not available. Removes previous garbled strings."""
-    # Mock mode
-    if _bool_cfg('BEDROCK_MOCK') or _bool_cfg('USE_MOCK_BEDROCK') or os.environ.get('BEDROCK_MOCK') == '1':
-        return {"ok": False, "model_response": f"(mock) echo: {prompt}"}
+def _aws_credentials():
+    # Read on every call so rotated keys (env.json or environment) rebuild the pooled client
+    access_key = _cfg('AWS_ACCESS_KEY_ID') or ''
+    secret_key = _cfg('AWS_SECRET_ACCESS_KEY') or ''
+    if not (access_key and secret_key):
+        return None
+    return {"aws_access_key_id": access_key, "aws_secret_access_key": secret_key,
+            "aws_session_token": _cfg('AWS_SESSION_TOKEN') or None}
 
-    payload = {
-        "messages": [{"role": "你是一个AI会计助手", "content": prompt}],
-        "temperature": 0.5,
-        "top_p": 0.9,
-        "max_tokens": 500
-    }
 
-    bearer_raw = _cfg('AWS_BEARER_TOKEN_BEDROCK') or os.environ.get('AWS_BEARER_TOKEN_BEDROCK', '')
-    if bearer_raw:
-        return _invoke_with_bearer(BEDROCK_MODEL_ID, payload, bearer_raw)
-
-    client = None
+def _bedrock_client():
+    pool = get_pool()
     try:
-        if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY:
-            client = boto3.client('bedrock-runtime',
-                                  aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                  aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                                  aws_session_token=AWS_SESSION_TOKEN or None,
-                                  region_name=AWS_REGION)
-        else:
-            client = boto3.client('bedrock-runtime', region_name=AWS_REGION)
-        logger.info('Created bedrock-runtime client')
+        return pool.client('bedrock-runtime', AWS_REGION, _aws_credentials(), BEDROCK_ENDPOINT_URL or None)
     except Exception as e:
         logger.warning('Failed to create bedrock-runtime client: %s', e)
         try:
-            client = boto3.client('bedrock', region_name=AWS_REGION)
+            client = pool.client('bedrock', AWS_REGION)
             logger.info('Created legacy bedrock client')
+            return client
         except Exception as e2:
             logger.warning('Could not create any Bedrock client: %s', e2)
+            return None
+
+
+_EXPIRED_CREDENTIAL_CODES = ('ExpiredToken', 'ExpiredTokenException', 'UnrecognizedClientException', 'InvalidClientTokenId')
+
+
+def _invoke_with_client(model_id: str, payload: dict):
+    prompt = payload['messages'][-1]['content']
+    for attempt in range(2):
+        client = _bedrock_client()
+        if client is None:
             return {"ok": False, "model_response": f"(mock) echo: {prompt}"}
+        try:
+            resp = client.invoke_model(modelId=model_id, contentType="application/json", body=json.dumps(payload))
+            raw = resp['body'].read().decode('utf-8')
+            return {"ok": True, "model_response": raw}
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code', '')
+            if attempt == 0 and code in _EXPIRED_CREDENTIAL_CODES:
+                # credentials rotated underneath the cached client; rebuild once and retry
+                logger.info('Bedrock credentials rejected (%s); rebuilding client', code)
+                get_pool().invalidate('bedrock-runtime')
+                continue
+            logger.warning('Bedrock invocation failed: %s', e)
+            return {"ok": False, "error": str(e), "model_response": f"(mock) echo: {prompt}"}
+
+
+def call_bedrock(prompt: str, cache: bool = True, cache_ttl=None, temperature: float = 0.5, top_p: float = 0.9, max_tokens: int = 500):
+    """Invoke Bedrock or return mock if not available. Removes previous garbled strings.
+
+    Successful responses are cached per (model, prompt, generation params);
+    pass cache=False to always call the model.
+    """
+    metrics.incr("bedrock.requests")
+    with metrics.span("bedrock.call"):
+        return _call_bedrock(prompt, cache, cache_ttl, temperature, top_p, max_tokens)
+
+
+def _mock_mode() -> bool:
+    return _bool_cfg('BEDROCK_MOCK') or _bool_cfg('USE_MOCK_BEDROCK') or os.environ.get('BEDROCK_MOCK') == '1'
+
+
+def _payload(prompt: str, temperature: float, top_p: float, max_tokens: int) -> dict:
+    return {
+        "messages": [{"role": "你是一个AI会计助手", "content": prompt}],
+        "temperature": temperature,
+        "top_p": top_p,
+        "max_tokens": max_tokens
+    }
+
+
+def _call_bedrock(prompt: str, cache: bool, cache_ttl, temperature: float, top_p: float, max_tokens: int):
+    # Mock mode
+    if _mock_mode():
+        return {"ok": False, "model_response": f"(mock) echo: {prompt}"}
+
+    payload = _payload(prompt, temperature, top_p, max_tokens)
+
+    use_cache = cache and _bool_cfg('RESPONSE_CACHE', True)
+    key = make_key(BEDROCK_MODEL_ID, prompt, {"temperature": temperature, "top_p": top_p, "max_tokens": max_tokens})
+    if use_cache:
+        hit = response_cache.get(key)
+        if hit is not None:
+            metrics.incr("bedrock.cache_hits")
+            hit["cached"] = True
+            return hit
+
+    def _invoke():
+        bearer_raw = _cfg('AWS_BEARER_TOKEN_BEDROCK') or os.environ.get('AWS_BEARER_TOKEN_BEDROCK', '')
+        metrics.incr("bedrock.model_calls")
+        with metrics.span("bedrock.invoke"):
+            if bearer_raw:
+                out = _invoke_with_bearer(BEDROCK_MODEL_ID, payload, bearer_raw)
+            else:
+                out = _invoke_with_client(BEDROCK_MODEL_ID, payload)
+        if not out.get("ok"):
+            metrics.incr("bedrock.errors")
+        if use_cache and out.get("ok"):
+            response_cache.put(key, out, cache_ttl)
+        return out
+
+    if not _bool_cfg('COALESCE_REQUESTS', True):
+        return _invoke()
+    result, shared = inflight_calls.do(key, _invoke)
+    # every caller gets its own copy so per-task bookkeeping never leaks between tasks
+    result = dict(result)
+    if shared:
+        metrics.incr("bedrock.coalesced")
+        result["coalesced"] = True
+    return result
+
+
+def _delta_text(event: dict) -> str:
+    """Text carried by one response-stream chunk (OpenAI-style, Anthropic, Titan and Llama shapes)."""
+    choices = event.get('choices')
+    if choices:
+        choice = choices[0]
+        return (choice.get('delta') or {}).get('content') or choice.get('text') or ''
+    delta = event.get('delta')
+    if isinstance(delta, dict):
+        return delta.get('text') or ''
+    for field in ('outputText', 'generation', 'completion'):
+        if isinstance(event.get(field), str):
+            return event[field]
+    return ''
+
+
+def _stream_with_bearer(model_id: str, payload: dict, token: str) -> Iterator[dict]:
+    if not _module_available('requests'):
+        raise RuntimeError('requests is not installed')
+    token = _extract_bearer_token(token)
+    if not token:
+        raise RuntimeError('empty bearer token')
+    from backend.eventstream import iter_chunks
+    url = f"{_bedrock_base_url()}/model/{quote(model_id, safe='')}/invoke-with-response-stream"
+    headers = {"Content-Type": "application/json", "Accept": "application/vnd.amazon.eventstream",
+               "Authorization": f"Bearer {token}"}
+    # closing this generator early (client went away) closes the response and its connection
+    with get_pool().http_session().post(url, data=json.dumps(payload), headers=headers, timeout=(10, 60),
+                                        stream=True) as resp:
+        resp.raise_for_status()
+        # chunk_size=None hands over each chunk as it arrives instead of waiting for a full buffer
+        yield from iter_chunks(resp.iter_content(chunk_size=None))
 
+
+def _stream_with_client(model_id: str, payload: dict) -> Iterator[dict]:
+    for attempt in range(2):
+        client = _bedrock_client()
+        if client is None:
+            raise RuntimeError('no Bedrock client available')
+        try:
+            resp = client.invoke_model_with_response_stream(modelId=model_id, contentType="application/json",
+                                                            accept="application/json", body=json.dumps(payload))
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code', '')
+            if attempt == 0 and code in _EXPIRED_CREDENTIAL_CODES:
+                logger.info('Bedrock credentials rejected (%s); rebuilding client', code)
+                get_pool().invalidate('bedrock-runtime')
+                continue
+            raise
+        stream = resp['body']
+        try:
+            for event in stream:
+                chunk = event.get('chunk')
+                if chunk:
+                    yield json.loads(chunk['bytes'])
+                elif event:
+                    # modelStreamErrorException, throttlingException, ... arrive as events
+                    raise RuntimeError(f"{next(iter(event))}: {json.dumps(next(iter(event.values())), default=str)}")
+        finally:
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+        return
+
+
+def stream_bedrock(prompt: str, cache: bool = True, cache_ttl=None, temperature: float = 0.5, top_p: float = 0.9,
+                   max_tokens: int = 500, status: dict = None) -> Iterator[str]:
+    """Yield the model reply as text deltas as they arrive (invoke_model_with_response_stream).
+
+    The bearer-token path reads the same endpoint's event stream over HTTPS.
+    The joined reply is cached like call_bedrock's results, so a repeated
+    prompt is replayed in one piece. `status` receives ok/error/cached; on
+    failure before the first token the mock echo is yielded, as call_bedrock
+    returns it.
+    """
+    status = {} if status is None else status
+    metrics.incr("bedrock.requests")
+    started = time.perf_counter()
+    first = True
+    with metrics.span("bedrock.stream"):
+        for text in _stream_bedrock(prompt, cache, cache_ttl, temperature, top_p, max_tokens, status):
+            if first:
+                metrics.record_span("bedrock.first_token", time.perf_counter() - started)
+                first = False
+            yield text
+
+
+def _stream_bedrock(prompt: str, cache: bool, cache_ttl, temperature: float, top_p: float, max_tokens: int,
+                    status: dict) -> Iterator[str]:
+    if _mock_mode():
+        # word by word with a delay, so the UI and clients can be exercised without a model
+        status["ok"] = False
+        delay = _int_cfg('BEDROCK_MOCK_STREAM_DELAY_MS', 20) / 1000.0
+        for i, word in enumerate(re.findall(r'\S+\s*|\s+', f"(mock) echo: {prompt}")):
+            if delay and i:
+                time.sleep(delay)
+            yield word
+        return
+
+    payload = _payload(prompt, temperature, top_p, max_tokens)
+    use_cache = cache and _bool_cfg('RESPONSE_CACHE', True)
+    key = make_key(BEDROCK_MODEL_ID, prompt, {"temperature": temperature, "top_p": top_p, "max_tokens": max_tokens,
+                                              "stream": True})
+    if use_cache:
+        hit = response_cache.get(key)
+        if hit is not None:
+            metrics.incr("bedrock.cache_hits")
+            status.update(ok=True, cached=True)
+            yield hit["model_response"]
+            return
+
+    bearer_raw = _cfg('AWS_BEARER_TOKEN_BEDROCK') or os.environ.get('AWS_BEARER_TOKEN_BEDROCK', '')
+    metrics.incr("bedrock.model_calls")
+    parts = []
     try:
-        resp = client.invoke_model(modelId=BEDROCK_MODEL_ID, contentType="application/json", body=json.dumps(payload))
-        raw = resp['body'].read().decode('utf-8')
-        return {"ok": True, "model_response": raw}
+        events = (_stream_with_bearer(BEDROCK_MODEL_ID, payload, bearer_raw) if bearer_raw
+                  else _stream_with_client(BEDROCK_MODEL_ID, payload))
+        for event in events:
+            text = _delta_text(event)
+            if text:
+                parts.append(text)
+                yield text
     except Exception as e:
-        logger.warning('Bedrock invocation failed: %s', e)
-        return {"ok": False, "error": str(e), "model_response": f"(mock) echo: {prompt}"}
+        logger.warning('Bedrock streaming failed: %s', e)
+        metrics.incr("bedrock.errors")
+        status.update(ok=False, error=str(e))
+        if not parts:
+            yield f"(mock) echo: {prompt}"
+        return
+    status["ok"] = True
+    if use_cache:
+        response_cache.put(key, {"ok": True, "model_response": "".join(parts)}, cache_ttl)
 
 
 def _read_json(path: str, default):
@@ -175,28 +435,39 @@ def _read_json(path: str, default):
         return default
 
 
-def _write_json(path: str, obj):
-    _ensure_parent_dir(path)
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
-
-
 def _append_notification(message: dict):
-    existing = _read_json(NOTIFICATIONS_PATH, [])
-    existing.append(message)
-    _write_json(NOTIFICATIONS_PATH, existing)
+    try:
+        get_notification_store(NOTIFICATIONS_DB_PATH).append(message)
+    except Exception as e:
+        logger.warning('Failed to append notification: %s', e)
 
 
 def _find_tasks_file() -> str:
     return TASKS_PATH if os.path.exists(TASKS_PATH) else TASKS_FALLBACK_PATH
 
 
+def _task_store():
+    store = get_task_store(TASKS_DB_PATH)
+    # tasks.json stays an import format: hand edits are picked up when its mtime changes
+    try:
+        store.sync_json(_find_tasks_file())
+    except Exception as e:
+        logger.warning('Failed to import tasks.json: %s', e)
+    return store
+
+
 def _list_tasks():
     state = _read_json(SCHEDULER_STATE_PATH, {})
     jobs = state.get('jobs', {})
-    tasks_path = _find_tasks_file()
-    tasks = _read_json(tasks_path, [])
-    return {"jobs": jobs, "tasks": tasks, "source": tasks_path}
+    tasks = _task_store().list()
+    return {"jobs": jobs, "tasks": tasks, "source": TASKS_DB_PATH}
+
+
+_CRON_DAILY_RE = re.compile(r'^(\d{1,2}) (\d{1,2}) \* \* \*$')
+_CRON_WEEKLY_RE = re.compile(r'^(\d{1,2}) (\d{1,2}) \* \* (\d)$')
+_CRON_EVERY_N_MINUTES_RE = re.compile(r'^\*/\d+ \* \* \* \*$')
+_CRON_EVERY_N_HOURS_RE = re.compile(r'^\d{1,2} \*/\d+ \* \* \*$')
+_UNSAFE_FILENAME_RE = re.compile(r'[^\w.\- ]')
 
 
 def _cron_humanize(expr: str) -> str:
@@ -205,20 +476,20 @@ def _cron_humanize(expr: str) -> str:
         return 'Every minute (UTC)'
     if expr == '0 * * * *':
         return 'At minute 0 of every hour (UTC)'
-    m = re.match(r'^(\d{1,2}) (\d{1,2}) \* \* \*$', expr)
+    m = _CRON_DAILY_RE.match(expr)
     if m:
         minute, hour = int(m.group(1)), int(m.group(2))
         return f'At {hour:02d}:{minute:02d} every day (UTC)'
-    m2 = re.match(r'^(\d{1,2}) (\d{1,2}) \* \* (\d)$', expr)
+    m2 = _CRON_WEEKLY_RE.match(expr)
     if m2:
         minute, hour, dow = int(m2.group(1)), int(m2.group(2)), int(m2.group(3))
         days = ['Sun','Mon','Tue','Wed','Thu','Fri','Sat']
         day = days[dow] if 0 <= dow <= 6 else f'day {dow}'
         return f'At {hour:02d}:{minute:02d} every {day} (UTC)'
-    if re.match(r'^\*/\d+ \* \* \* \*$', expr):
+    if _CRON_EVERY_N_MINUTES_RE.match(expr):
         n = int(expr.split()[0].split('/')[1])
         return f'Every {n} minute(s) (UTC)'
-    if re.match(r'^\d{1,2} \*/\d+ \* \* \*$', expr):
+    if _CRON_EVERY_N_HOURS_RE.match(expr):
         parts = expr.split()
         minute = parts[0]
         hours = int(parts[1].split('/')[1])
@@ -248,6 +519,14 @@ def _format_task_status_md(status: dict) -> str:
             human = _cron_humanize(cron_expr)
             prompt = (t.get('prompt') or '').strip().replace('\n', ' ')
             lines.append(f"- ID: `{tid}`\n  - Trigger: {human}\n  - Prompt: {prompt}\n  - Output: `{t.get('outputPath','')}`")
+    cache_stats = status.get('responseCache')
+    if cache_stats:
+        lines.append("")
+        lines.append("### Response Cache")
+        lines.append(f"- Hits: {cache_stats['hits'] + cache_stats['diskHits']} (disk {cache_stats['diskHits']}), misses: {cache_stats['misses']}, evictions: {cache_stats['evictions']}, entries: {cache_stats['entries']}")
+    coalescing = status.get('coalescing')
+    if coalescing:
+        lines.append(f"- Model calls: {coalescing['executed']}, coalesced duplicates: {coalescing['coalesced']}")
     lines.append("")
     return "\n".join(lines)
 
@@ -264,12 +543,9 @@ def _create_task_from_prompt(prompt: str):
     if not output_path:
         output_path = f"results/{task_id}-output.txt"
     new_task = {"taskId": task_id, "cron": cron, "enabled": True, "prompt": prompt, "outputPath": output_path}
-    tasks_path = _find_tasks_file()
-    tasks = _read_json(tasks_path, [])
-    tasks.append(new_task)
-    _write_json(tasks_path, tasks)
+    _task_store().add(new_task)
     _append_notification({"timestamp": datetime.utcnow().isoformat() + "Z", "taskId": task_id, "message": f"Task {task_id} created", "ok": True})
-    return new_task, tasks_path
+    return new_task, TASKS_DB_PATH
 
 
 def _extract_embedded_json(text: str):
@@ -283,21 +559,164 @@ def _extract_embedded_json(text: str):
     return None
 
 
-def lambda_handler(event, context):
+def _safe_filename(name: str) -> str:
+    name = os.path.basename((name or '').replace('\\', '/')).strip()
+    name = _UNSAFE_FILENAME_RE.sub('_', name)
+    return name.lstrip('.') or f"upload-{uuid.uuid4().hex[:8]}"
+
+
+def _handle_upload(data: dict):
+    filename = _safe_filename(data.get('filename'))
+    try:
+        content = base64.b64decode(data.get('contentBase64') or '', validate=True)
+    except Exception as e:
+        return 400, {"ok": False, "error": f"Invalid contentBase64: {e}"}
+    dest = os.path.join(USER_STORAGE_DIR, filename)
+    _ensure_parent_dir(dest)
+    with open(dest, 'wb') as f:
+        f.write(content)
+    rel = os.path.relpath(dest, REPO_ROOT).replace(os.sep, '/')
+    md = f"Uploaded `{filename}` ({len(content)} bytes) to `{rel}`"
+    out = {"ok": True, "name": filename, "path": rel, "size": len(content), "markdown": md}
+    if _bool_cfg('RETRIEVAL', True):
+        # index on upload so the first prompt that attaches the file only pays for the search
+        try:
+            from backend.retrieval import get_index as get_retrieval_index
+            with metrics.span("retrieval.index"):
+                out["indexed"] = get_retrieval_index(RETRIEVAL_DB_PATH).index_bytes(rel, content)
+        except Exception as e:
+            logger.warning('Failed to index %s: %s', rel, e)
+    return 200, out
+
+
+def _handle_presign(data: dict):
+    bucket = _cfg('UPLOAD_BUCKET') or ''
+    if not bucket:
+        return 400, {"ok": False, "error": "UPLOAD_BUCKET is not configured"}
+    key = (_cfg('UPLOAD_PREFIX') or '') + _safe_filename(data.get('filename'))
+    params = {"Bucket": bucket, "Key": key}
+    if data.get('contentType'):
+        params["ContentType"] = data['contentType']
+    try:
+        s3 = get_pool().client('s3', AWS_REGION, _aws_credentials())
+        url = s3.generate_presigned_url('put_object', Params=params, ExpiresIn=_int_cfg('PRESIGN_EXPIRES', 3600))
+    except Exception as e:
+        logger.warning('Presign failed: %s', e)
+        return 500, {"ok": False, "error": str(e)}
+    return 200, {"ok": True, "url": url, "bucket": bucket, "key": key, "method": "PUT"}
+
+
+_PATH_ROUTES = {"/upload": _handle_upload, "/presign": _handle_presign}
+
+
+def _attachment_keys(attachments) -> list:
+    # attachments are [{"name", "path"}] with repo-relative paths; only files inside UserStorage/ are read
+    storage = os.path.realpath(USER_STORAGE_DIR)
+    keys = []
+    for item in attachments if isinstance(attachments, list) else []:
+        if not isinstance(item, dict):
+            continue
+        rel = item.get('path') or os.path.join('UserStorage', _safe_filename(item.get('name')))
+        full = os.path.realpath(os.path.join(REPO_ROOT, rel))
+        if full.startswith(storage + os.sep) and os.path.isfile(full):
+            keys.append((full, os.path.relpath(full, REPO_ROOT).replace(os.sep, '/')))
+    return keys
+
+
+def _retrieve_context(prompt: str, attachments):
+    """Top-k attachment chunks relevant to prompt within RETRIEVAL_TOKEN_BUDGET, as (preamble, sources)."""
+    keys = _attachment_keys(attachments)
+    if not keys or not _bool_cfg('RETRIEVAL', True):
+        return "", []
+    from backend.retrieval import context_for, get_index as get_retrieval_index
+    index = get_retrieval_index(RETRIEVAL_DB_PATH)
+    with metrics.span("retrieval.search"):
+        for full, rel in keys:
+            # no-op when the upload already indexed this content
+            index.index_file(full, rel)
+        results = index.search(prompt, [rel for _, rel in keys], top_k=_int_cfg('RETRIEVAL_TOP_K', 5),
+                               token_budget=_int_cfg('RETRIEVAL_TOKEN_BUDGET', 1500))
+    metrics.incr("retrieval.chunks", len(results))
+    sources = [{"path": r["path"], "chunk": r["chunk"], "score": r["score"], "tokens": r["tokens"]} for r in results]
+    return context_for(results), sources
+
+
+def _model_prompt(prompt: str, data: dict):
+    """Prompt sent to the model and the attachment chunks it carries."""
+    # attached files contribute only their most relevant chunks, not their whole content
+    try:
+        context, sources = _retrieve_context(prompt, data.get("attachments"))
+    except Exception as e:
+        logger.warning('Attachment retrieval failed: %s', e)
+        context, sources = "", []
+    return (f"{context}\n\n{prompt}" if context else prompt), sources
+
+
+def _request_data(event):
     body = event.get("body") if isinstance(event, dict) else None
     if isinstance(body, str):
         try:
-            data = json.loads(body)
+            return json.loads(body)
         except Exception:
-            data = {"prompt": body}
-    else:
-        data = body or {}
+            return {"prompt": body}
+    return body or {}
+
+
+# prompts handled by lambda_handler itself rather than sent to the model
+_COMMAND_TAGS = ("[Task Status]", "[Task Sceduler]", "[Task Scheduler]", "[Run Report]")
+
+
+def stream_events(event) -> Iterator[Tuple[str, dict]]:
+    """Server-sent events for a chat request (dev server POST /chat/stream).
+
+    A model prompt yields ("token", {"text": ...}) per delta, ("error", ...) if
+    the model call failed, and then ("done", body) with the same fields as
+    lambda_handler's JSON response. Commands and
+    upload routes are not streamed: they yield a single "done".
+    """
+    data = _request_data(event)
+    prompt = data.get("prompt", "Hello from AI Accounting Agent") if isinstance(data, dict) else ""
+    if not isinstance(data, dict) or not isinstance(prompt, str) or any(tag in prompt for tag in _COMMAND_TAGS):
+        yield "done", json.loads(lambda_handler(event, None)["body"])
+        return
+    full_prompt, sources = _model_prompt(prompt, data)
+    status = {}
+    parts = []
+    # chat replies are not cached unless the request asks for it with "cache": true
+    for text in stream_bedrock(full_prompt, cache=as_bool(data.get("cache")), status=status):
+        parts.append(text)
+        yield "token", {"text": text}
+    if status.get("error"):
+        # the model call failed (before or during the reply); "done" still follows
+        yield "error", {"ok": False, "error": status["error"]}
+    reply = "".join(parts)
+    result = {"ok": bool(status.get("ok")), "model_response": reply}
+    for field in ("error", "cached"):
+        if status.get(field):
+            result[field] = status[field]
+    if sources:
+        result["retrieval"] = sources
+    result["markdown"] = "```\n" + reply + "\n```"
+    yield "done", result
+
+
+def lambda_handler(event, context):
+    data = _request_data(event)
+
+    # API Gateway (and the dev server) pass the request path; "/" and "/chat" fall through to prompts
+    path = (event.get("path") or event.get("rawPath") or "") if isinstance(event, dict) else ""
+    for suffix, route in _PATH_ROUTES.items():
+        if path.rstrip("/").endswith(suffix):
+            status_code, payload = route(data if isinstance(data, dict) else {})
+            return {"statusCode": status_code, "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"}, "body": json.dumps(payload)}
 
     prompt = data.get("prompt", "Hello from AI Accounting Agent")
     normalized = prompt.strip()
 
     if "[Task Status]" in normalized:
         status = _list_tasks()
+        status["responseCache"] = response_cache.stats()
+        status["coalescing"] = inflight_calls.stats()
         md = _format_task_status_md(status)
         return {"statusCode": 200, "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"}, "body": json.dumps({"ok": True, "status": status, "markdown": md})}
 
@@ -306,40 +725,43 @@ def lambda_handler(event, context):
         md = f"## Task Created\n\n- ID: `{new_task['taskId']}`\n- Cron: `{new_task['cron']}`\n- Output: `{new_task['outputPath']}`\n- Tasks file: `{src}`\n"
         return {"statusCode": 200, "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"}, "body": json.dumps({"ok": True, "message": "Task created", "task": new_task, "tasksFile": src, "markdown": md})}
 
-    if "[Run Report]" in normalized and execute_report:
+    if "[Run Report]" in normalized and _report_executor():
         embedded = _extract_embedded_json(prompt)
         payload = embedded if isinstance(embedded, dict) else data
         report_event = {"reportType": payload.get("reportType"), "input": payload.get("input", {}), "output": payload.get("output", {}), "params": payload.get("params", {}), "taskId": payload.get("taskId", "ui-report")}
+        for opt in ("engine", "batchSize", "force"):
+            if opt in payload:
+                report_event[opt] = payload[opt]
         result = execute_report(report_event)
         md = f"## Report Executed\n\n- Type: `{result.get('reportType')}`\n- Output: `{result.get('outputPath')}`\n- OK: `{result.get('ok')}`\n"
+        if result.get("cached"):
+            md += "- Served from the result cache (send `\"force\": true` to recompute)\n"
+        spans = (result.get("trace") or {}).get("spansMs") or {}
+        if spans:
+            md += "- Timings: " + ", ".join(f"{name.split('.', 1)[-1]} {ms:.1f} ms" for name, ms in spans.items()) + "\n"
         return {"statusCode": 200, "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"}, "body": json.dumps({"ok": True, "report": result, "markdown": md})}
 
-    result = call_bedrock(prompt)
+    full_prompt, sources = _model_prompt(prompt, data)
+    # chat replies are not cached unless the request asks for it with "cache": true
+    result = call_bedrock(full_prompt, cache=as_bool(data.get("cache")))
+    if sources:
+        result = dict(result, retrieval=sources)
     # Build markdown without 'Model Response' heading
     md = "```\n" + str(result.get('model_response', '')) + "\n```"
     return {"statusCode": 200, "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"}, "body": json.dumps({**result, "markdown": md})}
 
 
+def run_dev_server():
+    """Concurrent local dev server (see backend/dev_server.py) delegating to lambda_handler."""
+    from backend.dev_server import serve
+    serve(lambda_handler,
+          stream_handler=stream_events,
+          host=_cfg('DEV_SERVER_HOST') or '0.0.0.0',
+          port=_int_cfg('DEV_SERVER_PORT', 8000),
+          max_workers=_int_cfg('DEV_SERVER_MAX_WORKERS', 32),
+          keepalive_timeout=_int_cfg('DEV_SERVER_KEEPALIVE_TIMEOUT', 15))
+
+
 # Local dev server
 if __name__ == "__main__":
-    class DevHandler(BaseHTTPRequestHandler):
-        def do_OPTIONS(self):
-            self.send_response(200)
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
-
-        def do_POST(self):
-            length = int(self.headers.get('content-length', 0))
-            body = self.rfile.read(length)
-            event = {"body": body.decode('utf-8')}
-            resp = lambda_handler(event, None)
-            self.send_response(resp['statusCode'])
-            for k, v in resp.get('headers', {}).items():
-                self.send_header(k, v)
-            self.end_headers()
-            self.wfile.write(resp['body'].encode('utf-8'))
-
-    logger.info('Starting local dev server at http://0.0.0.0:8000 (POST /)')
-    HTTPServer(('0.0.0.0', 8000), DevHandler).serve_forever()
\ No newline at end of file
+    run_dev_server()
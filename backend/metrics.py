@@ -0,0 +1,214 @@
+import contextvars
+import os
+import re
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+# Timing spans and counters for reports, model calls and scheduled tasks.
+# Every observation goes to the process-wide registry (rendered in Prometheus
+# text format for GET /metrics) and to the active trace, whose per-request
+# breakdown is attached to execute() results and scheduler output lines.
+# With METRICS=false, span() hands back a shared no-op and incr() returns
+# immediately, so instrumented code pays one flag check.
+
+_ENABLED = (os.environ.get("METRICS") or "true").lower() in ("1", "true", "yes", "on")
+PREFIX = "aiaccount"
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+def configure(enabled: bool):
+    global _ENABLED
+    _ENABLED = bool(enabled)
+
+
+class _Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        # span name -> [count, total seconds, per-bucket counts]
+        self.spans: Dict[str, List[Any]] = {}
+
+    def add(self, name: str, value: float):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            entry = self.spans.get(name)
+            if entry is None:
+                entry = self.spans[name] = [0, 0.0, [0] * len(BUCKETS)]
+            entry[0] += 1
+            entry[1] += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    entry[2][i] += 1
+                    break
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"counters": dict(self.counters),
+                    "spans": {k: {"count": v[0], "seconds": v[1]} for k, v in self.spans.items()}}
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.spans.clear()
+
+
+_registry = _Registry()
+
+
+class Trace:
+    """Spans (seconds, summed per name) and counters for one request, report run or task."""
+    __slots__ = ("spans", "counters", "parent")
+
+    def __init__(self, parent: Optional["Trace"] = None):
+        self.spans: Dict[str, float] = {}
+        self.counters: Dict[str, float] = {}
+        self.parent = parent
+
+    def add_span(self, name: str, seconds: float):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def add(self, name: str, value: float):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"spansMs": {k: round(v * 1000, 3) for k, v in self.spans.items()}, "counters": dict(self.counters)}
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("metrics_trace", default=None)
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_span(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str):
+    """with span("report.persist"): ... times the block (no-op when disabled)."""
+    return _Span(name) if _ENABLED else _NOOP
+
+
+def record_span(name: str, seconds: float):
+    if not _ENABLED:
+        return
+    _registry.observe(name, seconds)
+    current = _current.get()
+    if current is not None:
+        current.add_span(name, seconds)
+
+
+def incr(name: str, value: float = 1):
+    if not _ENABLED:
+        return
+    _registry.add(name, value)
+    current = _current.get()
+    if current is not None:
+        current.add(name, value)
+
+
+class trace:
+    """Collect spans/counters of the enclosed block; `as t` is the Trace (None when disabled).
+
+    A trace opened inside another one rolls its figures up into the outer
+    trace when it closes.
+    """
+
+    def __init__(self):
+        self.trace: Optional[Trace] = None
+        self._token = None
+
+    def __enter__(self) -> Optional[Trace]:
+        if not _ENABLED:
+            return None
+        self.trace = Trace(_current.get())
+        self._token = _current.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc):
+        if self.trace is None:
+            return False
+        _current.reset(self._token)
+        parent = self.trace.parent
+        if parent is not None:
+            for name, seconds in self.trace.spans.items():
+                parent.add_span(name, seconds)
+            for name, value in self.trace.counters.items():
+                parent.add(name, value)
+        return False
+
+
+def merge(data: Optional[Dict[str, Any]]):
+    """Fold a Trace.as_dict() produced in another process into this process's registry and trace."""
+    if not _ENABLED or not data:
+        return
+    for name, ms in (data.get("spansMs") or {}).items():
+        record_span(name, ms / 1000.0)
+    for name, value in (data.get("counters") or {}).items():
+        incr(name, value)
+
+
+def snapshot() -> Dict[str, Any]:
+    return _registry.snapshot()
+
+
+def reset():
+    _registry.reset()
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", f"{PREFIX}_{name}")
+
+
+def render_prometheus() -> str:
+    """Registry contents in the Prometheus text exposition format (version 0.0.4)."""
+    with _registry._lock:
+        counters = sorted(_registry.counters.items())
+        spans = sorted((k, v[0], v[1], list(v[2])) for k, v in _registry.spans.items())
+    lines = []
+    for name, value in counters:
+        metric = _metric_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {int(value) if float(value).is_integer() else value}")
+    if spans:
+        metric = f"{PREFIX}_span_seconds"
+        lines.append(f"# HELP {metric} Duration of instrumented stages.")
+        lines.append(f"# TYPE {metric} histogram")
+        for name, count, total, buckets in spans:
+            cumulative = 0
+            for bound, n in zip(BUCKETS, buckets):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{span="{name}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{span="{name}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{span="{name}"}} {total:.6f}')
+            lines.append(f'{metric}_count{{span="{name}"}} {count}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,150 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional
+
+# Append-only notification log backed by SQLite (WAL mode). Appends are a single
+# INSERT regardless of history size, the API and the scheduler can write at the
+# same time, and queries by taskId / time range use indexes. A legacy
+# notifications.json next to the database is imported once on first open
+# and renamed to notifications.json.migrated; one that cannot be parsed is
+# renamed to notifications.json.corrupt instead.
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_DB_PATH = os.path.join(REPO_ROOT, 'resources', 'notifications.db')
+
+logger = logging.getLogger("handler")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT NOT NULL,
+    task_id TEXT,
+    ok INTEGER,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notifications_task_ts ON notifications (task_id, ts);
+CREATE INDEX IF NOT EXISTS notifications_ts ON notifications (ts);
+"""
+
+
+class NotificationStore:
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, legacy_json_path: Optional[str] = None):
+        self.db_path = db_path
+        self.legacy_json_path = legacy_json_path or os.path.splitext(db_path)[0] + '.json'
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread; sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._migrate_legacy(conn)
+                    self._initialized = True
+        return conn
+
+    def _migrate_legacy(self, conn: sqlite3.Connection):
+        path = self.legacy_json_path
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f) or []
+            if not isinstance(entries, list):
+                raise ValueError(f"expected a list, got {type(entries).__name__}")
+        except FileNotFoundError:
+            return  # another process migrated it first
+        except Exception as e:
+            # keep the file for inspection rather than recording it as migrated
+            logger.error("Cannot import legacy notifications %s: %s; renaming it to %s.corrupt", path, e, path)
+            try:
+                os.replace(path, path + ".corrupt")
+            except OSError:
+                pass
+            return
+        # BEGIN IMMEDIATE serializes concurrent migrations from the API and scheduler processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if os.path.exists(path):
+                conn.executemany("INSERT INTO notifications (ts, task_id, ok, body) VALUES (?, ?, ?, ?)",
+                                 [self._row(e) for e in entries if isinstance(e, dict)])
+                os.replace(path, path + ".migrated")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _row(message: Dict[str, Any]):
+        ok = message.get("ok")
+        return (str(message.get("timestamp") or ""), message.get("taskId"),
+                None if ok is None else int(bool(ok)), json.dumps(message, ensure_ascii=False))
+
+    def append(self, message: Dict[str, Any]):
+        self._conn().execute("INSERT INTO notifications (ts, task_id, ok, body) VALUES (?, ?, ?, ?)", self._row(message))
+
+    def query(self, task_id: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+              limit: Optional[int] = 100, newest_first: bool = True) -> List[Dict[str, Any]]:
+        """Notifications filtered by taskId and ISO timestamp range [since, until)."""
+        clauses, args = [], []
+        if task_id is not None:
+            clauses.append("task_id = ?")
+            args.append(task_id)
+        if since:
+            clauses.append("ts >= ?")
+            args.append(since)
+        if until:
+            clauses.append("ts < ?")
+            args.append(until)
+        sql = "SELECT body FROM notifications"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY ts DESC, id DESC" if newest_first else " ORDER BY ts, id"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        return [json.loads(r[0]) for r in self._conn().execute(sql, args)]
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM notifications").fetchone()[0]
+
+
+_stores: Dict[str, NotificationStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(db_path: str = DEFAULT_DB_PATH) -> NotificationStore:
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = _stores[db_path] = NotificationStore(db_path)
+        return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the notification log")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--task-id")
+    parser.add_argument("--since", help="ISO timestamp, inclusive")
+    parser.add_argument("--until", help="ISO timestamp, exclusive")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+    for entry in get_store(args.db).query(args.task_id, args.since, args.until, args.limit):
+        print(json.dumps(entry, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,239 @@
+import csv
+import gzip
+import importlib
+import io
 import os
 import json
+import multiprocessing
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import tempfile
+from itertools import chain, islice
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
 
-from backend.report_registry import ReportRegistry
+from backend import checkpoints, columnar, metrics, result_cache
+from backend.clients import get_pool
+from backend.report_registry import get_registry
 
+# orjson sits on the per-row path and is imported eagerly; boto3, pyarrow,
+# openpyxl and zstandard only load when an input or output actually needs
+# them, which keeps them out of the Lambda cold start for chat requests.
 try:
-    import boto3
+    import orjson
 except Exception:
-    boto3 = None
+    orjson = None
 
-# Minimal loader for local files (JSON lines) and optional S3
 
-def _read_jsonl_file(p: Path) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
-    with p.open("r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
+def _optional(name: str):
+    """Import an optional dependency on first use; None when it is not installed."""
+    try:
+        return importlib.import_module(name)
+    except Exception:
+        return None
+
+_loads = orjson.loads if orjson else json.loads
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(os.environ.get(key) or default)
+    except ValueError:
+        return default
+
+
+# S3 I/O tuning. Objects above S3_RANGE_THRESHOLD are read with parallel ranged
+# GETs (at most S3_RANGE_CONCURRENCY parts of S3_PART_SIZE in memory at once);
+# outputs above S3_MULTIPART_THRESHOLD are uploaded in multipart chunks.
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL") or None
+S3_PART_SIZE = _env_int("S3_PART_SIZE", 8 * 1024 * 1024)
+S3_RANGE_THRESHOLD = _env_int("S3_RANGE_THRESHOLD", 64 * 1024 * 1024)
+S3_RANGE_CONCURRENCY = _env_int("S3_RANGE_CONCURRENCY", 8)
+S3_MULTIPART_THRESHOLD = _env_int("S3_MULTIPART_THRESHOLD", 16 * 1024 * 1024)
+
+# Minimal loader for local files (JSON lines, JSON, CSV, Parquet, XLSX) and optional S3.
+# Loaders are generators so rows can be streamed to handlers without
+# materializing the whole input in memory. `columns` projects each row down
+# to the named fields; for CSV/Parquet/XLSX the other fields are never decoded.
+
+Columns = Optional[List[str]]
+
+
+def _pick(obj: Any, columns: Columns) -> Any:
+    if not columns or not isinstance(obj, dict):
+        return obj
+    return {k: obj[k] for k in columns if k in obj}
+
+
+def _project(rows: Iterable[Dict[str, Any]], columns: Columns) -> Iterator[Dict[str, Any]]:
+    if not columns:
+        yield from rows
+        return
+    for row in rows:
+        yield _pick(row, columns)
+
+
+def _iter_jsonl_lines(lines: Iterable[Union[str, bytes]], columns: Columns = None) -> Iterator[Dict[str, Any]]:
+    for line in lines:
+        if isinstance(line, bytes) and orjson is None:
+            line = line.decode("utf-8", errors="replace")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = _loads(line)
+        except ValueError:  # malformed line (JSONDecodeError)
+            continue
+        yield _pick(obj, columns)
+
+
+def _iter_jsonl_file(p: Path, columns: Columns = None) -> Iterator[Dict[str, Any]]:
+    with p.open("rb") as f:
+        yield from _iter_jsonl_lines(f, columns)
+
+
+def _iter_json_file(p: Path, columns: Columns = None) -> Iterator[Dict[str, Any]]:
+    # A JSON array has to be parsed as a whole; only JSONL streams in constant memory
+    try:
+        obj = _loads(p.read_bytes())
+    except Exception:
+        return
+    if isinstance(obj, list):
+        yield from _project(obj, columns)
+
+
+def _coerce(value: str) -> Any:
+    # CSV cells arrive as text; numbers are converted so handlers see the same types as JSON
+    if not value:
+        return None
+    if value[0] in "+-.0123456789" and "_" not in value:
+        # zero-padded codes ("00123" accounts, vendors, invoices) keep their identity as text
+        digits = value.lstrip("+-")
+        if len(digits) > 1 and digits[0] == "0" and digits[1].isdigit():
+            return value
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    return value
+
+
+def _as_text(value: str) -> Any:
+    return value if value else None
+
+
+def _as_number(value: str) -> Any:
+    value = value.strip()
+    if not value:
+        return None
+    if "_" in value:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+# input.types: {"column": "string" | "number"} overrides the per-cell guess of _coerce
+_COLUMN_TYPES = {"string": _as_text, "text": _as_text, "number": _as_number, "int": _as_number, "float": _as_number}
+
+
+def _iter_csv_lines(lines: Iterable[str], input_spec: Dict[str, Any], columns: Columns = None) -> Iterator[Dict[str, Any]]:
+    reader = csv.reader(lines, delimiter=input_spec.get("delimiter") or ",")
+    header = next(reader, None)
+    if not header:
+        return
+    default = _coerce if input_spec.get("coerce", True) else (lambda v: v)
+    types = input_spec.get("types") or {}
+    wanted = [(i, name, _COLUMN_TYPES.get(str(types.get(name)).lower(), default))
+              for i, name in enumerate(header) if not columns or name in columns]
+    for record in reader:
+        if not record:
+            continue
+        n = len(record)
+        yield {name: coerce(record[i]) if i < n else None for i, name, coerce in wanted}
+
+
+def _iter_csv_file(p: Path, input_spec: Dict[str, Any], columns: Columns = None) -> Iterator[Dict[str, Any]]:
+    # utf-8-sig drops the BOM that spreadsheet exports put in front of the header
+    with p.open("r", encoding=input_spec.get("encoding") or "utf-8-sig", newline="") as f:
+        yield from _iter_csv_lines(f, input_spec, columns)
+
+
+def _iter_parquet(source: Any, input_spec: Dict[str, Any], columns: Columns = None, filesystem=None) -> Iterator[Dict[str, Any]]:
+    pq = _optional("pyarrow.parquet")
+    if pq is None:
+        return
+    pf = pq.ParquetFile(source, filesystem=filesystem) if filesystem else pq.ParquetFile(source)
+    if columns:
+        names = set(pf.schema_arrow.names)
+        columns = [c for c in columns if c in names]
+    # only the projected column chunks are read and decoded
+    for batch in pf.iter_batches(batch_size=input_spec.get("batchSize") or 65536, columns=columns or None):
+        yield from batch.to_pylist()
+
+
+def _iter_xlsx(source: Any, input_spec: Dict[str, Any], columns: Columns = None) -> Iterator[Dict[str, Any]]:
+    openpyxl = _optional("openpyxl")
+    if openpyxl is None:
+        return
+    # read_only streams the sheet XML instead of building the whole workbook
+    wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = input_spec.get("sheet")
+        ws = wb[sheet] if sheet else wb.active
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            return
+        wanted = [(i, str(name)) for i, name in enumerate(header)
+                  if name is not None and (not columns or str(name) in columns)]
+        for record in rows:
+            if not record or all(v is None for v in record):
+                continue
+            n = len(record)
+            yield {name: record[i] if i < n else None for i, name in wanted}
+    finally:
+        wb.close()
+
+
+def _iter_jsonl_from(p: Path, progress: Dict[str, int], columns: Columns = None) -> Iterator[Dict[str, Any]]:
+    """Yield rows after byte progress["offset"], advancing offset/rows as complete lines are read.
+
+    A trailing line without a newline may still be being appended; it is left
+    for the next run.
+    """
+    with p.open("rb") as f:
+        f.seek(progress["offset"])
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            progress["offset"] += len(raw)
+            line = raw.strip()
             if not line:
                 continue
             try:
-                obj = json.loads(line)
-                rows.append(obj)
-            except Exception:
-                pass
-    return rows
+                obj = _loads(line if orjson else line.decode("utf-8", errors="replace"))
+            except ValueError:  # malformed line (JSONDecodeError)
+                continue
+            progress["rows"] += 1
+            yield _pick(obj, columns)
+
+
+def _read_jsonl_file(p: Path) -> List[Dict[str, Any]]:
+    return list(_iter_jsonl_file(p))
 
 
 def _read_json_file(p: Path) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
-    with p.open("r", encoding="utf-8") as f:
-        try:
-            obj = json.load(f)
-            if isinstance(obj, list):
-                rows = obj
-        except Exception:
-            pass
-    return rows
+    return list(_iter_json_file(p))
 
 
 def _parse_s3_uri(uri: str) -> Dict[str, str]:
@@ -50,109 +247,619 @@ def _parse_s3_uri(uri: str) -> Dict[str, str]:
     return {"bucket": bucket, "key": key}
 
 
-def _s3_get_jsonl(bucket: str, key: str) -> List[Dict[str, Any]]:
-    if not boto3:
-        return []
-    s3 = boto3.client("s3")
-    resp = s3.get_object(Bucket=bucket, Key=key)
-    body = resp["Body"].read().decode("utf-8", errors="replace")
-    rows: List[Dict[str, Any]] = []
-    for line in body.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            rows.append(json.loads(line))
-        except Exception:
-            pass
-    return rows
+def _s3_client():
+    # shared, pooled client (backend.clients); S3_ENDPOINT_URL targets MinIO or a local stand-in
+    return get_pool().client("s3", os.environ.get("AWS_REGION") or "us-east-1", endpoint_url=S3_ENDPOINT_URL)
 
 
-def _s3_get_json(bucket: str, key: str) -> List[Dict[str, Any]]:
-    if not boto3:
-        return []
-    s3 = boto3.client("s3")
-    resp = s3.get_object(Bucket=bucket, Key=key)
-    body = resp["Body"].read().decode("utf-8", errors="replace")
+def _s3_iter_chunks(bucket: str, key: str) -> Iterator[bytes]:
+    """Yield the object's raw bytes in order without holding the whole body in memory."""
+    s3 = _s3_client()
+    head = s3.head_object(Bucket=bucket, Key=key)
+    size, etag = head.get("ContentLength", 0), head.get("ETag")
+    if size <= S3_RANGE_THRESHOLD:
+        for data in s3.get_object(Bucket=bucket, Key=key)["Body"].iter_chunks(1024 * 1024):
+            metrics.incr("input.bytes", len(data))
+            yield data
+        return
+
+    def fetch(first: int, last: int) -> bytes:
+        # IfMatch pins every part to the same object version
+        resp = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={first}-{last}", IfMatch=etag)
+        return resp["Body"].read()
+
+    ranges = iter([(start, min(start + S3_PART_SIZE, size) - 1) for start in range(0, size, S3_PART_SIZE)])
+    with ThreadPoolExecutor(max_workers=S3_RANGE_CONCURRENCY) as ex:
+        pending = deque(ex.submit(fetch, *r) for r in islice(ranges, S3_RANGE_CONCURRENCY))
+        while pending:
+            data = pending.popleft().result()
+            nxt = next(ranges, None)
+            if nxt:
+                pending.append(ex.submit(fetch, *nxt))
+            metrics.incr("input.bytes", len(data))
+            yield data
+
+
+def _s3_iter_lines(bucket: str, key: str) -> Iterator[bytes]:
+    """Yield the object's lines (without the trailing newline)."""
+    carry = b""
+    for data in _s3_iter_chunks(bucket, key):
+        lines = (carry + data).split(b"\n")
+        carry = lines.pop()
+        yield from lines
+    if carry:
+        yield carry
+
+
+def _s3_iter_jsonl(bucket: str, key: str, columns: Columns = None) -> Iterator[Dict[str, Any]]:
+    if _optional("boto3") is None:
+        return
+    yield from _iter_jsonl_lines(_s3_iter_lines(bucket, key), columns)
+
+
+def _s3_read(bucket: str, key: str) -> bytes:
+    return b"".join(_s3_iter_chunks(bucket, key))
+
+
+def _s3_iter_json(bucket: str, key: str, columns: Columns = None) -> Iterator[Dict[str, Any]]:
+    if _optional("boto3") is None:
+        return
+    # a JSON array has to be parsed as a whole, but ranged GETs still speed up the download
     try:
-        obj = json.loads(body)
-        return obj if isinstance(obj, list) else []
+        obj = _loads(_s3_read(bucket, key))
     except Exception:
-        return []
+        return
+    if isinstance(obj, list):
+        yield from _project(obj, columns)
+
+
+def _s3_iter_csv(bucket: str, key: str, input_spec: Dict[str, Any], columns: Columns = None) -> Iterator[Dict[str, Any]]:
+    if _optional("boto3") is None:
+        return
+    encoding = input_spec.get("encoding") or "utf-8-sig"
+    lines = _s3_iter_lines(bucket, key)
+    first = next(lines, b"")
+    # only the first line can carry a BOM; keep the newline so quoted multi-line cells survive
+    if not first:
+        return
+    rest_encoding = "utf-8" if encoding == "utf-8-sig" else encoding
+    text = chain([first.decode(encoding, errors="replace") + "\n"],
+                 (raw.decode(rest_encoding, errors="replace") + "\n" for raw in lines))
+    yield from _iter_csv_lines(text, input_spec, columns)
+
+
+def _s3_iter_parquet(bucket: str, key: str, input_spec: Dict[str, Any], columns: Columns = None) -> Iterator[Dict[str, Any]]:
+    pafs = _optional("pyarrow.fs")
+    if pafs is None:
+        return
+    # pyarrow's own S3 filesystem issues ranged reads for just the footer and the projected columns
+    s3fs = pafs.S3FileSystem(region=os.environ.get("AWS_REGION") or "us-east-1", endpoint_override=S3_ENDPOINT_URL)
+    yield from _iter_parquet(f"{bucket}/{key}", input_spec, columns, filesystem=s3fs)
+
+
+def _s3_iter_xlsx(bucket: str, key: str, input_spec: Dict[str, Any], columns: Columns = None) -> Iterator[Dict[str, Any]]:
+    if _optional("boto3") is None:
+        return
+    # XLSX is a zip archive and needs random access, so the object is buffered
+    yield from _iter_xlsx(io.BytesIO(_s3_read(bucket, key)), input_spec, columns)
 
 
-def _s3_put_json(bucket: str, key: str, obj: Dict[str, Any]) -> str:
-    if not boto3:
+def _s3_get_jsonl(bucket: str, key: str) -> List[Dict[str, Any]]:
+    return list(_s3_iter_jsonl(bucket, key))
+
+
+def _s3_get_json(bucket: str, key: str) -> List[Dict[str, Any]]:
+    return list(_s3_iter_json(bucket, key))
+
+
+def _s3_upload(bucket: str, key: str, fileobj, content_type: str, content_encoding: Optional[str] = None) -> str:
+    """Upload a file object; boto3 switches to parallel multipart above S3_MULTIPART_THRESHOLD."""
+    if _optional("boto3") is None:
         return ""
-    s3 = boto3.client("s3")
-    data = json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
-    s3.put_object(Bucket=bucket, Key=key, Body=data, ContentType="application/json; charset=utf-8")
+    from boto3.s3.transfer import TransferConfig
+    config = TransferConfig(multipart_threshold=S3_MULTIPART_THRESHOLD, multipart_chunksize=S3_PART_SIZE,
+                            max_concurrency=S3_RANGE_CONCURRENCY)
+    extra = {"ContentType": content_type}
+    if content_encoding:
+        extra["ContentEncoding"] = content_encoding
+    _s3_client().upload_fileobj(fileobj, bucket, key, ExtraArgs=extra, Config=config)
     return f"s3://{bucket}/{key}"
 
 
-def load_input(input_spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+def iter_input(input_spec: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield input rows lazily; memory stays flat for JSONL, CSV and Parquet regardless of size.
+
+    input_spec: {source: local|s3, format: jsonl|json|csv|parquet|xlsx, path|uri,
+    columns?: [...]} plus per-format options (delimiter/encoding/coerce for CSV,
+    sheet for XLSX, batchSize for Parquet).
+    """
     source = input_spec.get("source", "local")
     fmt = input_spec.get("format", "jsonl")
     path = input_spec.get("path") or input_spec.get("uri")
+    columns = input_spec.get("columns") or None
     if not path:
-        return []
+        return iter(())
 
     if source == "s3":
         s3_parts = _parse_s3_uri(path)
         bucket, key = s3_parts.get("bucket"), s3_parts.get("key")
         if not bucket or not key:
-            return []
+            return iter(())
         if fmt == "jsonl":
-            return _s3_get_jsonl(bucket, key)
+            return _s3_iter_jsonl(bucket, key, columns)
         elif fmt == "json":
-            return _s3_get_json(bucket, key)
+            return _s3_iter_json(bucket, key, columns)
+        elif fmt == "csv":
+            return _s3_iter_csv(bucket, key, input_spec, columns)
+        elif fmt == "parquet":
+            return _s3_iter_parquet(bucket, key, input_spec, columns)
+        elif fmt == "xlsx":
+            return _s3_iter_xlsx(bucket, key, input_spec, columns)
         else:
-            return []
+            return iter(())
 
     # default local
     p = Path(path)
     if not p.exists():
-        return []
+        return iter(())
+    if metrics.enabled():
+        # local inputs are read in full (Parquet projection reads less; this is the upper bound)
+        metrics.incr("input.bytes", p.stat().st_size)
     if fmt == "jsonl":
-        return _read_jsonl_file(p)
+        return _iter_jsonl_file(p, columns)
     elif fmt == "json":
-        return _read_json_file(p)
+        return _iter_json_file(p, columns)
+    elif fmt == "csv":
+        return _iter_csv_file(p, input_spec, columns)
+    elif fmt == "parquet":
+        return _iter_parquet(str(p), input_spec, columns)
+    elif fmt == "xlsx":
+        return _iter_xlsx(str(p), input_spec, columns)
     else:
-        return []
+        return iter(())
 
 
-def persist_output(output_spec: Dict[str, Any], task_id: str, result: Dict[str, Any]) -> str:
-    target = output_spec.get("target", "local")
-    path = output_spec.get("path")
-    if target == "s3":
-        uri = path or output_spec.get("uri")
-        parts = _parse_s3_uri(uri or "")
-        bucket, key = parts.get("bucket"), parts.get("key")
-        if not bucket or not key:
+def load_input(input_spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return list(iter_input(input_spec))
+
+
+def _dumps(obj: Any, compact: bool) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=0 if compact else orjson.OPT_INDENT_2)
+        except TypeError:
+            # types orjson refuses (e.g. non-str keys) go through the stdlib encoder
+            pass
+    if compact:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+_COMPRESSION_EXT = {"gzip": ".gz", "zstd": ".zst"}
+
+
+class ResultWriter:
+    """Writes a report result to a local file or an S3 object.
+
+    output_spec: {target: local|s3, path|uri, format: json|jsonl, compact,
+    compression: gzip|zstd}. "json" (default) writes the result as one
+    document, indented unless compact. "jsonl" writes every record passed to
+    emit() as soon as the handler produces it, then a final {"summary": result}
+    line. Local files appear atomically on finish(); S3 output is spooled to a
+    temp file and uploaded (multipart when large) on finish(). With copy_to the
+    final bytes are also saved there (result cache blob).
+    """
+
+    def __init__(self, output_spec: Dict[str, Any], task_id: str, copy_to: Optional[str] = None):
+        self.format = "jsonl" if output_spec.get("format") == "jsonl" else "json"
+        self.compact = bool(output_spec.get("compact"))
+        self.compression = output_spec.get("compression") or None
+        if self.compression not in (None, "gzip", "zstd"):
+            raise ValueError(f"Unsupported output compression: {self.compression}")
+        if self.compression == "zstd" and _optional("zstandard") is None:
+            raise RuntimeError("zstd compression requires the zstandard package")
+        self.emitted = 0
+        self.copied = False
+        self._copy_to = copy_to
+        self._raw = None
+        self._out = None
+        self._tmp_path: Optional[Path] = None
+        self._path: Optional[Path] = None
+        self._bucket = self._key = None
+        path = output_spec.get("path")
+        if output_spec.get("target", "local") == "s3":
+            parts = _parse_s3_uri(path or output_spec.get("uri") or "")
+            self._bucket, self._key = parts.get("bucket"), parts.get("key")
+        else:
+            ext = ".jsonl" if self.format == "jsonl" else ".json"
+            self._path = Path(path or f"results/{task_id}-report{ext}{_COMPRESSION_EXT.get(self.compression, '')}")
+
+    @property
+    def streaming(self) -> bool:
+        return self.format == "jsonl"
+
+    @property
+    def enabled(self) -> bool:
+        return self._path is not None or bool(self._bucket and self._key)
+
+    @property
+    def content_type(self) -> str:
+        return "application/x-ndjson" if self.streaming else "application/json; charset=utf-8"
+
+    def _open(self):
+        if self._path is not None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._tmp_path = self._path.with_name(self._path.name + ".tmp")
+            self._raw = self._tmp_path.open("w+b")
+        else:
+            self._raw = tempfile.TemporaryFile()
+        if self.compression == "gzip":
+            # mtime=0 keeps identical results byte-identical
+            self._out = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6, mtime=0)
+        elif self.compression == "zstd":
+            self._out = _optional("zstandard").ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._out = self._raw
+
+    def emit(self, record: Dict[str, Any]):
+        if not self.enabled:
+            return
+        if self._out is None:
+            self._open()
+        self._out.write(_dumps(record, compact=True) + b"\n")
+        self.emitted += 1
+
+    def finish(self, result: Dict[str, Any]) -> str:
+        if not self.enabled:
             return ""
-        return _s3_put_json(bucket, key, result)
+        if self._out is None:
+            self._open()
+        if self.streaming:
+            self._out.write(_dumps({"summary": result}, compact=True) + b"\n")
+        else:
+            self._out.write(_dumps(result, compact=self.compact))
+        if self._out is not self._raw:
+            self._out.close()
+        self._out = None
+        if self._copy_to:
+            self._raw.flush()
+            self._raw.seek(0)
+            with open(self._copy_to + ".tmp", "wb") as f:
+                shutil.copyfileobj(self._raw, f)
+            os.replace(self._copy_to + ".tmp", self._copy_to)
+            self.copied = True
+        if self._path is None:
+            self._raw.seek(0)
+            try:
+                return _s3_upload(self._bucket, self._key, self._raw, self.content_type, self.compression)
+            finally:
+                self._raw.close()
+        self._raw.close()
+        os.replace(self._tmp_path, self._path)
+        return str(self._path)
+
+    def restore(self, source: str) -> str:
+        """Write bytes produced by an earlier finish() (a result cache blob) to this target."""
+        if not self.enabled:
+            return ""
+        if self._path is None:
+            with open(source, "rb") as f:
+                return _s3_upload(self._bucket, self._key, f, self.content_type, self.compression)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._path.with_name(self._path.name + ".tmp")
+        shutil.copyfile(source, tmp)
+        os.replace(tmp, self._path)
+        return str(self._path)
+
+    def abort(self):
+        if self._raw is not None and not self._raw.closed:
+            self._raw.close()
+        if self._tmp_path is not None and self._tmp_path.exists():
+            self._tmp_path.unlink()
+
+
+def persist_output(output_spec: Dict[str, Any], task_id: str, result: Dict[str, Any]) -> str:
+    return ResultWriter(output_spec, task_id).finish(result)
+
+
+# Parallel map-reduce over local JSONL: byte ranges aligned to newlines, one
+# process_stream call per range, merged with the module's combine().
+MIN_CHUNK_BYTES = 1 << 20
+
+
+def _split_ranges(p: Path, parts: int) -> List[Tuple[int, int]]:
+    size = p.stat().st_size
+    parts = max(1, min(parts, size // MIN_CHUNK_BYTES or 1))
+    bounds = [0]
+    with p.open("rb") as f:
+        for i in range(1, parts):
+            # seek one byte early so a target that already starts a line is kept as the boundary
+            f.seek(size * i // parts - 1)
+            f.readline()
+            pos = f.tell()
+            if bounds[-1] < pos < size:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _iter_jsonl_range(p: Path, start: int, end: int, columns: Columns = None) -> Iterator[Dict[str, Any]]:
+    with p.open("rb") as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            raw = f.readline()
+            if not raw:
+                break
+            pos += len(raw)
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                obj = _loads(line if orjson else line.decode("utf-8", errors="replace"))
+            except ValueError:  # malformed line (JSONDecodeError)
+                continue
+            yield _pick(obj, columns)
+
+
+def _run_chunk(report_type: str, path: str, start: int, end: int, params: Dict[str, Any],
+               columns: Columns = None) -> Dict[str, Any]:
+    # runs in a worker process; row indexes are chunk-local and rebased by the parent.
+    # Chunks run in state mode so combine() can merge mergeable handler state (e.g. sketches).
+    handler = get_registry().get_stream(report_type)
+    progress = {"rows": 0}
+    result = handler({"rows": _counted(_iter_jsonl_range(Path(path), start, end, columns), progress), "params": params,
+                      "state": None, "startIndex": 0})
+    return {"result": result, "rows": progress["rows"]}
+
+
+def process_context():
+    """Start method for report process pools.
+
+    Pools are created from threads (dev server requests, scheduler jobs), and a
+    forked child would inherit any lock another thread held at that moment and
+    block on it forever. forkserver children fork from a single-threaded server
+    that has the executor preloaded; spawn is the fallback (Windows).
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["backend.report_executor"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def _worker_count(params: Dict[str, Any]) -> int:
+    try:
+        return int(params.get("workers") or os.environ.get("REPORT_WORKERS") or 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def _run_parallel(report_type: str, p: Path, params: Dict[str, Any], workers: int, combine,
+                  columns: Columns = None) -> Dict[str, Any]:
+    ranges = _split_ranges(p, workers * 4)
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=process_context()) as pool:
+        futures = [pool.submit(_run_chunk, report_type, str(p), start, end, params, columns) for start, end in ranges]
+        chunks = [f.result() for f in futures]
+    parts, start_index = [], 0
+    for chunk in chunks:
+        parts.append({"result": chunk["result"], "startIndex": start_index, "rows": chunk["rows"], "params": params})
+        start_index += chunk["rows"]
+    metrics.incr("report.rows", start_index)
+    with metrics.span("report.combine"):
+        return combine(parts)
+
+
+def _timed_rows(rows: Iterable[Dict[str, Any]], stats: Dict[str, Any], batch: int = 1024) -> Iterator[Dict[str, Any]]:
+    # rows are pulled in small batches so decode time can be told apart from handler
+    # time with two clock reads per batch instead of per row
+    it = iter(rows)
+    clock = time.perf_counter
+    while True:
+        started = clock()
+        chunk = list(islice(it, batch))
+        stats["load"] += clock() - started
+        if not chunk:
+            return
+        stats["rows"] += len(chunk)
+        yield from chunk
+
+
+def _counted(rows: Iterator[Dict[str, Any]], progress: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+    for row in rows:
+        progress["rows"] += 1
+        yield row
+
+
+def _s3_etag(bucket: str, key: str) -> str:
+    if _optional("boto3") is None:
+        return ""
+    return _s3_client().head_object(Bucket=bucket, Key=key).get("ETag", "")
+
+
+def _run_incremental(event: Dict[str, Any], report_type: str, handler) -> Dict[str, Any]:
+    """Feed only rows appended since the task's checkpoint, merged into the saved handler state.
+
+    Local JSONL resumes from a byte offset while the file keeps its inode and
+    head bytes. S3 objects cannot be appended, so an unchanged ETag means no
+    new rows and a changed one means a full rescan. Anything else falls back
+    to a full scan.
+    """
+    task_id = event.get("taskId", "report-task")
+    input_spec = event.get("input", {})
+    params = event.get("params", {})
+    path = input_spec.get("path") or input_spec.get("uri") or ""
+    saved = checkpoints.load(task_id, report_type)
+    if saved and saved.get("params") != params:
+        saved = None
+
+    if input_spec.get("source", "local") == "s3":
+        parts = _parse_s3_uri(path)
+        etag = _s3_etag(parts["bucket"], parts["key"]) if parts.get("key") else ""
+        resume = saved if saved and saved.get("etag") == etag and saved.get("path") == path else None
+        if resume:
+            # same immutable object as last run: nothing new, just re-emit from state
+            result = handler({"rows": iter(()), "params": params, "state": resume.get("state"),
+                              "startIndex": resume.get("rows", 0)})
+            rows_total = resume.get("rows", 0)
+        else:
+            progress = {"rows": 0}
+            result = handler({"rows": _counted(iter_input(input_spec), progress), "params": params,
+                              "state": None, "startIndex": 0})
+            rows_total = progress["rows"]
+        state = result.pop("state", None)
+        checkpoints.save(task_id, report_type, {"path": path, "etag": etag, "rows": rows_total, "params": params, "state": state})
+        return {"result": result, "mode": "incremental" if resume else "full", "newRows": 0 if resume else rows_total}
 
-    # default local
-    if not path:
-        path = f"results/{task_id}-report.json"
     p = Path(path)
-    p.parent.mkdir(parents=True, exist_ok=True)
-    with p.open("w", encoding="utf-8") as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
-    return str(p)
+    if input_spec.get("format", "jsonl") != "jsonl" or not p.exists():
+        result = handler({"rows": iter_input(input_spec), "params": params})
+        result.pop("state", None)
+        return {"result": result, "mode": "full", "newRows": None}
+    resume = checkpoints.local_resume_offset(str(p), saved)
+    progress = {"offset": resume["offset"] if resume else 0, "rows": resume["rows"] if resume else 0}
+    start_index = progress["rows"]
+    result = handler({"rows": _iter_jsonl_from(p, progress, input_spec.get("columns") or None), "params": params,
+                      "state": resume.get("state") if resume else None, "startIndex": start_index})
+    state = result.pop("state", None)
+    st = p.stat()
+    checkpoints.save(task_id, report_type, {
+        "path": os.path.realpath(p), "inode": st.st_ino, "offset": progress["offset"], "rows": progress["rows"],
+        "headHash": checkpoints.head_hash(str(p), progress["offset"]), "params": params, "state": state,
+    })
+    return {"result": result, "mode": "incremental" if resume else "full", "newRows": progress["rows"] - start_index}
+
+
+def _parallel_input(input_spec: Dict[str, Any], params: Dict[str, Any]) -> Optional[Path]:
+    # parallel runs need a seekable local JSONL file
+    if _worker_count(params) <= 1 or input_spec.get("source", "local") != "local" \
+            or input_spec.get("format", "jsonl") != "jsonl":
+        return None
+    p = Path(input_spec.get("path") or "")
+    return p if p.is_file() else None
+
+
+def _input_fingerprint(input_spec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # cheap identity of the input: size+mtime locally, ETag on S3 (a HEAD request, no body read)
+    path = input_spec.get("path") or input_spec.get("uri") or ""
+    if input_spec.get("source", "local") == "s3":
+        parts = _parse_s3_uri(path)
+        try:
+            etag = _s3_etag(parts["bucket"], parts["key"]) if parts.get("key") else ""
+        except Exception:
+            etag = ""
+        return {"etag": etag} if etag else None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime": st.st_mtime_ns}
+
+
+def _cache_key(report_type: str, mode: str, input_spec: Dict[str, Any], output_spec: Dict[str, Any],
+               params: Dict[str, Any]) -> Optional[str]:
+    code = get_registry().code_hash(report_type)
+    fingerprint = _input_fingerprint(input_spec)
+    if not code or not fingerprint:
+        return None
+    shape = {k: output_spec.get(k) for k in ("format", "compact", "compression")}
+    return result_cache.make_key({"reportType": report_type, "code": code, "mode": mode, "params": params,
+                                  "input": input_spec, "fingerprint": fingerprint, "output": shape})
 
 
 def execute(event: Dict[str, Any]) -> Dict[str, Any]:
     # event: {reportType, input: {...}, output: {...}, params: {...}, taskId}
+    # with metrics on, the result carries "trace": per-stage milliseconds and counters
+    with metrics.trace() as tr:
+        with metrics.span("report.total"):
+            out = _execute(event)
+    if tr is not None:
+        out["trace"] = tr.as_dict()
+    return out
+
+
+def _execute(event: Dict[str, Any]) -> Dict[str, Any]:
     report_type = event.get("reportType")
     task_id = event.get("taskId", "report-task")
-    registry = ReportRegistry()
-    registry.discover()
-    handler = registry.get(report_type)
+    registry = get_registry()
+    # event["engine"] == "columnar" opts into typed NumPy batches when numpy is installed
+    use_columnar = event.get("engine") == "columnar" and columnar.available()
+    handler, mode = registry.resolve(report_type, columnar=use_columnar)
     if not handler:
         return {"ok": False, "error": f"Unknown reportType: {report_type}"}
-    data_rows = load_input(event.get("input", {}))
-    ctx = {"data": data_rows, "params": event.get("params", {})}
-    result = handler(ctx)
-    out_path = persist_output(event.get("output", {}), task_id, result)
-    return {"ok": True, "outputPath": out_path, "result": result, "reportType": report_type}
+    input_spec = event.get("input", {})
+    output_spec = event.get("output", {})
+    params = event.get("params", {})
+    if output_spec.get("rowRef"):
+        # handlers read it from params, so projection and incremental checkpoints follow it too
+        params = dict(params, rowRef=output_spec["rowRef"])
+    # explicit input.columns wins; otherwise project to what the module declares it reads
+    columns = input_spec.get("columns") or registry.required_columns(report_type, params)
+    if columns:
+        input_spec = dict(input_spec, columns=list(columns))
+    event = dict(event, input=input_spec, params=params)
+    # incremental runs keep their own state; "force" skips the lookup but still refreshes the entry
+    cache_key = None
+    if result_cache.ENABLED and not event.get("incremental") and registry.cacheable(report_type):
+        cache_key = _cache_key(report_type, mode, input_spec, output_spec, params)
+    if cache_key and not event.get("force"):
+        hit = result_cache.lookup(cache_key)
+        metrics.incr("report.cache_hits" if hit else "report.cache_misses")
+        if hit:
+            with metrics.span("report.persist"):
+                out_path = ResultWriter(output_spec, task_id).restore(result_cache.blob_path(cache_key))
+            return {"ok": True, "outputPath": out_path, "result": hit["result"], "reportType": report_type,
+                    "cached": True}
+    writer = ResultWriter(output_spec, task_id, copy_to=result_cache.blob_path(cache_key) if cache_key else None)
+    extra = {}
+    try:
+        parallel_path = _parallel_input(input_spec, params) if mode == "stream" else None
+        if event.get("incremental") and mode == "stream" and registry.supports_incremental(report_type):
+            with metrics.span("report.incremental"):
+                run = _run_incremental(event, report_type, handler)
+            result = run["result"]
+            metrics.incr("report.rows", run["newRows"] or 0)
+            extra["incremental"] = {"mode": run["mode"], "newRows": run["newRows"]}
+        elif parallel_path and registry.get_combine(report_type):
+            with metrics.span("report.parallel"):
+                result = _run_parallel(report_type, parallel_path, params, _worker_count(params),
+                                       registry.get_combine(report_type), input_spec.get("columns") or None)
+        else:
+            # streamed rows are decoded while the handler runs; _timed_rows splits the two
+            timing = {"rows": 0, "load": 0.0}
+            if mode == "rows":
+                with metrics.span("report.load"):
+                    data = load_input(input_spec)
+                metrics.incr("report.rows", len(data))
+                ctx = {"data": data, "params": params}
+            else:
+                rows = iter_input(input_spec)
+                if metrics.enabled():
+                    rows = _timed_rows(rows, timing)
+                if mode == "columnar":
+                    batches = columnar.iter_batches(rows, registry.columnar_schema(report_type),
+                                                    event.get("batchSize") or columnar.DEFAULT_BATCH_SIZE)
+                    ctx = {"batches": batches, "params": params}
+                else:
+                    ctx = {"rows": rows, "params": params}
+            if writer.streaming:
+                # JSONL output: handlers may emit result records instead of collecting them
+                ctx["emit"] = writer.emit
+            started = time.perf_counter()
+            result = handler(ctx)
+            elapsed = time.perf_counter() - started
+            if mode != "rows" and metrics.enabled():
+                metrics.record_span("report.load", timing["load"])
+                metrics.incr("report.rows", timing["rows"])
+            metrics.record_span("report.handler", elapsed - timing["load"])
+        with metrics.span("report.persist"):
+            out_path = writer.finish(result)
+        if writer.emitted:
+            metrics.incr("report.emitted", writer.emitted)
+    except BaseException:
+        # includes the scheduler's report deadline, so a timed-out run leaves no .tmp output
+        writer.abort()
+        raise
+    if cache_key and writer.copied:
+        result_cache.store(cache_key, result)
+    return dict({"ok": True, "outputPath": out_path, "result": result, "reportType": report_type}, **extra)
@@ -1,31 +1,331 @@
+import hashlib
 import importlib
+import os
 import pkgutil
-from typing import Callable, Dict, Any
+import re
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional, Tuple
 
 _HANDLER_NAME = "process"
+# Optional streaming entry point: receives ctx["rows"] as an iterator instead of ctx["data"]
+_STREAM_HANDLER_NAME = "process_stream"
+# Optional columnar entry point: receives ctx["batches"] of typed NumPy columns (see backend.columnar)
+_COLUMNAR_HANDLER_NAME = "process_columnar"
+_COLUMNAR_SCHEMA_NAME = "COLUMNAR_SCHEMA"
+# INCREMENTAL = True: process_stream accepts ctx["state"]/ctx["startIndex"] and returns result["state"]
+_INCREMENTAL_FLAG_NAME = "INCREMENTAL"
+# combine(parts) merges process_stream results computed on separate chunks (parallel map-reduce)
+_COMBINE_NAME = "combine"
+# COLUMNS = [...] or required_columns(params) -> [...]: input fields the module reads; the
+# executor projects rows to them so unused fields are never decoded (None/empty = all fields)
+_COLUMNS_NAME = "COLUMNS"
+_REQUIRED_COLUMNS_NAME = "required_columns"
+# CACHEABLE = False: results depend on state outside the input (e.g. a persistent index),
+# so the executor never serves them from the result cache
+_CACHEABLE_FLAG_NAME = "CACHEABLE"
+
+_REPORTS_PACKAGE = "backend.reports"
+# REPORT_TYPE is read from source so the index can be built without importing modules
+_REPORT_TYPE_RE = re.compile(r"""^REPORT_TYPE\s*=\s*["']([^"']+)["']""", re.M)
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# every report's output also depends on the executor's loaders (coercion, projection)
+# and the columnar reader, so their source is part of each report's code hash
+SHARED_SOURCES = ("report_executor.py", "columnar.py")
+# "from backend.x import ...", "from backend import x, y", "import backend.x"
+_BACKEND_IMPORT = re.compile(r"^\s*(?:from\s+backend\.(\w+)\s+import|from\s+backend\s+import\s+([\w, ]+)"
+                             r"|import\s+backend\.(\w+))", re.M)
+
 
 class ReportRegistry:
-    def __init__(self):
+    """Maps report types to handler entry points.
+
+    Report modules are indexed from source and only imported the first time
+    their report type is requested. A module is reloaded when its file mtime
+    changes, so edits are picked up without restarting the process.
+    """
+
+    def __init__(self, package: str = _REPORTS_PACKAGE):
+        self._package = package
         self._handlers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {}
+        self._stream_handlers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {}
+        self._columnar_handlers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {}
+        self._columnar_schemas: Dict[str, Dict[str, str]] = {}
+        self._incremental: Dict[str, bool] = {}
+        self._combiners: Dict[str, Callable[[List[Dict[str, Any]]], Dict[str, Any]]] = {}
+        self._columns: Dict[str, Any] = {}
+        self._uncacheable: Dict[str, bool] = {}
+        self._code_hashes: Dict[str, Tuple[int, str]] = {}
+        # source file -> backend modules it imports, for code_hash
+        self._imports: Dict[str, List[str]] = {}
+        # report type -> module name, plus per-file bookkeeping for hot reload
+        self._index: Dict[str, str] = {}
+        self._files: Dict[str, str] = {}
+        self._indexed_mtimes: Dict[str, int] = {}
+        self._loaded_mtimes: Dict[str, int] = {}
+        self._module_types: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._stats = {"indexRuns": 0, "indexSeconds": 0.0, "filesRead": 0,
+                       "imports": 0, "importSeconds": 0.0, "reloads": 0, "lookups": 0}
+
+    def _package_dirs(self) -> List[str]:
+        pkg = importlib.import_module(self._package)
+        return list(getattr(pkg, "__path__", []))
+
+    def index(self):
+        """Refresh report type -> module mapping; only files whose mtime changed are re-read."""
+        with self._lock:
+            started = time.perf_counter()
+            seen = set()
+            for info in pkgutil.iter_modules(self._package_dirs()):
+                if info.ispkg:
+                    continue
+                module_name = f"{self._package}.{info.name}"
+                path = os.path.join(info.module_finder.path, info.name + ".py")
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(module_name)
+                if self._indexed_mtimes.get(module_name) == mtime:
+                    continue
+                self._files[module_name] = path
+                self._indexed_mtimes[module_name] = mtime
+                self._stats["filesRead"] += 1
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        m = _REPORT_TYPE_RE.search(f.read())
+                except Exception:
+                    m = None
+                # convention: module exposes REPORT_TYPE or infer from module name
+                self._set_type(module_name, m.group(1) if m else info.name)
+            for module_name in [name for name in self._module_types if name not in seen]:
+                self._forget(module_name)
+            self._stats["indexRuns"] += 1
+            self._stats["indexSeconds"] += time.perf_counter() - started
 
     def discover(self):
-        import backend.reports as reports_pkg
-        for _, name, ispkg in pkgutil.iter_modules(reports_pkg.__path__):
-            if ispkg:
-                continue
-            module = importlib.import_module(f"backend.reports.{name}")
-            if hasattr(module, _HANDLER_NAME):
-                handler = getattr(module, _HANDLER_NAME)
-                if callable(handler):
-                    # convention: module exposes REPORT_TYPE or infer from module name
-                    report_type = getattr(module, "REPORT_TYPE", name)
-                    self._handlers[report_type] = handler
+        """Index and eagerly import every report module."""
+        with self._lock:
+            self.index()
+            for module_name in list(self._module_types):
+                self._load(module_name)
 
-    def register(self, report_type: str, handler: Callable[[Dict[str, Any]], Dict[str, Any]]):
-        self._handlers[report_type] = handler
+    def _set_type(self, module_name: str, report_type: str):
+        old = self._module_types.get(module_name)
+        if old and old != report_type and self._index.get(old) == module_name:
+            del self._index[old]
+            self._unregister(old)
+        self._module_types[module_name] = report_type
+        self._index[report_type] = module_name
+
+    def _forget(self, module_name: str):
+        report_type = self._module_types.pop(module_name, None)
+        if report_type and self._index.get(report_type) == module_name:
+            del self._index[report_type]
+            self._unregister(report_type)
+        for book in (self._files, self._indexed_mtimes, self._loaded_mtimes):
+            book.pop(module_name, None)
+
+    def _unregister(self, report_type: str):
+        for table in (self._handlers, self._stream_handlers, self._columnar_handlers, self._columnar_schemas, self._incremental,
+                      self._combiners, self._columns, self._uncacheable):
+            table.pop(report_type, None)
+
+    def _load(self, module_name: str):
+        """Import module on first use, reload it if its file changed since."""
+        path = self._files.get(module_name)
+        try:
+            mtime = os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            mtime = None
+        if path and mtime is None:
+            # file was deleted since it was indexed
+            self._forget(module_name)
+            return
+        loaded = self._loaded_mtimes.get(module_name)
+        if loaded is not None and loaded == mtime:
+            return
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        if loaded is not None:
+            module = importlib.reload(module)
+            self._stats["reloads"] += 1
+        self._stats["imports"] += 1
+        self._stats["importSeconds"] += time.perf_counter() - started
+        self._loaded_mtimes[module_name] = mtime
+        self._indexed_mtimes[module_name] = mtime
+
+        report_type = getattr(module, "REPORT_TYPE", module_name.rsplit(".", 1)[-1])
+        self._set_type(module_name, report_type)
+        self._unregister(report_type)
+        handler = getattr(module, _HANDLER_NAME, None)
+        stream_handler = getattr(module, _STREAM_HANDLER_NAME, None)
+        columnar_handler = getattr(module, _COLUMNAR_HANDLER_NAME, None)
+        if callable(handler):
+            self._handlers[report_type] = handler
+        if callable(stream_handler):
+            self._stream_handlers[report_type] = stream_handler
+            self._incremental[report_type] = bool(getattr(module, _INCREMENTAL_FLAG_NAME, False))
+            combine = getattr(module, _COMBINE_NAME, None)
+            if callable(combine):
+                self._combiners[report_type] = combine
+        if not getattr(module, _CACHEABLE_FLAG_NAME, True):
+            self._uncacheable[report_type] = True
+        columns = getattr(module, _REQUIRED_COLUMNS_NAME, None)
+        if not callable(columns):
+            columns = list(getattr(module, _COLUMNS_NAME, None) or ())
+        if columns:
+            self._columns[report_type] = columns
+        if callable(columnar_handler):
+            self._columnar_handlers[report_type] = columnar_handler
+            self._columnar_schemas[report_type] = dict(getattr(module, _COLUMNAR_SCHEMA_NAME, None) or {})
+
+    def _ensure(self, report_type: str):
+        with self._lock:
+            self._stats["lookups"] += 1
+            module_name = self._index.get(report_type)
+            if module_name is None and report_type not in self._handlers and report_type not in self._stream_handlers:
+                # unknown type: a module may have been added or renamed since the last scan
+                self.index()
+                module_name = self._index.get(report_type)
+            if module_name:
+                self._load(module_name)
+
+    def register(self, report_type: str, handler: Callable[[Dict[str, Any]], Dict[str, Any]], streaming: bool = False):
+        with self._lock:
+            if streaming:
+                self._stream_handlers[report_type] = handler
+            else:
+                self._handlers[report_type] = handler
 
     def get(self, report_type: str) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+        self._ensure(report_type)
         return self._handlers.get(report_type)
 
+    def get_stream(self, report_type: str) -> Optional[Callable[[Dict[str, Any]], Dict[str, Any]]]:
+        self._ensure(report_type)
+        return self._stream_handlers.get(report_type)
+
+    def columnar_schema(self, report_type: str) -> Dict[str, str]:
+        return self._columnar_schemas.get(report_type, {})
+
+    def supports_incremental(self, report_type: str) -> bool:
+        self._ensure(report_type)
+        return self._incremental.get(report_type, False)
+
+    def get_combine(self, report_type: str) -> Optional[Callable[[List[Dict[str, Any]]], Dict[str, Any]]]:
+        self._ensure(report_type)
+        return self._combiners.get(report_type)
+
+    def cacheable(self, report_type: str) -> bool:
+        self._ensure(report_type)
+        return not self._uncacheable.get(report_type, False)
+
+    def required_columns(self, report_type: str, params: Optional[Dict[str, Any]] = None) -> Optional[List[str]]:
+        """Columns the module needs for these params, or None when it reads whole rows."""
+        self._ensure(report_type)
+        columns = self._columns.get(report_type)
+        if callable(columns):
+            columns = columns(params or {})
+        return list(columns) if columns else None
+
+    def code_hash(self, report_type: str) -> str:
+        """sha256 of the source a report's output depends on ("" for handlers registered in code).
+
+        Covers the module, the backend modules it imports (transitively, e.g.
+        sketches) and the executor's loaders (SHARED_SOURCES).
+        """
+        self._ensure(report_type)
+        with self._lock:
+            path = self._files.get(self._index.get(report_type) or "")
+            if not path or self._loaded_mtimes.get(self._index.get(report_type) or "") is None:
+                return ""
+            digest = hashlib.sha256()
+            for dep in self._dependencies(path):
+                digest.update(os.path.relpath(dep, _BACKEND_DIR).encode("utf-8") + b"\0")
+                digest.update(self._file_digest(dep).encode("ascii"))
+            return digest.hexdigest()
+
+    def _file_digest(self, path: str) -> str:
+        # (mtime, digest) per file, so unchanged sources are not re-read on every lookup
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return ""
+        cached = self._code_hashes.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, "rb") as f:
+            source = f.read()
+        digest = hashlib.sha256(source).hexdigest()
+        self._code_hashes[path] = (mtime, digest)
+        deps = set()
+        for match in _BACKEND_IMPORT.finditer(source.decode("utf-8", errors="replace")):
+            module, names, plain = match.groups()
+            candidates = [module or plain] if (module or plain) else [n.strip() for n in names.split(",")]
+            for name in candidates:
+                dep = os.path.join(_BACKEND_DIR, name + ".py")
+                if name and os.path.isfile(dep):
+                    deps.add(dep)
+        self._imports[path] = sorted(deps)
+        return digest
+
+    def _dependencies(self, path: str) -> List[str]:
+        seen: List[str] = []
+        pending = [path] + [os.path.join(_BACKEND_DIR, name) for name in SHARED_SOURCES]
+        while pending:
+            dep = pending.pop()
+            if dep in seen:
+                continue
+            seen.append(dep)
+            self._file_digest(dep)
+            pending.extend(self._imports.get(dep, ()))
+        return sorted(seen)
+
+    def resolve(self, report_type: str, columnar: bool = False) -> Tuple[Optional[Callable[[Dict[str, Any]], Dict[str, Any]]], str]:
+        """Return (handler, mode) where mode is "columnar", "stream" or "rows".
+
+        The columnar entry point is only picked when requested; otherwise the
+        streaming entry point is preferred over process().
+        """
+        self._ensure(report_type)
+        with self._lock:
+            if columnar and report_type in self._columnar_handlers:
+                return self._columnar_handlers[report_type], "columnar"
+            stream_handler = self._stream_handlers.get(report_type)
+            if stream_handler:
+                return stream_handler, "stream"
+            return self._handlers.get(report_type), "rows"
+
     def list(self) -> Dict[str, str]:
-        return {k: v.__module__ for k, v in self._handlers.items()}
+        with self._lock:
+            if not self._index:
+                self.index()
+            listed = dict(self._index)
+            for table in (self._handlers, self._stream_handlers):
+                for k, v in table.items():
+                    listed.setdefault(k, v.__module__)
+            return listed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["indexed"] = len(self._index)
+            out["loaded"] = len(self._loaded_mtimes)
+            return out
+
+
+_shared: Optional[ReportRegistry] = None
+_shared_lock = threading.Lock()
+
+
+def get_registry() -> ReportRegistry:
+    """Process-wide registry shared by report_executor, the API and the scheduler."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = ReportRegistry()
+    return _shared
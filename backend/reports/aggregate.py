@@ -0,0 +1,388 @@
+import heapq
+import json
+import os
+import re
+import tempfile
+from datetime import date
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from backend.sketches import HyperLogLog
+
+REPORT_TYPE = "aggregate"
+# process_stream can resume from a checkpointed state (report_executor incremental mode)
+INCREMENTAL = True
+
+# Configurable group-by rollups (trial balance, GL summaries) in one pass.
+#
+# params.groupBy lists the key fields; "date:month" derives the period from an
+# ISO date (day, month, quarter or year) and "<spec> as <name>" renames the
+# output column. params.measures lists what to compute per group:
+#   count                    rows in the group
+#   count(f)                 rows where f is present
+#   sum(f) avg(f) min(f) max(f)   over numeric values of f
+#   distinct(f)              exact distinct values (memory grows with the values)
+#   approx_distinct(f)       HyperLogLog estimate in at most 2**hllPrecision bytes
+# Rows are folded into an in-memory hash table of partial aggregates. When it
+# holds more than maxGroups groups, every partial is appended to one of
+# `partitions` spill files by key hash and the table starts over. At the end
+# each partition is merged on its own (about 1/partitions of the groups in
+# memory), sorted and written back, and the sorted partitions are k-way merged,
+# so output is in group-key order either way.
+# Incremental runs and parallel chunks return every group as state (checkpoint
+# JSON, pickled chunk results) and their output is not streamed, so they cannot
+# spill: they stop with an error once a run holds more than maxGroups groups.
+DEFAULTS: Dict[str, Any] = {
+    "groupBy": ["account"],
+    "measures": ["count", "sum(amount)"],
+    "maxGroups": 200000,
+    "partitions": 16,
+    "spillDir": None,
+    "hllPrecision": 12,
+    "decimals": 2,
+}
+# bump when the layout of the incremental state changes; older checkpoints start over
+STATE_VERSION = 1
+
+_SPEC = re.compile(r"^\s*([A-Za-z_]+)\s*(?:\(\s*([^()]*?)\s*\))?\s*(?:\s+as\s+(\S+))?\s*$", re.IGNORECASE)
+_OPS = ("count", "sum", "avg", "min", "max", "distinct", "approx_distinct")
+_GRAINS = {"day": 10, "month": 7, "year": 4}
+
+
+def _settings(params: Dict[str, Any]) -> Dict[str, Any]:
+    cfg = dict(DEFAULTS)
+    cfg.update({k: v for k, v in params.items() if k in DEFAULTS and v is not None})
+    for name in ("groupBy", "measures"):
+        if isinstance(cfg[name], str):
+            cfg[name] = [cfg[name]]
+    return cfg
+
+
+def _parse_key(spec: str) -> Tuple[str, Optional[str], str]:
+    # "account", "date:month", "date:quarter as period" -> (field, grain, output name)
+    spec, _, alias = spec.partition(" as ")
+    field, _, grain = spec.strip().partition(":")
+    if grain and grain != "quarter" and grain not in _GRAINS:
+        raise ValueError(f"aggregate: unknown date grain {grain!r} in groupBy (day, month, quarter or year)")
+    return field, grain or None, alias.strip() or (f"{field}_{grain}" if grain else field)
+
+
+def _parse_measure(spec: Any) -> Tuple[str, Optional[str], str]:
+    # "sum(amount) as total" or {"op": "sum", "field": "amount", "as": "total"} -> (op, field, output name)
+    if isinstance(spec, dict):
+        op, field, name = str(spec.get("op", "")).lower(), spec.get("field"), spec.get("as")
+    else:
+        m = _SPEC.match(str(spec))
+        if not m:
+            raise ValueError(f"aggregate: cannot parse measure {spec!r}")
+        op, field, name = m.group(1).lower(), m.group(2) or None, m.group(3)
+    if op not in _OPS:
+        raise ValueError(f"aggregate: unknown measure {op!r} (one of {', '.join(_OPS)})")
+    if field is None and op != "count":
+        raise ValueError(f"aggregate: {op} needs a field, e.g. {op}(amount)")
+    return op, field, name or (f"{op}_{field}" if field else op)
+
+
+def required_columns(params: Dict[str, Any]) -> List[str]:
+    cfg = _settings(params)
+    fields = [_parse_key(spec)[0] for spec in cfg["groupBy"]]
+    fields += [field for _, field, _ in map(_parse_measure, cfg["measures"]) if field]
+    return list(dict.fromkeys(fields))
+
+
+def _period(value: Any, grain: str) -> Any:
+    if isinstance(value, date):
+        # XLSX and Parquet cells arrive as date/datetime rather than ISO text
+        value = value.isoformat()
+    if not isinstance(value, str) or len(value) < 10:
+        return None
+    if grain == "quarter":
+        return f"{value[:4]}-Q{(int(value[5:7]) + 2) // 3}" if value[5:7].isdigit() else None
+    return value[:_GRAINS[grain]]
+
+
+def _sort_key(key: tuple) -> tuple:
+    # numbers before strings before missing values, so mixed-type keys still sort
+    return tuple((0, v, "") if isinstance(v, (int, float)) else (2, 0, "") if v is None else (1, 0, str(v))
+                 for v in key)
+
+
+def _hashable(value: Any) -> Any:
+    # key and distinct values are kept JSON-ready, since they go to spill files and
+    # incremental state: list/dict as JSON text, dates (XLSX, Parquet) as ISO text,
+    # other scalars such as Decimal as str
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, sort_keys=True, default=str)
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+class _Aggregator:
+    """Hash table of per-group partial aggregates, spilled to partition files when it grows too large."""
+
+    def __init__(self, params: Dict[str, Any], state: Optional[Dict[str, Any]] = None, stateful: bool = False):
+        self.cfg = cfg = _settings(params)
+        # the result carries every group as state, so the table must not spill
+        self.stateful = stateful
+        self.keys = [_parse_key(spec) for spec in cfg["groupBy"]]
+        self.measures = [_parse_measure(spec) for spec in cfg["measures"]]
+        self.max_groups = max(1, int(cfg["maxGroups"]))
+        self.partitions = max(1, int(cfg["partitions"]))
+        self.precision = int(cfg["hllPrecision"])
+        # an explicit null keeps full float precision
+        self.decimals = params["decimals"] if "decimals" in params else cfg["decimals"]
+        # one accumulator slot per measure; avg keeps [sum, n] in its slot
+        self.table: Dict[tuple, List[Any]] = {}
+        self.rows = 0
+        self.spills = self.spilled_groups = 0
+        self._spill_dir: Optional[tempfile.TemporaryDirectory] = None
+        self._spill_files: List[Any] = []
+        if state and state.get("v") == STATE_VERSION:
+            self.rows = state["rows"]
+            for key, acc in state["groups"]:
+                self.merge_group(tuple(key), self._load(acc))
+
+    def _new(self) -> List[Any]:
+        acc: List[Any] = []
+        for op, _, _ in self.measures:
+            if op in ("count", "sum"):
+                acc.append(0)
+            elif op == "avg":
+                acc.append([0, 0])
+            elif op == "distinct":
+                acc.append(set())
+            elif op == "approx_distinct":
+                acc.append(HyperLogLog(self.precision))
+            else:
+                acc.append(None)
+        return acc
+
+    def add(self, row: Dict[str, Any]):
+        self.rows += 1
+        get = row.get
+        key = tuple(get(field) if grain is None else _period(get(field), grain) for field, grain, _ in self.keys)
+        try:
+            acc = self.table.get(key)
+        except TypeError:
+            acc = None
+        if acc is None:
+            # only rows that miss pay for normalizing the key; plain keys come back unchanged
+            key = tuple(_hashable(v) for v in key)
+            acc = self.table.get(key)
+            if acc is None:
+                if len(self.table) >= self.max_groups:
+                    self._spill()
+                acc = self.table[key] = self._new()
+        for i, (op, field, _) in enumerate(self.measures):
+            if field is None:
+                acc[i] += 1
+                continue
+            v = get(field)
+            if v is None:
+                continue
+            if op == "count":
+                acc[i] += 1
+            elif op == "distinct":
+                acc[i].add(_hashable(v))
+            elif op == "approx_distinct":
+                acc[i].add(v)
+            elif v.__class__ is bool or not isinstance(v, (int, float)):
+                continue
+            elif op == "sum":
+                acc[i] += v
+            elif op == "avg":
+                acc[i][0] += v
+                acc[i][1] += 1
+            elif op == "min":
+                if acc[i] is None or v < acc[i]:
+                    acc[i] = v
+            elif acc[i] is None or v > acc[i]:
+                acc[i] = v
+
+    def _merge_acc(self, acc: List[Any], other: List[Any]):
+        for i, (op, _, _) in enumerate(self.measures):
+            b = other[i]
+            if op in ("count", "sum"):
+                acc[i] += b
+            elif op == "avg":
+                acc[i][0] += b[0]
+                acc[i][1] += b[1]
+            elif op == "distinct":
+                acc[i] |= b
+            elif op == "approx_distinct":
+                acc[i].merge(b)
+            elif b is not None and (acc[i] is None or (b < acc[i] if op == "min" else b > acc[i])):
+                acc[i] = b
+
+    def merge_group(self, key: tuple, acc: List[Any]):
+        mine = self.table.get(key)
+        if mine is not None:
+            self._merge_acc(mine, acc)
+            return
+        if len(self.table) >= self.max_groups:
+            self._spill()
+        self.table[key] = acc
+
+    def _dump(self, acc: List[Any]) -> List[Any]:
+        out = []
+        for (op, _, _), v in zip(self.measures, acc):
+            out.append(sorted(v, key=str) if op == "distinct" else v.to_state() if op == "approx_distinct" else v)
+        return out
+
+    def _load(self, acc: List[Any]) -> List[Any]:
+        out = []
+        for (op, _, _), v in zip(self.measures, acc):
+            if op == "distinct":
+                v = set(v)
+            elif op == "approx_distinct":
+                v = HyperLogLog.from_state(v)
+            out.append(v)
+        return out
+
+    def _spill(self, final: bool = False):
+        # append every partial to its key's partition file; later partials of the same key merge at the end
+        if self.stateful and not final:
+            raise ValueError(f"aggregate: more than maxGroups ({self.max_groups}) groups in an incremental or "
+                             f"parallel run, which keeps every group in memory; raise maxGroups or run it serially")
+        if self._spill_dir is None:
+            spill_dir = self.cfg["spillDir"] or os.environ.get("AGGREGATE_SPILL_DIR") or None
+            if spill_dir:
+                os.makedirs(spill_dir, exist_ok=True)
+            self._spill_dir = tempfile.TemporaryDirectory(prefix="aggregate-spill-", dir=spill_dir)
+            self._spill_files = [open(os.path.join(self._spill_dir.name, f"part-{i:03d}.jsonl"), "w+", encoding="utf-8")
+                                 for i in range(self.partitions)]
+        files, n = self._spill_files, self.partitions
+        for key, acc in self.table.items():
+            files[hash(key) % n].write(json.dumps([key, self._dump(acc)], ensure_ascii=False) + "\n")
+        if not final:
+            self.spills += 1
+            self.spilled_groups += len(self.table)
+        self.table = {}
+
+    def _sorted_runs(self) -> List[Iterator[Tuple[tuple, List[Any]]]]:
+        self._spill(final=True)
+        runs = []
+        for i, f in enumerate(self._spill_files):
+            f.seek(0)
+            groups: Dict[tuple, List[Any]] = {}
+            for line in f:
+                key, acc = json.loads(line)
+                key, acc = tuple(key), self._load(acc)
+                mine = groups.get(key)
+                if mine is None:
+                    groups[key] = acc
+                else:
+                    self._merge_acc(mine, acc)
+            f.close()
+            # the merged, sorted partition replaces the raw partials on disk
+            run_path = os.path.join(self._spill_dir.name, f"run-{i:03d}.jsonl")
+            with open(run_path, "w", encoding="utf-8") as out:
+                for key in sorted(groups, key=_sort_key):
+                    out.write(json.dumps([key, self._dump(groups[key])], ensure_ascii=False) + "\n")
+            os.unlink(f.name)
+            groups.clear()
+            runs.append(self._read_run(run_path))
+        return runs
+
+    def _read_run(self, path: str) -> Iterator[Tuple[tuple, List[Any]]]:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                key, acc = json.loads(line)
+                yield tuple(key), self._load(acc)
+
+    def groups(self) -> Iterator[Tuple[tuple, List[Any]]]:
+        """Every (key, partial) in group-key order; spill files are removed once consumed."""
+        if self._spill_dir is None:
+            for key in sorted(self.table, key=_sort_key):
+                yield key, self.table[key]
+            return
+        try:
+            yield from heapq.merge(*self._sorted_runs(), key=lambda item: _sort_key(item[0]))
+        finally:
+            self.close()
+
+    def close(self):
+        for f in self._spill_files:
+            f.close()
+        if self._spill_dir is not None:
+            self._spill_dir.cleanup()
+        self._spill_dir, self._spill_files = None, []
+
+    def record(self, key: tuple, acc: List[Any]) -> Dict[str, Any]:
+        out = {name: value for (_, _, name), value in zip(self.keys, key)}
+        for (op, _, name), v in zip(self.measures, acc):
+            if op == "avg":
+                v = v[0] / v[1] if v[1] else None
+            elif op == "distinct":
+                v = len(v)
+            elif op == "approx_distinct":
+                v = v.count()
+            if self.decimals is not None and isinstance(v, float):
+                v = round(v, int(self.decimals))
+            out[name] = v
+        return out
+
+    def result(self, emit=None, keep_state: bool = False) -> Dict[str, Any]:
+        groups: List[Dict[str, Any]] = []
+        state_groups: List[Any] = []
+        totals = self._new()
+        count = 0
+        for key, acc in self.groups():
+            count += 1
+            record = self.record(key, acc)
+            if emit:
+                emit(record)
+            else:
+                groups.append(record)
+            if keep_state:
+                state_groups.append([list(key), self._dump(acc)])
+            self._merge_acc(totals, acc)
+        data: Dict[str, Any] = {"totals": self.record((), totals)}
+        if emit:
+            # every group was already written as a JSONL record
+            data["streamed"] = True
+        else:
+            data["groups"] = groups
+        metrics = {"rows": self.rows, "groups": count, "spills": self.spills, "spilledGroups": self.spilled_groups}
+        result = {"ok": True, "data": data, "metrics": metrics}
+        if keep_state:
+            result["state"] = {"v": STATE_VERSION, "rows": self.rows, "groups": state_groups}
+        return result
+
+
+def process_stream(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    # ctx["rows"] is an iterator; memory is bounded by maxGroups partials, not rows
+    # incremental runs (and parallel chunks) pass the previous state and get the merged one back
+    params = ctx.get("params") or {}
+    emit = ctx.get("emit") if "state" not in ctx else None
+    agg = _Aggregator(params, ctx.get("state"), stateful="state" in ctx)
+    try:
+        add = agg.add
+        for row in ctx.get("rows") or ():
+            if isinstance(row, dict):
+                add(row)
+        return agg.result(emit, keep_state="state" in ctx)
+    finally:
+        agg.close()
+
+
+def combine(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # parts: chunk results in input order, each carrying the chunk's partial aggregates as state
+    params = (parts[0].get("params") if parts else None) or {}
+    merged = _Aggregator(params)
+    try:
+        for part in parts:
+            state = part["result"]["state"]
+            merged.rows += state["rows"]
+            for key, acc in state["groups"]:
+                merged.merge_group(tuple(key), merged._load(acc))
+        return merged.result()
+    finally:
+        merged.close()
+
+
+def process(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    data = ctx.get("data") or []
+    return process_stream({"rows": iter(data), "params": ctx.get("params", {}), "emit": ctx.get("emit")})
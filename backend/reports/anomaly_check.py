@@ -1,16 +1,317 @@
-from typing import Dict, Any
+import heapq
+import math
+from typing import Dict, Any, List, Optional, Tuple
+
+from backend.sketches import P2Quantile, Welford, benford_mad, first_digit
 
 REPORT_TYPE = "anomaly-check"
 
-# Very naive anomaly check: flag records with negative amount
+# Columns decoded for the columnar engine (see backend.columnar)
+COLUMNAR_SCHEMA = {"amount": "float64"}
+# process_stream can resume from a checkpointed state (report_executor incremental mode)
+INCREMENTAL = True
+
+# Streaming statistical anomaly detection in one pass over the ledger.
+#
+# Every row joins one group per params.groupBy field (e.g. "account=6300 Travel",
+# "vendor=Vendor 007"). A group keeps a Welford mean/variance, P-square sketches
+# of the median and of the absolute deviation from it (MAD), and leading-digit
+# counts, so memory grows with the number of groups, never the number of rows.
+# A row is scored against what its groups looked like before it arrived:
+#   negative  amount < 0
+#   zscore    |x - mean| / std above zThreshold
+#   robust    modified z-score 0.6745 * |x - median| / MAD above robustThreshold
+# Once the input is exhausted, groups with at least benfordMinCount amounts get a
+# Benford first-digit test (mean absolute deviation above benfordThreshold).
+# zscore/robust work on sign * log1p(|amount|) unless logScale is false, since
+# ledger amounts are roughly log-normal. Severity is the largest score/threshold
+# ratio, and only the topK most severe findings are kept.
+DEFAULTS: Dict[str, Any] = {
+    "groupBy": ["account", "vendor"],
+    "detectors": ["negative", "zscore", "robust", "benford"],
+    "zThreshold": 4.0,
+    "robustThreshold": 3.5,
+    "logScale": True,
+    "minSamples": 100,
+    "benfordThreshold": 0.015,
+    "benfordMinCount": 500,
+    "benfordMinAmount": 10.0,
+    "topK": 100,
+    "maxGroups": 100000,
+}
+# bump when the layout of the incremental state changes; older checkpoints start over
+STATE_VERSION = 2
+
+
+def _settings(params: Dict[str, Any]) -> Dict[str, Any]:
+    cfg = dict(DEFAULTS)
+    cfg.update({k: v for k, v in params.items() if k in DEFAULTS and v is not None})
+    if isinstance(cfg["groupBy"], str):
+        cfg["groupBy"] = [cfg["groupBy"]]
+    if isinstance(cfg["detectors"], str):
+        cfg["detectors"] = [cfg["detectors"]]
+    return cfg
+
+
+def required_columns(params: Dict[str, Any]):
+    # flagged rows are embedded whole, so project only when rows are referenced by index
+    # or params name the fields to keep
+    needed = ["amount"] + [c for c in _settings(params)["groupBy"] if c != "amount"]
+    if params.get("rowRef") == "index":
+        return needed
+    keep = params.get("keepColumns")
+    return needed + [c for c in keep if c not in needed] if keep else None
+
+
+def _finding(index: int, row: Any, params: Dict[str, Any]) -> Dict[str, Any]:
+    # output.rowRef == "index" references the input row instead of copying it
+    if params.get("rowRef") == "index":
+        return {"index": index}
+    return {"index": index, "row": row}
+
+
+class _Group:
+    __slots__ = ("stats", "median", "spread", "digits")
+
+    def __init__(self):
+        self.stats = Welford()
+        self.median = P2Quantile()
+        self.spread = P2Quantile()
+        self.digits = [0] * 9
+
+    def to_state(self) -> List[Any]:
+        return [self.stats.to_state(), self.median.to_state(), self.spread.to_state(), self.digits]
+
+    @classmethod
+    def from_state(cls, state: List[Any]) -> "_Group":
+        group = cls()
+        group.stats = Welford.from_state(state[0])
+        group.median = P2Quantile.from_state(state[1])
+        group.spread = P2Quantile.from_state(state[2])
+        group.digits = [int(c) for c in state[3]]
+        return group
+
+    def merge(self, other: "_Group"):
+        self.stats.merge(other.stats)
+        self.median.merge(other.median)
+        self.spread.merge(other.spread)
+        self.digits = [a + b for a, b in zip(self.digits, other.digits)]
+
+
+class _Detector:
+    """Group sketches plus a bounded min-heap of the most severe row findings."""
+
+    def __init__(self, params: Dict[str, Any], state: Optional[Dict[str, Any]] = None, emit=None):
+        self.params = params
+        self.cfg = cfg = _settings(params)
+        self.emit = emit
+        detectors = set(cfg["detectors"])
+        self.negative = "negative" in detectors
+        self.zscore = "zscore" in detectors
+        self.robust = "robust" in detectors
+        self.benford = "benford" in detectors
+        self.group_by = list(cfg["groupBy"])
+        self.z_threshold = float(cfg["zThreshold"])
+        self.robust_threshold = float(cfg["robustThreshold"])
+        self.log_scale = bool(cfg["logScale"])
+        self.min_samples = int(cfg["minSamples"])
+        self.benford_min_amount = float(cfg["benfordMinAmount"])
+        self.top_k = max(0, int(cfg["topK"]))
+        self.max_groups = int(cfg["maxGroups"])
+        # groupBy field -> field value (as str) -> sketches
+        self.groups: Dict[str, Dict[str, _Group]] = {field: {} for field in self.group_by}
+        self.group_count = 0
+        # (severity, -index, finding): the root is the least severe, latest row
+        self.top: List[Tuple[float, int, Dict[str, Any]]] = []
+        self.rows = self.flagged = self.untracked = 0
+        if state and state.get("v") == STATE_VERSION:
+            for field, groups in state["groups"].items():
+                if field in self.groups:
+                    self.groups[field] = {value: _Group.from_state(g) for value, g in groups.items()}
+                    self.group_count += len(groups)
+            self.rows, self.flagged, self.untracked = state["rows"], state["flagged"], state["untracked"]
+            for finding in state["top"]:
+                self._keep(finding)
+
+    def _keep(self, finding: Dict[str, Any]):
+        if not self.top_k:
+            return
+        item = (finding["severity"], -finding["index"], finding)
+        if len(self.top) < self.top_k:
+            heapq.heappush(self.top, item)
+        elif item[:2] > self.top[0][:2]:
+            heapq.heapreplace(self.top, item)
+
+    def add(self, index: int, row: Dict[str, Any], amount: float):
+        self.rows += 1
+        value = math.copysign(math.log1p(abs(amount)), amount) if self.log_scale else amount
+        digit = first_digit(amount) if self.benford and abs(amount) >= self.benford_min_amount else 0
+        reasons = None
+        if self.negative and amount < 0:
+            reasons = [{"test": "negative", "score": amount, "severity": 1.0}]
+        for field, groups in self.groups.items():
+            key = row.get(field)
+            if key is None:
+                continue
+            if key.__class__ is not str:
+                # state keys are strings, so 6300 and "6300" are the same group across runs
+                key = str(key)
+            group = groups.get(key)
+            if group is None:
+                if self.group_count >= self.max_groups:
+                    self.untracked += 1
+                    continue
+                group = groups[key] = _Group()
+                self.group_count += 1
+            stats = group.stats
+            if stats.n >= self.min_samples:
+                if self.zscore:
+                    std = stats.std
+                    if std > 0:
+                        score = abs(value - stats.mean) / std
+                        if score > self.z_threshold:
+                            reasons = reasons or []
+                            reasons.append({"test": "zscore", "group": f"{field}={key}", "score": round(score, 3),
+                                            "severity": score / self.z_threshold})
+                if self.robust:
+                    mad = group.spread.value()
+                    if mad:
+                        score = 0.6745 * abs(value - group.median.value()) / mad
+                        if score > self.robust_threshold:
+                            reasons = reasons or []
+                            reasons.append({"test": "robust", "group": f"{field}={key}", "score": round(score, 3),
+                                            "severity": score / self.robust_threshold})
+            stats.add(value)
+            median = group.median
+            median.add(value)
+            group.spread.add(abs(value - median.value()))
+            if digit:
+                group.digits[digit - 1] += 1
+        if reasons:
+            self.flagged += 1
+            finding = _finding(index, row, self.params)
+            finding["severity"] = round(max(r["severity"] for r in reasons), 3)
+            for r in reasons:
+                r["severity"] = round(r["severity"], 3)
+            finding["reasons"] = reasons
+            if self.emit:
+                self.emit(finding)
+            self._keep(finding)
+
+    def merge(self, other: "_Detector", offset: int):
+        # other covered rows after this one's; its row indexes are rebased by offset
+        for field, groups in other.groups.items():
+            mine = self.groups.setdefault(field, {})
+            for key, group in groups.items():
+                if key in mine:
+                    mine[key].merge(group)
+                elif self.group_count < self.max_groups:
+                    mine[key] = group
+                    self.group_count += 1
+                else:
+                    self.untracked += group.stats.n
+        self.rows += other.rows
+        self.flagged += other.flagged
+        self.untracked += other.untracked
+        for _, _, finding in other.top:
+            self._keep(dict(finding, index=finding["index"] + offset))
+
+    def group_findings(self) -> List[Dict[str, Any]]:
+        if not self.benford:
+            return []
+        threshold = float(self.cfg["benfordThreshold"])
+        min_count = int(self.cfg["benfordMinCount"])
+        findings = []
+        for field, groups in self.groups.items():
+            for key, group in groups.items():
+                n = sum(group.digits)
+                if n < min_count:
+                    continue
+                mad = benford_mad(group.digits)
+                if mad > threshold:
+                    findings.append({"group": f"{field}={key}", "severity": round(mad / threshold, 3), "count": n,
+                                     "reasons": [{"test": "benford", "score": round(mad, 5),
+                                                  "digits": [round(c / n, 4) for c in group.digits]}]})
+        return findings
+
+    def result(self, emitted: bool = False) -> Dict[str, Any]:
+        groups = self.group_findings()
+        if emitted:
+            for finding in groups:
+                self.emit(finding)
+        ranked = [item[2] for item in self.top] + groups
+        # most severe first; rows in input order on ties, group findings after rows
+        ranked.sort(key=lambda f: (-f["severity"], f.get("index", float("inf"))))
+        ranked = ranked[:self.top_k]
+        data: Dict[str, Any] = {"anomalies": ranked}
+        if emitted:
+            # every finding was already written as a JSONL record; the summary keeps the top of the ranking
+            data["streamed"] = True
+        metrics = {"count": self.flagged + len(groups), "rows": self.rows, "flaggedRows": self.flagged,
+                   "flaggedGroups": len(groups), "groups": self.group_count, "returned": len(ranked)}
+        if self.untracked:
+            metrics["untrackedGroupRows"] = self.untracked
+        return {"ok": True, "data": data, "metrics": metrics}
+
+    def state(self) -> Dict[str, Any]:
+        groups = {field: {key: g.to_state() for key, g in by_value.items()} for field, by_value in self.groups.items()}
+        return {"v": STATE_VERSION, "groups": groups,
+                "top": [item[2] for item in self.top], "rows": self.rows, "flagged": self.flagged,
+                "untracked": self.untracked}
+
+
+def _amount(row: Any) -> Optional[float]:
+    if not isinstance(row, dict):
+        return None
+    amt = row.get("amount")
+    if isinstance(amt, bool) or not isinstance(amt, (int, float)) or amt != amt:
+        return None
+    return float(amt)
+
+
+def process_stream(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    # ctx["rows"] is an iterator; memory is bounded by groups and topK, not rows
+    # incremental runs (and parallel chunks) pass the previous state and the global index of the first new row
+    params = ctx.get("params") or {}
+    emit = ctx.get("emit") if "state" not in ctx else None
+    detector = _Detector(params, ctx.get("state"), emit)
+    for i, row in enumerate(ctx.get("rows") or (), ctx.get("startIndex") or 0):
+        amt = _amount(row)
+        if amt is not None:
+            detector.add(i, row, amt)
+    result = detector.result(emitted=bool(emit))
+    if "state" in ctx:
+        result["state"] = detector.state()
+    return result
+
+
+def combine(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # parts: chunk results in input order, each with the global startIndex of its first row and
+    # the chunk's detector state. Rows were scored against their chunk's statistics; the group
+    # sketches and Benford counts are merged before the group tests run.
+    if not parts:
+        return _Detector({}).result()
+    params = parts[0].get("params") or {}
+    merged = _Detector(params)
+    for part in parts:
+        merged.merge(_Detector(params, part["result"]["state"]), part["startIndex"])
+    return merged.result()
+
+
+def process_columnar(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    # the group sketches are updated row by row; the columnar path contributes the
+    # typed amount decode (non-numeric amounts become NaN and are skipped)
+    params = ctx.get("params") or {}
+    emit = ctx.get("emit")
+    detector = _Detector(params, emit=emit)
+    for batch in ctx.get("batches") or ():
+        rows = batch.rows
+        for j, amt in enumerate(batch["amount"].tolist()):
+            if amt == amt:
+                detector.add(batch.offset + j, rows[j], amt)
+    return detector.result(emitted=bool(emit))
+
 
 def process(ctx: Dict[str, Any]) -> Dict[str, Any]:
     data = ctx.get("data") or []
-    anomalies = []
-    for i, row in enumerate(data):
-        amt = None
-        if isinstance(row, dict):
-            amt = row.get("amount")
-        if isinstance(amt, (int, float)) and amt < 0:
-            anomalies.append({"index": i, "row": row})
-    return {"ok": True, "data": {"anomalies": anomalies}, "metrics": {"count": len(anomalies)}}
+    return process_stream({"rows": iter(data), "params": ctx.get("params", {}), "emit": ctx.get("emit")})
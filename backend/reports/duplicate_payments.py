@@ -0,0 +1,464 @@
+import hashlib
+import heapq
+import json
+import os
+import re
+import sqlite3
+import zlib
+from datetime import date, datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+
+REPORT_TYPE = "duplicate-payments"
+# Findings depend on the persistent index as well as the input, so results are never cached
+CACHEABLE = False
+
+# Duplicate and near-duplicate payment detection against a persistent SQLite index.
+#
+# Rows are checked in batches: the batch goes into a temp table and is joined
+# against the index (B-tree lookups, no pairwise comparisons), rows earlier in
+# the same batch are matched from in-memory maps, then the batch is appended to
+# the index. Each batch is therefore checked against all earlier runs and
+# against itself:
+#   exact        same vendor, amount (cents) and normalized invoice number
+#   amount-date  same amount within windowDays (same vendor unless windowScope is "any")
+#   invoice      same vendor and amount, invoice numbers within maxEdits edits (the
+#                amount is required: sequential invoice numbers are one edit apart).
+#                Symmetric-delete index: every invoice is stored under the hash of each
+#                string left by deleting up to maxEdits characters, so candidates come
+#                from equality joins
+# Rows already in the index (same idField value and the same vendor, amount, date
+# and invoice, or same content at the same input position when rows carry no id;
+# ids alone are not enough since many exports restart them per file) are skipped, so re-running a ledger costs one
+# lookup per row and reports nothing new. The index only advances when a run completes.
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_INDEX_DIR = os.environ.get('DUPLICATE_INDEX_DIR') or os.path.join(REPO_ROOT, 'resources', 'duplicate-index')
+
+DEFAULTS: Dict[str, Any] = {
+    "vendorField": "vendor",
+    "amountField": "amount",
+    "dateField": "date",
+    "invoiceField": "invoice",
+    "idField": "id",
+    "windowDays": 7,
+    "windowScope": "vendor",
+    "maxEdits": 1,
+    "minInvoiceLength": 5,
+    "maxMatches": 5,
+    "topK": 1000,
+    "indexName": "default",
+    "indexPath": None,
+    "batchSize": 2000,
+}
+# exact matches rank above amount/date window matches, which rank above similar invoices
+KIND_RANK = {"exact": 3, "amount-date": 2, "invoice": 1}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS payments (
+    id INTEGER PRIMARY KEY,
+    ref TEXT NOT NULL,
+    vendor TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    day INTEGER,
+    invoice TEXT NOT NULL,
+    run TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS payments_ref ON payments (ref);
+CREATE INDEX IF NOT EXISTS payments_exact ON payments (vendor, amount, invoice);
+CREATE INDEX IF NOT EXISTS payments_amount_day ON payments (amount, day);
+CREATE TABLE IF NOT EXISTS invoice_variants (
+    variant INTEGER NOT NULL,
+    payment_id INTEGER NOT NULL,
+    PRIMARY KEY (variant, payment_id)
+) WITHOUT ROWID;
+CREATE TEMP TABLE IF NOT EXISTS batch (k INTEGER PRIMARY KEY, vendor TEXT, amount INTEGER, day INTEGER, invoice TEXT);
+"""
+_COLUMNS = "p.id, p.ref, p.vendor, p.amount, p.day, p.invoice, p.run"
+# PRAGMA user_version of the index; 1: id refs carry a digest of the payment
+_INDEX_VERSION = 1
+
+_INVOICE_JUNK_RE = re.compile(r'[^0-9A-Z]')
+_UNSAFE_NAME_RE = re.compile(r'[^\w.\-]')
+
+
+def _settings(params: Dict[str, Any]) -> Dict[str, Any]:
+    cfg = dict(DEFAULTS)
+    cfg.update({k: v for k, v in params.items() if k in DEFAULTS and v is not None})
+    return cfg
+
+
+def index_path(params: Dict[str, Any]) -> str:
+    """SQLite file for params: indexPath, else one file per indexName under DUPLICATE_INDEX_DIR."""
+    cfg = _settings(params)
+    if cfg["indexPath"]:
+        return cfg["indexPath"]
+    return os.path.join(DEFAULT_INDEX_DIR, _UNSAFE_NAME_RE.sub('_', str(cfg["indexName"])) + '.db')
+
+
+def required_columns(params: Dict[str, Any]):
+    # like anomaly-check: flagged rows are embedded whole unless referenced by index or keepColumns is set
+    cfg = _settings(params)
+    needed = [cfg[k] for k in ("amountField", "vendorField", "dateField", "invoiceField", "idField")]
+    if params.get("rowRef") == "index":
+        return needed
+    keep = params.get("keepColumns")
+    return needed + [c for c in keep if c not in needed] if keep else None
+
+
+def _finding(index: int, row: Any, params: Dict[str, Any]) -> Dict[str, Any]:
+    if params.get("rowRef") == "index":
+        return {"index": index}
+    return {"index": index, "row": row}
+
+
+def _cents(value: Any) -> Optional[int]:
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(round(value * 100)) if value == value else None
+
+
+def _day(value: Any) -> Optional[int]:
+    # ISO strings (date part only), date and datetime values -> proleptic ordinal
+    if isinstance(value, date):
+        return value.toordinal()
+    if isinstance(value, str) and len(value) >= 10:
+        try:
+            return date.fromisoformat(value[:10]).toordinal()
+        except ValueError:
+            return None
+    return None
+
+
+def _norm_invoice(value: Any) -> str:
+    return _INVOICE_JUNK_RE.sub('', str(value).upper()) if value not in (None, "") else ""
+
+
+def _deletes(word: str, max_edits: int) -> Set[str]:
+    """word plus every string reachable by deleting up to max_edits characters."""
+    out = {word}
+    frontier = {word}
+    for _ in range(max_edits):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - out
+        out |= frontier
+    return out
+
+
+def _content_digest(vendor: str, amount: Optional[int], day: Optional[int], invoice: str) -> str:
+    raw = f"{vendor}\x1f{amount}\x1f{day}\x1f{invoice}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _variant_keys(vendor: str, variants: Iterable[str]) -> List[int]:
+    # 64-bit signed keys: crc32(vendor) in the high half, crc32(variant) in the low half.
+    # Collisions only add candidates, which the vendor and edit-distance checks drop.
+    high = (zlib.crc32(vendor.encode("utf-8")) ^ 0x80000000) - 0x80000000
+    return [(high << 32) | zlib.crc32(v.encode("ascii")) for v in variants]
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (adjacent transpositions count once); limit + 1 when above limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class _Record:
+    """One new row of the batch, normalized; `hit` has the shape of an index row."""
+    __slots__ = ("k", "index", "row", "ref", "vendor", "amount", "day", "invoice", "variants", "hit")
+
+    def __init__(self, k: int, index: int, row: Dict[str, Any], ref: str, vendor: str, amount: int,
+                 day: Optional[int], invoice: str, variants: List[int]):
+        self.k, self.index, self.row, self.ref = k, index, row, ref
+        self.vendor, self.amount, self.day, self.invoice, self.variants = vendor, amount, day, invoice, variants
+        self.hit: Tuple = ()
+
+
+class DuplicateIndex:
+    """Persistent payment index (SQLite, WAL). Use one file per ledger or entity."""
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.executescript(_SCHEMA)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < _INDEX_VERSION:
+            self._upgrade()
+
+    def _upgrade(self):
+        # indexes written before refs carried a content digest: "id:<id>" -> "id:<id>:<digest>"
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute("SELECT id, ref, vendor, amount, day, invoice FROM payments "
+                                     "WHERE ref LIKE 'id:%'").fetchall()
+            self.conn.executemany("UPDATE payments SET ref = ? WHERE id = ?",
+                                  [(f"{ref}:{_content_digest(vendor, amount, day, invoice)}", pid)
+                                   for pid, ref, vendor, amount, day, invoice in rows])
+            self.conn.execute(f"PRAGMA user_version = {_INDEX_VERSION}")
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        self.conn.close()
+
+    def size(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM payments").fetchone()[0]
+
+    def next_id(self) -> int:
+        return self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM payments").fetchone()[0]
+
+    def known(self, refs: List[str]) -> Set[str]:
+        found: Set[str] = set()
+        for start in range(0, len(refs), 500):
+            chunk = refs[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            found.update(r[0] for r in self.conn.execute(f"SELECT ref FROM payments WHERE ref IN ({marks})", chunk))
+        return found
+
+    def candidates(self, records: List[_Record], window_days: int, window_any: bool,
+                   similar: bool) -> Dict[str, Dict[int, List[Tuple]]]:
+        """History rows per batch position k: {"exact": {k: [...]}, "window": ..., "similar": ...}."""
+        conn = self.conn
+        conn.execute("DELETE FROM batch")
+        conn.executemany("INSERT INTO batch (k, vendor, amount, day, invoice) VALUES (?, ?, ?, ?, ?)",
+                         [(r.k, r.vendor, r.amount, r.day, r.invoice) for r in records])
+        out: Dict[str, Dict[int, List[Tuple]]] = {"exact": {}, "window": {}, "similar": {}}
+
+        def collect(kind: str, sql: str, args: Tuple = ()):
+            bucket = out[kind]
+            for k, *hit in conn.execute(sql, args):
+                bucket.setdefault(k, []).append(tuple(hit))
+
+        collect("exact", f"SELECT b.k, {_COLUMNS} FROM batch b CROSS JOIN payments p "
+                         "ON p.vendor = b.vendor AND p.amount = b.amount AND p.invoice = b.invoice WHERE b.invoice != ''")
+        if window_days:
+            scope = "" if window_any else " AND p.vendor = b.vendor"
+            collect("window", f"SELECT b.k, {_COLUMNS} FROM batch b CROSS JOIN payments p "
+                              f"ON p.amount = b.amount AND p.day BETWEEN b.day - ? AND b.day + ?{scope} "
+                              "WHERE b.day IS NOT NULL ORDER BY b.k, p.day", (window_days, window_days))
+        if similar:
+            # variant keys are probed in key order; a payment can come back under several variants
+            owners: Dict[int, List[int]] = {}
+            for r in records:
+                for v in r.variants:
+                    owners.setdefault(v, []).append(r.k)
+            keys = sorted(owners)
+            bucket = out["similar"]
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                for variant, *hit in conn.execute(
+                        f"SELECT v.variant, {_COLUMNS} FROM invoice_variants v CROSS JOIN payments p "
+                        f"ON p.id = v.payment_id WHERE v.variant IN ({marks})", chunk):
+                    hit = tuple(hit)
+                    for k in owners[variant]:
+                        bucket.setdefault(k, []).append(hit)
+        return out
+
+    def add_many(self, records: List[_Record], run: str):
+        self.conn.executemany(
+            "INSERT INTO payments (id, ref, vendor, amount, day, invoice, run) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(r.hit[0], r.ref, r.vendor, r.amount, r.day, r.invoice, run) for r in records])
+        # sorted, so the batch lands in the variant B-tree in key order
+        self.conn.executemany("INSERT OR IGNORE INTO invoice_variants (variant, payment_id) VALUES (?, ?)",
+                              sorted((v, r.hit[0]) for r in records for v in r.variants))
+
+
+def _match(kind: str, hit: Tuple, **extra) -> Dict[str, Any]:
+    _, ref, vendor, amount, day, invoice, run = hit
+    out = {"kind": kind, "ref": ref, "vendor": vendor, "amount": amount / 100,
+           "date": date.fromordinal(day).isoformat() if day else None, "invoice": invoice, "indexedAt": run}
+    out.update(extra)
+    return out
+
+
+class _Checker:
+    def __init__(self, index: DuplicateIndex, params: Dict[str, Any], emit=None):
+        self.index = index
+        self.params = params
+        self.cfg = cfg = _settings(params)
+        self.emit = emit
+        self.fields = (cfg["vendorField"], cfg["amountField"], cfg["dateField"], cfg["invoiceField"], cfg["idField"])
+        self.window_days = int(cfg["windowDays"] or 0)
+        self.window_any = cfg["windowScope"] == "any"
+        self.max_edits = int(cfg["maxEdits"] or 0)
+        self.min_invoice = int(cfg["minInvoiceLength"])
+        self.max_matches = int(cfg["maxMatches"])
+        self.top_k = max(0, int(cfg["topK"]))
+        self.run = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.next_id = index.next_id()
+        # (rank, -index, finding): the root is the weakest, latest finding
+        self.top: List[Tuple[int, int, Dict[str, Any]]] = []
+        self.counts = {"rows": 0, "indexed": 0, "known": 0, "skipped": 0, "count": 0,
+                       "exact": 0, "amountDate": 0, "invoice": 0}
+
+    def _ref(self, index: int, row: Dict[str, Any], vendor: str, amount: Optional[int], day: Optional[int],
+             invoice: str) -> str:
+        rid = row.get(self.fields[4])
+        if rid is not None and rid != "":
+            # the same id with different content is a different payment (ids restart per export)
+            return f"id:{rid}:{_content_digest(vendor, amount, day, invoice)}"
+        digest = hashlib.sha1(json.dumps(row, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return f"{digest[:24]}@{index}"
+
+    def _records(self, batch: List[Tuple[int, Dict[str, Any]]]) -> List[_Record]:
+        vendor_field, amount_field, date_field, invoice_field, _ = self.fields
+        normalized = [(str(row.get(vendor_field) or "").strip().casefold(), _cents(row.get(amount_field)),
+                       _day(row.get(date_field)), _norm_invoice(row.get(invoice_field))) for _, row in batch]
+        refs = [self._ref(i, row, *values) for (i, row), values in zip(batch, normalized)]
+        known = self.index.known(refs)
+        records: List[_Record] = []
+        seen: Set[str] = set()
+        for (i, row), ref, (vendor, amount, day, invoice) in zip(batch, refs, normalized):
+            self.counts["rows"] += 1
+            # a ref repeated inside the batch is the same payment listed twice: checked once
+            if ref in known or ref in seen:
+                self.counts["known"] += 1
+                continue
+            seen.add(ref)
+            if amount is None:
+                self.counts["skipped"] += 1
+                continue
+            variants: List[int] = []
+            if self.max_edits and len(invoice) >= self.min_invoice:
+                # scoped to the vendor: similar invoice numbers across vendors are common and benign
+                variants = _variant_keys(vendor, _deletes(invoice, self.max_edits))
+            rec = _Record(len(records), i, row, ref, vendor, amount, day, invoice, variants)
+            rec.hit = (self.next_id, ref, vendor, amount, rec.day, invoice, self.run)
+            self.next_id += 1
+            records.append(rec)
+        return records
+
+    def check_batch(self, batch: List[Tuple[int, Dict[str, Any]]]):
+        records = self._records(batch)
+        if not records:
+            return
+        history = self.index.candidates(records, self.window_days, self.window_any, bool(self.max_edits))
+        # rows earlier in this batch are not in the index yet
+        by_exact: Dict[Tuple, List[_Record]] = {}
+        by_amount: Dict[int, List[_Record]] = {}
+        by_variant: Dict[int, List[_Record]] = {}
+        for rec in records:
+            exact = [h for h in history["exact"].get(rec.k, ())]
+            window = [h for h in history["window"].get(rec.k, ())]
+            similar = [h for h in history["similar"].get(rec.k, ())]
+            if rec.invoice:
+                exact += [r.hit for r in by_exact.get((rec.vendor, rec.amount, rec.invoice), ())]
+            if self.window_days and rec.day is not None:
+                window += [r.hit for r in by_amount.get(rec.amount, ())
+                           if r.day is not None and abs(r.day - rec.day) <= self.window_days
+                           and (self.window_any or r.vendor == rec.vendor)]
+            if rec.variants:
+                earlier = {id(r): r for v in rec.variants for r in by_variant.get(v, ())}
+                similar += [r.hit for r in earlier.values()]
+            self._check(rec, exact, window, similar)
+            if rec.invoice:
+                by_exact.setdefault((rec.vendor, rec.amount, rec.invoice), []).append(rec)
+            by_amount.setdefault(rec.amount, []).append(rec)
+            for v in rec.variants:
+                by_variant.setdefault(v, []).append(rec)
+        self.index.add_many(records, self.run)
+        self.counts["indexed"] += len(records)
+
+    def _check(self, rec: _Record, exact: List[Tuple], window: List[Tuple], similar: List[Tuple]):
+        limit = self.max_matches
+        matches: List[Dict[str, Any]] = []
+        matched: Set[int] = set()
+        for hit in exact:
+            if len(matches) < limit:
+                matched.add(hit[0])
+                matches.append(_match("exact", hit))
+        for hit in window:
+            if hit[0] not in matched and len(matches) < limit:
+                matched.add(hit[0])
+                matches.append(_match("amount-date", hit, days=abs(rec.day - hit[4])))
+        for hit in similar:
+            if hit[0] in matched or len(matches) >= limit or hit[2] != rec.vendor or hit[3] != rec.amount:
+                continue
+            distance = _edit_distance(rec.invoice, hit[5], self.max_edits)
+            if distance <= self.max_edits:
+                matched.add(hit[0])
+                matches.append(_match("invoice", hit, distance=distance))
+        if matches:
+            self._report(rec.index, rec.row, matches)
+
+    def _report(self, index: int, row: Dict[str, Any], matches: List[Dict[str, Any]]):
+        kind = max(matches, key=lambda m: KIND_RANK[m["kind"]])["kind"]
+        self.counts["count"] += 1
+        self.counts["amountDate" if kind == "amount-date" else kind] += 1
+        finding = _finding(index, row, self.params)
+        finding["kind"] = kind
+        finding["matches"] = matches
+        if self.emit:
+            self.emit(finding)
+        if not self.top_k:
+            return
+        item = (KIND_RANK[kind], -index, finding)
+        if len(self.top) < self.top_k:
+            heapq.heappush(self.top, item)
+        elif item[:2] > self.top[0][:2]:
+            heapq.heapreplace(self.top, item)
+
+    def result(self) -> Dict[str, Any]:
+        ranked = [item[2] for item in sorted(self.top, key=lambda t: (-t[0], -t[1]))]
+        data: Dict[str, Any] = {"duplicates": ranked}
+        if self.emit:
+            data["streamed"] = True
+        metrics = dict(self.counts, returned=len(ranked), indexSize=self.index.size())
+        return {"ok": True, "data": data, "metrics": metrics}
+
+
+def process_stream(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    # ctx["rows"] is an iterator; memory is bounded by batchSize and topK, history lives in SQLite
+    params = ctx.get("params") or {}
+    batch_size = max(1, int(_settings(params)["batchSize"]))
+    index = DuplicateIndex(index_path(params))
+    try:
+        # one write transaction per run: a failed run leaves the index as it was
+        index.conn.execute("BEGIN IMMEDIATE")
+        try:
+            checker = _Checker(index, params, ctx.get("emit"))
+            batch: List[Tuple[int, Dict[str, Any]]] = []
+            for i, row in enumerate(ctx.get("rows") or ()):
+                if not isinstance(row, dict):
+                    continue
+                batch.append((i, row))
+                if len(batch) >= batch_size:
+                    checker.check_batch(batch)
+                    batch = []
+            if batch:
+                checker.check_batch(batch)
+            result = checker.result()
+            index.conn.execute("COMMIT")
+        except Exception:
+            index.conn.execute("ROLLBACK")
+            raise
+        return result
+    finally:
+        index.close()
+
+
+def process(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    data = ctx.get("data") or []
+    return process_stream({"rows": iter(data), "params": ctx.get("params", {}), "emit": ctx.get("emit")})
@@ -1,13 +1,77 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 REPORT_TYPE = "sample-summary"
 
+# Columns decoded for the columnar engine (see backend.columnar)
+COLUMNAR_SCHEMA = {"amount": "float64"}
+# process_stream can resume from a checkpointed state (report_executor incremental mode)
+INCREMENTAL = True
+# Only "amount" is read, so inputs are projected to it before decoding (records are still counted)
+COLUMNS = ["amount"]
+
 # Simple sample: summarize numeric columns and count records
 
+
+def _summary(count: int, amounts: int, total: float, low, high) -> Dict[str, Any]:
+    metrics = {"records": count, "amountCount": amounts, "amountTotal": total, "amountMin": low, "amountMax": high}
+    return {"ok": True, "data": {"summary": f"Processed {count} records"}, "metrics": metrics}
+
+
+def process_stream(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    # ctx: { rows: iterator of records, params: {...} }
+    rows = ctx.get("rows") or ()
+    state = ctx.get("state") or {}
+    count, amounts = state.get("records", 0), state.get("amountCount", 0)
+    total = state.get("amountTotal", 0.0)
+    low, high = state.get("amountMin"), state.get("amountMax")
+    for row in rows:
+        count += 1
+        amt = row.get("amount") if isinstance(row, dict) else None
+        if isinstance(amt, (int, float)):
+            amt = float(amt)
+            amounts += 1
+            total += amt
+            low = amt if low is None or amt < low else low
+            high = amt if high is None or amt > high else high
+    result = _summary(count, amounts, total, low, high)
+    if "state" in ctx:
+        result["state"] = dict(result["metrics"])
+    return result
+
+
+def combine(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # parts: chunk results in input order (parallel map-reduce)
+    metrics = [part["result"]["metrics"] for part in parts]
+    lows = [m["amountMin"] for m in metrics if m["amountMin"] is not None]
+    highs = [m["amountMax"] for m in metrics if m["amountMax"] is not None]
+    return _summary(sum(m["records"] for m in metrics), sum(m["amountCount"] for m in metrics),
+                    sum(m["amountTotal"] for m in metrics), min(lows) if lows else None, max(highs) if highs else None)
+
+
+def process_columnar(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    # only the columnar engine needs numpy; importing it here keeps it off the row path
+    import numpy as np
+    # ctx: { batches: iterator of ColumnBatch, params: {...} }
+    count = amounts = 0
+    total = 0.0
+    low = high = None
+    for batch in ctx.get("batches") or ():
+        count += batch.size
+        amt = batch["amount"]
+        valid = amt[~np.isnan(amt)]
+        if not valid.size:
+            continue
+        amounts += int(valid.size)
+        total += float(valid.sum())
+        bmin, bmax = float(valid.min()), float(valid.max())
+        low = bmin if low is None or bmin < low else low
+        high = bmax if high is None or bmax > high else high
+    return _summary(count, amounts, total, low, high)
+
+
 def process(ctx: Dict[str, Any]) -> Dict[str, Any]:
-    # ctx: { input: {source, path/uri, format}, params: {...} }
+    # ctx: { data: [...], params: {...} }
     data = ctx.get("data") or []
-    # compute a tiny summary
-    count = len(data) if isinstance(data, list) else 0
-    metrics = {"records": count}
-    return {"ok": True, "data": {"summary": f"Processed {count} records"}, "metrics": metrics}
+    if not isinstance(data, list):
+        data = []
+    return process_stream({"rows": iter(data), "params": ctx.get("params", {})})
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+# Cache for model responses keyed on model id, prompt and generation parameters.
+# Memory tier: LRU with per-entry TTL and entry/byte caps.
+# Disk tier (optional): SQLite file so cached answers survive scheduler restarts.
+
+
+def make_key(model_id: str, prompt: str, params: Dict[str, Any]) -> str:
+    raw = json.dumps({"model": model_id, "prompt": prompt, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, ttl: float = 300.0, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024,
+                 disk_path: Optional[str] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path or None
+        self._mem: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._stats = {"hits": 0, "diskHits": 0, "misses": 0, "evictions": 0, "expired": 0, "stores": 0}
+
+    def _disk(self):
+        if not self.disk_path:
+            return None
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.disk_path)), exist_ok=True)
+            db = sqlite3.connect(self.disk_path, timeout=5, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires)")
+            self._db = db
+        return self._db
+
+    def _evict(self):
+        while self._mem and (len(self._mem) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, size, _) = self._mem.popitem(last=False)
+            self._bytes -= size
+            self._stats["evictions"] += 1
+
+    def _store_mem(self, key: str, expires: float, value: Dict[str, Any], size: int):
+        old = self._mem.pop(key, None)
+        if old:
+            self._bytes -= old[1]
+        self._mem[key] = (expires, size, value)
+        self._bytes += size
+        self._evict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry:
+                if entry[0] > now:
+                    self._mem.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return dict(entry[2])
+                self._bytes -= entry[1]
+                del self._mem[key]
+                self._stats["expired"] += 1
+            db = self._disk()
+            if db is not None:
+                try:
+                    row = db.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+                except sqlite3.Error:
+                    row = None
+                if row and row[1] > now:
+                    value = json.loads(row[0])
+                    self._store_mem(key, row[1], value, len(row[0]))
+                    self._stats["diskHits"] += 1
+                    return dict(value)
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None):
+        # per-task TTLs come from tasks.json and may be strings ("60"); bad values use the default
+        try:
+            ttl = self.ttl if ttl is None else float(ttl)
+        except (TypeError, ValueError):
+            ttl = self.ttl
+        if ttl <= 0:
+            return
+        expires = time.time() + ttl
+        raw = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._store_mem(key, expires, dict(value), len(raw))
+            self._stats["stores"] += 1
+            db = self._disk()
+            if db is not None:
+                try:
+                    db.execute("INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)", (key, raw, expires))
+                    db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+                except sqlite3.Error:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._bytes = 0
+            db = self._disk()
+            if db is not None:
+                db.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._mem)
+            out["bytes"] = self._bytes
+            lookups = out["hits"] + out["diskHits"] + out["misses"]
+            out["hitRate"] = round((out["hits"] + out["diskHits"]) / lookups, 4) if lookups else 0.0
+            return out
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Any, Optional
+
+# Content-addressed cache of report runs. The key covers everything the output
+# depends on: report type, hash of the source it runs (module, imported backend
+# modules, loaders), params, the input spec plus a fingerprint of the input
+# (size+mtime locally, ETag on S3) and the output shape. An entry is the execute() result (<key>.json) next to the exact
+# bytes written to the output target (<key>.out), so a hit re-creates the output
+# without reading the input. Entries older than MAX_AGE are dropped and the
+# least recently used go first once the directory exceeds MAX_BYTES.
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_DIR = os.environ.get('REPORT_CACHE_DIR') or os.path.join(REPO_ROOT, 'resources', 'report-cache')
+ENABLED = (os.environ.get('REPORT_CACHE') or 'true').lower() in ('1', 'true', 'yes', 'on')
+MAX_AGE = float(os.environ.get('REPORT_CACHE_MAX_AGE') or 7 * 24 * 3600)
+MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES') or 512 * 1024 * 1024)
+
+# bump when the executor changes what it writes for the same inputs
+KEY_VERSION = 1
+
+
+def make_key(parts: Dict[str, Any]) -> str:
+    raw = json.dumps(dict(parts, v=KEY_VERSION), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _meta_path(key: str, directory: str) -> str:
+    return os.path.join(directory, key + '.json')
+
+
+def blob_path(key: str, directory: str = DEFAULT_DIR) -> str:
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, key + '.out')
+
+
+def lookup(key: str, directory: str = DEFAULT_DIR, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Return the cached entry ({"result", "created"}) or None; a hit refreshes its LRU position."""
+    meta = _meta_path(key, directory)
+    blob = os.path.join(directory, key + '.out')
+    max_age = MAX_AGE if max_age is None else max_age
+    try:
+        with open(meta, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        if not os.path.exists(blob):
+            return None
+    except Exception:
+        return None
+    if time.time() - float(entry.get('created') or 0) > max_age:
+        _remove(key, directory)
+        return None
+    now = time.time()
+    for path in (meta, blob):
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+    return entry
+
+
+def store(key: str, result: Dict[str, Any], directory: str = DEFAULT_DIR):
+    """Record the result for a blob already written to blob_path(key), then enforce the limits."""
+    os.makedirs(directory, exist_ok=True)
+    path = _meta_path(key, directory)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'created': time.time(), 'result': result}, f, ensure_ascii=False, default=str)
+    os.replace(tmp, path)
+    evict(directory)
+
+
+def _remove(key: str, directory: str):
+    for suffix in ('.json', '.out'):
+        try:
+            os.remove(os.path.join(directory, key + suffix))
+        except OSError:
+            pass
+
+
+def evict(directory: str = DEFAULT_DIR, max_age: Optional[float] = None, max_bytes: Optional[int] = None) -> int:
+    """Drop expired entries, then least recently used ones until the total size fits. Returns entries removed."""
+    max_age = MAX_AGE if max_age is None else max_age
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    entries: Dict[str, Dict[str, float]] = {}
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    for name in names:
+        key, ext = os.path.splitext(name)
+        if ext not in ('.json', '.out'):
+            continue
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        # lookup() touches both files, so mtime is the last use
+        entry = entries.setdefault(key, {'size': 0, 'used': 0.0})
+        entry['size'] += st.st_size
+        entry['used'] = max(entry['used'], st.st_mtime)
+    now = time.time()
+    removed = 0
+    for key, entry in list(entries.items()):
+        if now - entry['used'] > max_age:
+            _remove(key, directory)
+            del entries[key]
+            removed += 1
+    total = sum(e['size'] for e in entries.values())
+    for key, entry in sorted(entries.items(), key=lambda kv: kv[1]['used']):
+        if total <= max_bytes:
+            break
+        _remove(key, directory)
+        total -= entry['size']
+        removed += 1
+    return removed
+
+
+def clear(directory: str = DEFAULT_DIR):
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if name.endswith(('.json', '.out', '.tmp')):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
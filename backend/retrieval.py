@@ -0,0 +1,419 @@
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# Full-text retrieval over uploaded attachments (UserStorage/), so prompts carry
+# the few relevant passages instead of whole files.
+#
+# Files are split into chunks of about CHUNK_TOKENS tokens on line boundaries and
+# indexed in SQLite (WAL): a postings table (term, chunk) -> term frequency with
+# per-chunk lengths, scored with Okapi BM25 at query time. Indexing is
+# incremental: a file whose content hash is unchanged is skipped, and chunks are
+# stored once per content hash, so re-uploading an edited file only tokenizes
+# the chunks that changed. search() returns the top-k chunks that fit a token
+# budget; context_for() formats them for the model prompt.
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_DB_PATH = os.path.join(REPO_ROOT, 'resources', 'retrieval.db')
+
+CHUNK_TOKENS = 200
+# BM25 parameters (Robertson et al.; the usual defaults)
+K1 = 1.2
+B = 0.75
+# files larger than this are indexed up to the limit
+MAX_FILE_BYTES = 20 * 1024 * 1024
+TEXT_EXTENSIONS = {'.txt', '.md', '.csv', '.tsv', '.json', '.jsonl', '.xml', '.html', '.htm', '.log', '.yaml', '.yml'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    sha TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    tokens INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS doc_chunks (
+    path TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    chunk_id INTEGER NOT NULL,
+    PRIMARY KEY (path, ordinal)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS doc_chunks_chunk ON doc_chunks (chunk_id);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    chunk_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, chunk_id)
+) WITHOUT ROWID;
+"""
+
+# Latin words/numbers, and runs of CJK ideographs (indexed as overlapping bigrams)
+_TERM_RE = re.compile(r"[0-9a-z_]+|[\u3400-\u9fff\uf900-\ufaff]+")
+_CJK_RE = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+_WORD_RE = re.compile(r"\S+")
+_STOPWORDS = frozenset("a an and are as at be by for from has in is it of on or that the this to was were will with".split())
+
+
+def tokenize(text: str) -> List[str]:
+    terms = []
+    for term in _TERM_RE.findall(text.lower()):
+        if term[0] < '\u3400':
+            if term not in _STOPWORDS:
+                terms.append(term)
+        elif len(term) == 1:
+            terms.append(term)
+        else:
+            terms.extend(term[i:i + 2] for i in range(len(term) - 1))
+    return terms
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough model-token count: one per CJK character, one per four other characters."""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def chunk_text(text: str, chunk_tokens: int = CHUNK_TOKENS) -> List[str]:
+    """Split text into chunks of about chunk_tokens tokens, on line boundaries where possible."""
+    chunks: List[str] = []
+    lines: List[str] = []
+    size = 0
+    for line in text.splitlines():
+        n = estimate_tokens(line)
+        if n > chunk_tokens:
+            # a single oversized line (minified JSON, long paragraph) is cut on word boundaries
+            if lines:
+                chunks.append("\n".join(lines))
+                lines, size = [], 0
+            for m in _WORD_RE.finditer(line):
+                word = m.group()
+                w = estimate_tokens(word) + 1
+                if size + w > chunk_tokens and lines:
+                    chunks.append(" ".join(lines))
+                    lines, size = [], 0
+                lines.append(word)
+                size += w
+            if lines:
+                chunks.append(" ".join(lines))
+                lines, size = [], 0
+            continue
+        if size + n > chunk_tokens and lines:
+            chunks.append("\n".join(lines))
+            lines, size = [], 0
+        if line.strip():
+            lines.append(line)
+            size += n + 1
+    if lines:
+        chunks.append("\n".join(lines))
+    return chunks
+
+
+def extract_text(path: str, data: bytes) -> Optional[str]:
+    """Text content of an attachment; None for binary formats that cannot be read."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.xlsx':
+        try:
+            import io
+            import openpyxl
+        except ImportError:
+            return None
+        wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        lines = []
+        for ws in wb.worksheets:
+            for row in ws.iter_rows(values_only=True):
+                cells = ["" if v is None else str(v) for v in row]
+                if any(cells):
+                    lines.append("\t".join(cells).rstrip())
+        return "\n".join(lines)
+    if ext not in TEXT_EXTENSIONS and b"\0" in data[:4096]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+class RetrievalIndex:
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, chunk_tokens: int = CHUNK_TOKENS):
+        self.db_path = db_path
+        self.chunk_tokens = chunk_tokens
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        # (path, sha) pairs of a search scope -> chunk ids in those documents
+        self._scopes: Dict[tuple, set] = {}
+        # (count, max id, total length) of the chunk table -> per-chunk norms and token counts
+        self._stats: Optional[Tuple[tuple, Dict[int, float], Dict[int, int]]] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread; sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+        return conn
+
+    def index_file(self, path: str, key: Optional[str] = None) -> Dict[str, Any]:
+        """(Re)index one file under `key` (default: the path). Unchanged content is a no-op.
+
+        A matching size and mtime skip reading the file at all, so checking an
+        already indexed attachment on every prompt costs one stat().
+        """
+        key = key or path
+        st = os.stat(path)
+        row = self._conn().execute("SELECT size, mtime FROM documents WHERE path = ?", (key,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime:
+            return {"path": key, "changed": False}
+        with open(path, 'rb') as f:
+            data = f.read(MAX_FILE_BYTES)
+        return self.index_bytes(key, data, st.st_size, st.st_mtime)
+
+    def index_bytes(self, key: str, data: bytes, size: Optional[int] = None,
+                    mtime: Optional[float] = None) -> Dict[str, Any]:
+        sha = hashlib.sha1(data).hexdigest()
+        size = len(data) if size is None else size
+        conn = self._conn()
+        row = conn.execute("SELECT sha FROM documents WHERE path = ?", (key,)).fetchone()
+        if row and row[0] == sha:
+            if mtime is not None:
+                conn.execute("UPDATE documents SET size = ?, mtime = ? WHERE path = ?", (size, mtime, key))
+            return {"path": key, "changed": False}
+        text = extract_text(key, data)
+        chunks = chunk_text(text, self.chunk_tokens) if text else []
+        hashes = [hashlib.sha1(c.encode("utf-8", "surrogatepass")).hexdigest() for c in chunks]
+        # BEGIN IMMEDIATE: concurrent uploads serialize instead of failing on lock upgrade
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            known = {}
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                known.update(conn.execute(f"SELECT hash, id FROM chunks WHERE hash IN ({','.join('?' * len(part))})",
+                                          part).fetchall())
+            ids = []
+            postings = []
+            new = 0
+            for chunk, h in zip(chunks, hashes):
+                chunk_id = known.get(h)
+                if chunk_id is None:
+                    # chunks are cached by content hash: only unseen ones are tokenized
+                    terms = tokenize(chunk)
+                    tf: Dict[str, int] = {}
+                    for term in terms:
+                        tf[term] = tf.get(term, 0) + 1
+                    chunk_id = conn.execute("INSERT INTO chunks (hash, text, length, tokens) VALUES (?, ?, ?, ?)",
+                                            (h, chunk, len(terms), estimate_tokens(chunk))).lastrowid
+                    postings.extend((term, chunk_id, n) for term, n in tf.items())
+                    known[h] = chunk_id
+                    new += 1
+                ids.append(chunk_id)
+            conn.executemany("INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)", postings)
+            old = self._drop_document(conn, key)
+            conn.executemany("INSERT INTO doc_chunks (path, ordinal, chunk_id) VALUES (?, ?, ?)",
+                             [(key, i, chunk_id) for i, chunk_id in enumerate(ids)])
+            self._drop_orphans(conn, old - set(ids))
+            conn.execute("INSERT OR REPLACE INTO documents (path, sha, size, mtime, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                         (key, sha, size, mtime, time.time()))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {"path": key, "changed": True, "chunks": len(chunks), "newChunks": new, "readable": text is not None}
+
+    @staticmethod
+    def _drop_document(conn: sqlite3.Connection, key: str) -> set:
+        old = {r[0] for r in conn.execute("SELECT chunk_id FROM doc_chunks WHERE path = ?", (key,))}
+        conn.execute("DELETE FROM doc_chunks WHERE path = ?", (key,))
+        return old
+
+    @staticmethod
+    def _drop_orphans(conn: sqlite3.Connection, chunk_ids: Iterable[int]):
+        # chunks no longer referenced by any document lose their postings; the terms come from
+        # re-tokenizing the text, which spares a (chunk_id) index that every insert would maintain
+        for chunk_id in chunk_ids:
+            if conn.execute("SELECT 1 FROM doc_chunks WHERE chunk_id = ? LIMIT 1", (chunk_id,)).fetchone() is None:
+                text = conn.execute("SELECT text FROM chunks WHERE id = ?", (chunk_id,)).fetchone()[0]
+                conn.executemany("DELETE FROM postings WHERE term = ? AND chunk_id = ?",
+                                 [(term, chunk_id) for term in set(tokenize(text))])
+                conn.execute("DELETE FROM chunks WHERE id = ?", (chunk_id,))
+
+    def remove(self, key: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._drop_orphans(conn, self._drop_document(conn, key))
+            conn.execute("DELETE FROM documents WHERE path = ?", (key,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def documents(self) -> Dict[str, str]:
+        return dict(self._conn().execute("SELECT path, sha FROM documents"))
+
+    def search(self, query: str, paths: Optional[Iterable[str]] = None, top_k: int = 5,
+               token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Best BM25 matches for query, optionally only within `paths`.
+
+        Chunks are taken in score order while they fit token_budget (estimated
+        tokens), up to top_k.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or top_k <= 0:
+            return []
+        conn = self._conn()
+        allowed = None
+        if paths is not None:
+            paths = list(paths)
+            if not paths:
+                return []
+            allowed = self._scope(conn, paths)
+            if not allowed:
+                return []
+        norms, tokens = self._chunk_stats(conn)
+        n = len(norms)
+        if not n:
+            return []
+        dfs = []
+        for term in terms:
+            df = conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+            if df:
+                dfs.append((df, term))
+        # rarest terms first; a term found in most chunks adds little (low idf), so it only re-ranks
+        # chunks a rarer term already matched (primary-key lookups) instead of scanning every chunk
+        dfs.sort()
+        scores: Dict[int, float] = {}
+        for df, term in dfs:
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            if scores and df * 2 > n:
+                ids = list(scores)
+                rows = []
+                for i in range(0, len(ids), 500):
+                    part = ids[i:i + 500]
+                    rows += conn.execute(f"SELECT chunk_id, tf FROM postings WHERE term = ? AND chunk_id IN "
+                                         f"({','.join('?' * len(part))})", [term] + part).fetchall()
+            else:
+                rows = conn.execute("SELECT chunk_id, tf FROM postings WHERE term = ?", (term,)).fetchall()
+            for chunk_id, tf in rows:
+                if allowed is None or chunk_id in allowed:
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (K1 + 1) / (tf + norms[chunk_id])
+        if not scores:
+            return []
+        # a heap pops the best chunks without sorting every candidate
+        ranked = [(-score, chunk_id) for chunk_id, score in scores.items()]
+        heapq.heapify(ranked)
+        results: List[Dict[str, Any]] = []
+        used = 0
+        while ranked:
+            score, chunk_id = heapq.heappop(ranked)
+            score = -score
+            chunk_tokens = tokens[chunk_id]
+            if token_budget is not None and used + chunk_tokens > token_budget:
+                continue
+            text = conn.execute("SELECT text FROM chunks WHERE id = ?", (chunk_id,)).fetchone()[0]
+            where = ("SELECT path, ordinal FROM doc_chunks WHERE chunk_id = ?"
+                     + (f" AND path IN ({','.join('?' * len(paths))})" if allowed is not None else "") + " LIMIT 1")
+            path, ordinal = conn.execute(where, [chunk_id] + (paths if allowed is not None else [])).fetchone()
+            results.append({"path": path, "chunk": ordinal, "score": round(score, 4), "tokens": chunk_tokens,
+                            "text": text})
+            used += chunk_tokens
+            if len(results) >= top_k:
+                break
+        return results
+
+    def _chunk_stats(self, conn: sqlite3.Connection) -> Tuple[Dict[int, float], Dict[int, int]]:
+        # BM25 length norms and token counts per chunk, reloaded when the chunk table changes
+        key = conn.execute("SELECT COUNT(*), MAX(id), TOTAL(length) FROM chunks").fetchone()
+        cached = self._stats
+        if cached is None or cached[0] != key:
+            avgdl = (key[2] / key[0] if key[0] else 0.0) or 1.0
+            norms, tokens = {}, {}
+            for chunk_id, length, n in conn.execute("SELECT id, length, tokens FROM chunks"):
+                norms[chunk_id] = K1 * (1 - B + B * length / avgdl)
+                tokens[chunk_id] = n
+            cached = self._stats = (key, norms, tokens)
+        return cached[1], cached[2]
+
+    def _scope(self, conn: sqlite3.Connection, paths: List[str]) -> set:
+        # chunk ids of the given documents, cached until one of them is re-indexed with new content
+        marks = ','.join('?' * len(paths))
+        key = tuple(sorted(conn.execute(f"SELECT path, sha FROM documents WHERE path IN ({marks})", paths)))
+        allowed = self._scopes.get(key)
+        if allowed is None:
+            allowed = {r[0] for r in conn.execute(f"SELECT chunk_id FROM doc_chunks WHERE path IN ({marks})", paths)}
+            if len(self._scopes) >= 64:
+                self._scopes.clear()
+            self._scopes[key] = allowed
+        return allowed
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        docs = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        chunks, tokens = conn.execute("SELECT COUNT(*), COALESCE(SUM(tokens), 0) FROM chunks").fetchone()
+        return {"documents": docs, "chunks": chunks, "tokens": tokens}
+
+
+def context_for(results: List[Dict[str, Any]]) -> str:
+    """Retrieved chunks as a prompt preamble, grouped by file in document order."""
+    if not results:
+        return ""
+    ordered = sorted(results, key=lambda r: (r["path"], r["chunk"]))
+    parts = ["Relevant excerpts from the attached files:"]
+    for r in ordered:
+        parts.append(f"--- {os.path.basename(r['path'])} (part {r['chunk'] + 1}) ---\n{r['text']}")
+    return "\n\n".join(parts)
+
+
+_indexes: Dict[str, RetrievalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(db_path: str = DEFAULT_DB_PATH) -> RetrievalIndex:
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is None:
+            index = _indexes[db_path] = RetrievalIndex(db_path)
+        return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index attachments and query the retrieval index")
+    parser.add_argument("action", choices=["index", "search", "stats"])
+    parser.add_argument("args", nargs="*", help="files to index, or the search query")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=None, help="token budget for search results")
+    args = parser.parse_args()
+    index = get_index(args.db)
+    if args.action == "index":
+        for path in args.args:
+            print(json.dumps(index.index_file(path, os.path.relpath(os.path.abspath(path), REPO_ROOT).replace(os.sep, '/'))))
+    elif args.action == "search":
+        for r in index.search(" ".join(args.args), top_k=args.top_k, token_budget=args.budget):
+            print(json.dumps(r, ensure_ascii=False))
+    else:
+        print(json.dumps(index.stats()))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,53 @@
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+# Single-flight: concurrent callers with the same key share one execution of fn.
+# Used to coalesce identical model calls fired by scheduler jobs in the same tick.
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {"executed": 0, "coalesced": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run fn once per key among concurrent callers; returns (result, shared)."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["executed"] += 1
+                leader = True
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["inFlight"] = len(self._calls)
+            return out
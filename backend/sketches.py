@@ -0,0 +1,261 @@
+import base64
+import hashlib
+import math
+from bisect import insort
+from typing import Any, Dict, List, Optional, Sequence
+
+# Constant-memory streaming summaries for report handlers. Each sketch takes one
+# value at a time, merges with a sketch built over another part of the input
+# (parallel chunks) and round-trips through plain lists (incremental checkpoints).
+
+
+class Welford:
+    """Running count, mean and variance (Welford's update, Chan's parallel merge)."""
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def merge(self, other: "Welford"):
+        if not other.n:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def to_state(self) -> List[float]:
+        return [self.n, self.mean, self.m2]
+
+    @classmethod
+    def from_state(cls, state: Sequence[float]) -> "Welford":
+        return cls(int(state[0]), float(state[1]), float(state[2]))
+
+
+class P2Quantile:
+    """Streaming quantile estimate with five markers (Jain & Chlamtac's P-square).
+
+    Exact for the first five values; afterwards the middle marker tracks the
+    p-quantile in O(1) time and memory. merge() is an approximation: marker
+    heights are averaged by count.
+    """
+    __slots__ = ("p", "dn", "count", "q", "n")
+
+    def __init__(self, p: float = 0.5):
+        self.p = p
+        self.dn = (p / 2, p, (1 + p) / 2)
+        self.count = 0
+        self.q: List[float] = []
+        # 1-based marker positions; desired positions follow from count and p
+        self.n = [1, 2, 3, 4, 5]
+
+    def add(self, x: float):
+        q = self.q
+        self.count += 1
+        if self.count <= 5:
+            insort(q, x)
+            return
+        n = self.n
+        # shift the positions of every marker above x (unrolled: this runs once per value)
+        if x < q[1]:
+            if x < q[0]:
+                q[0] = x
+            n[1] += 1
+            n[2] += 1
+            n[3] += 1
+        elif x < q[2]:
+            n[2] += 1
+            n[3] += 1
+        elif x < q[3]:
+            n[3] += 1
+        elif x > q[4]:
+            q[4] = x
+        n[4] += 1
+        c = self.count - 1
+        dn1, dn2, dn3 = self.dn
+        d = 1 + c * dn1 - n[1]
+        if (d >= 1 and n[2] - n[1] > 1) or (d <= -1 and n[0] - n[1] < -1):
+            self._adjust(1, 1 if d > 0 else -1)
+        d = 1 + c * dn2 - n[2]
+        if (d >= 1 and n[3] - n[2] > 1) or (d <= -1 and n[1] - n[2] < -1):
+            self._adjust(2, 1 if d > 0 else -1)
+        d = 1 + c * dn3 - n[3]
+        if (d >= 1 and n[4] - n[3] > 1) or (d <= -1 and n[2] - n[3] < -1):
+            self._adjust(3, 1 if d > 0 else -1)
+
+    def _adjust(self, i: int, s: int):
+        # move marker i one position towards its desired one: parabolic step, linear if that overshoots
+        q, n = self.q, self.n
+        qi = q[i] + s / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+        if not q[i - 1] < qi < q[i + 1]:
+            qi = q[i] + s * (q[i + s] - q[i]) / (n[i + s] - n[i])
+        q[i] = qi
+        n[i] += s
+
+    def value(self) -> Optional[float]:
+        q = self.q
+        if self.count > 5:
+            return q[2]
+        if not q:
+            return None
+        # exact quantile (linear interpolation) over the few values seen so far
+        pos = (len(q) - 1) * self.p
+        lo = int(pos)
+        return q[lo] if lo + 1 >= len(q) else q[lo] + (q[lo + 1] - q[lo]) * (pos - lo)
+
+    def merge(self, other: "P2Quantile"):
+        if other.count <= 5:
+            for x in other.q:
+                self.add(x)
+            return
+        if self.count <= 5:
+            pending = self.q
+            self.count, self.q, self.n = other.count, list(other.q), list(other.n)
+            for x in pending:
+                self.add(x)
+            return
+        total = self.count + other.count
+        q = [min(self.q[0], other.q[0])]
+        q += [(a * self.count + b * other.count) / total for a, b in zip(self.q[1:4], other.q[1:4])]
+        q.append(max(self.q[4], other.q[4]))
+        n = [1] + [1 + int(round((total - 1) * dn)) for dn in self.dn] + [total]
+        for i in range(1, 5):
+            n[i] = max(n[i], n[i - 1] + 1)
+        self.count, self.q, self.n = total, q, n
+
+    def to_state(self) -> List[Any]:
+        return [self.p, self.count, list(self.q), list(self.n)]
+
+    @classmethod
+    def from_state(cls, state: Sequence[Any]) -> "P2Quantile":
+        sketch = cls(float(state[0]))
+        sketch.count = int(state[1])
+        sketch.q = [float(v) for v in state[2]]
+        sketch.n = [int(v) for v in state[3]]
+        return sketch
+
+
+class HyperLogLog:
+    """Approximate distinct count in 2**p registers (Flajolet et al., linear counting for small sets).
+
+    Relative error is about 1.04 / sqrt(2**p): 1.6% at the default p=12. Small
+    sets keep a sparse register map and switch to a dense bytearray at 2**p / 16
+    entries, so many small groups stay cheap. Values are hashed by str(), so 7
+    and "7" count once.
+    """
+    __slots__ = ("p", "m", "sparse", "registers")
+
+    def __init__(self, p: int = 12):
+        if not 4 <= p <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+        self.p = p
+        self.m = 1 << p
+        self.sparse: Optional[Dict[int, int]] = {}
+        self.registers: Optional[bytearray] = None
+
+    def add(self, value: Any):
+        h = int.from_bytes(hashlib.blake2b(str(value).encode("utf-8", "surrogatepass"), digest_size=8).digest(), "big")
+        bits = 64 - self.p
+        self._set(h >> bits, bits - (h & ((1 << bits) - 1)).bit_length() + 1)
+
+    def _set(self, idx: int, rank: int):
+        registers = self.registers
+        if registers is not None:
+            if rank > registers[idx]:
+                registers[idx] = rank
+            return
+        sparse = self.sparse
+        if rank > sparse.get(idx, 0):
+            sparse[idx] = rank
+            if len(sparse) > self.m >> 4:
+                self._densify()
+
+    def _densify(self):
+        registers = bytearray(self.m)
+        for idx, rank in self.sparse.items():
+            registers[idx] = rank
+        self.registers, self.sparse = registers, None
+
+    def merge(self, other: "HyperLogLog"):
+        if other.p != self.p:
+            raise ValueError("cannot merge HyperLogLog sketches of different precision")
+        if other.registers is None:
+            for idx, rank in other.sparse.items():
+                self._set(idx, rank)
+            return
+        if self.registers is None:
+            self._densify()
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.m
+        if self.registers is None:
+            ranks = self.sparse.values()
+            zeros = m - len(self.sparse)
+        else:
+            ranks = self.registers
+            zeros = self.registers.count(0)
+        total = zeros + sum(2.0 ** -r for r in ranks if r)
+        alpha = 0.673 if m == 16 else 0.697 if m == 32 else 0.709 if m == 64 else 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / total
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_state(self) -> List[Any]:
+        if self.registers is None:
+            return [self.p, sorted(self.sparse.items())]
+        return [self.p, base64.b64encode(bytes(self.registers)).decode("ascii")]
+
+    @classmethod
+    def from_state(cls, state: Sequence[Any]) -> "HyperLogLog":
+        sketch = cls(int(state[0]))
+        if isinstance(state[1], str):
+            sketch.registers, sketch.sparse = bytearray(base64.b64decode(state[1])), None
+        else:
+            sketch.sparse = {int(idx): int(rank) for idx, rank in state[1]}
+        return sketch
+
+
+# Expected share of leading digits 1..9 under Benford's law
+BENFORD = tuple(math.log10(1 + 1 / d) for d in range(1, 10))
+
+
+def first_digit(x: float) -> int:
+    """Leading significant digit of |x| (1-9); 0 for zero, NaN and infinities."""
+    x = abs(x)
+    if x == 0 or not math.isfinite(x):
+        return 0
+    return int(f"{x:e}"[0])
+
+
+def benford_mad(counts: Sequence[int]) -> float:
+    """Mean absolute deviation of observed leading-digit shares from Benford.
+
+    counts[d - 1] is the number of values led by digit d. Nigrini's bands for
+    first digits: <0.006 close, <0.012 acceptable, <0.015 marginal, above that
+    nonconforming.
+    """
+    total = sum(counts)
+    if not total:
+        return 0.0
+    return sum(abs(c / total - p) for c, p in zip(counts, BENFORD)) / 9
@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+# Transactional task store backed by SQLite. Every insert/update/delete bumps a
+# global version counter inside the same transaction and stamps the task row
+# with it, so readers (the scheduler) can ask for "changes since version N"
+# instead of re-parsing every task. tasks.json stays supported as an
+# import/export format: rows imported from a file remember it as their source,
+# so a task deleted from the file by hand is deleted from the store on the next
+# import, while tasks added through the API are left alone.
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_DB_PATH = os.path.join(REPO_ROOT, 'resources', 'tasks.db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    updated TEXT NOT NULL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_version ON tasks (version);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+_ENCODINGS = ["utf-8", "utf-8-sig", "cp936", "gbk", "latin-1"]
+
+
+def read_tasks_json(path: str) -> List[Dict[str, Any]]:
+    """Parse a tasks.json export, trying the encodings hand-edited files tend to use."""
+    last_err = None
+    for enc in _ENCODINGS:
+        try:
+            with open(path, "r", encoding=enc) as f:
+                tasks = json.load(f)
+            return tasks if isinstance(tasks, list) else []
+        except Exception as e:
+            last_err = e
+    raise last_err
+
+
+def _canonical(task: Dict[str, Any]) -> str:
+    return json.dumps(task, sort_keys=True, ensure_ascii=False)
+
+
+class TaskStore:
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._json_mtimes: Dict[str, int] = {}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            if "source" not in {r[1] for r in conn.execute("PRAGMA table_info(tasks)")}:
+                # stores created before tasks tracked the file they were imported from
+                conn.execute("ALTER TABLE tasks ADD COLUMN source TEXT")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn):
+        """Run fn(conn, next_version) in one IMMEDIATE transaction; the version is bumped only if fn changed rows."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+            changed = fn(conn, current + 1)
+            if changed:
+                conn.execute("UPDATE meta SET value = ? WHERE key = 'version'", (current + 1,))
+            conn.execute("COMMIT")
+            return changed
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _upsert_rows(conn: sqlite3.Connection, version: int, tasks: List[Dict[str, Any]],
+                     source: Optional[str] = None) -> int:
+        now = datetime.utcnow().isoformat() + "Z"
+        changed = 0
+        for task in tasks:
+            if not isinstance(task, dict) or not task.get("taskId"):
+                continue
+            task_id = str(task["taskId"])
+            body = _canonical(task)
+            row = conn.execute("SELECT body, deleted, source FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row and row[0] == body and not row[1]:
+                if row[2] != source:
+                    # same task, new owner: no version bump, the scheduler has nothing to reload
+                    conn.execute("UPDATE tasks SET source = ? WHERE task_id = ?", (source, task_id))
+                continue
+            conn.execute("INSERT OR REPLACE INTO tasks (task_id, body, version, deleted, updated, source) "
+                         "VALUES (?, ?, ?, 0, ?, ?)", (task_id, body, version, now, source))
+            changed += 1
+        return changed
+
+    def upsert(self, task: Dict[str, Any]) -> bool:
+        return bool(self._write(lambda conn, v: self._upsert_rows(conn, v, [task])))
+
+    def add(self, task: Dict[str, Any]) -> bool:
+        return self.upsert(task)
+
+    def delete(self, task_id: str) -> bool:
+        def _delete(conn, version):
+            cur = conn.execute("UPDATE tasks SET deleted = 1, version = ?, updated = ? WHERE task_id = ? AND deleted = 0",
+                               (version, datetime.utcnow().isoformat() + "Z", task_id))
+            return cur.rowcount
+        return bool(self._write(_delete))
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT body FROM tasks WHERE task_id = ? AND deleted = 0", (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("SELECT body FROM tasks WHERE deleted = 0 ORDER BY rowid")
+        return [json.loads(r[0]) for r in rows]
+
+    def version(self) -> int:
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def changes_since(self, version: int) -> Tuple[int, List[Dict[str, Any]], List[str]]:
+        """Return (current_version, changed_tasks, deleted_task_ids) for rows stamped after version."""
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            current = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+            rows = conn.execute("SELECT task_id, body, deleted FROM tasks WHERE version > ? ORDER BY version", (version,)).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        changed = [json.loads(body) for _, body, deleted in rows if not deleted]
+        deleted = [task_id for task_id, _, deleted in rows if deleted]
+        return current, changed, deleted
+
+    def import_json(self, path: str, replace: bool = False) -> int:
+        """Upsert tasks from a tasks.json file.
+
+        Tasks imported from this file earlier but missing from it now are
+        deleted; with replace=True every other task missing from it is too.
+        """
+        tasks = read_tasks_json(path)
+        source = os.path.realpath(path)
+
+        def _import(conn, version):
+            changed = self._upsert_rows(conn, version, tasks, source)
+            keep = {str(t.get("taskId")) for t in tasks if isinstance(t, dict)}
+            live = conn.execute("SELECT task_id, source FROM tasks WHERE deleted = 0").fetchall()
+            now = datetime.utcnow().isoformat() + "Z"
+            for task_id, owner in live:
+                if task_id not in keep and (replace or owner == source):
+                    conn.execute("UPDATE tasks SET deleted = 1, version = ?, updated = ? WHERE task_id = ?",
+                                 (version, now, task_id))
+                    changed += 1
+            return changed
+        return self._write(_import)
+
+    def sync_json(self, path: str) -> int:
+        """Import path if its mtime changed since the last sync; a stat() when nothing changed."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return 0
+        if self._json_mtimes.get(path) == mtime:
+            return 0
+        changed = self.import_json(path)
+        self._json_mtimes[path] = mtime
+        return changed
+
+    def export_json(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.list(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+
+_stores: Dict[str, TaskStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(db_path: str = DEFAULT_DB_PATH) -> TaskStore:
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = _stores[db_path] = TaskStore(db_path)
+        return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import/export the task store as tasks.json")
+    parser.add_argument("action", choices=["import", "export", "list"])
+    parser.add_argument("path", nargs="?", default=os.path.join(REPO_ROOT, "resources", "tasks.json"))
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--replace", action="store_true", help="on import, delete tasks missing from the file")
+    args = parser.parse_args()
+    store = get_store(args.db)
+    if args.action == "import":
+        print(f"{store.import_json(args.path, replace=args.replace)} task(s) changed; version {store.version()}")
+    elif args.action == "export":
+        store.export_json(args.path)
+        print(f"Exported {len(store.list())} task(s) to {args.path}")
+    else:
+        for task in store.list():
+            print(json.dumps(task, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
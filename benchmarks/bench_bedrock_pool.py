@@ -0,0 +1,119 @@
+"""Latency of pooled vs per-call Bedrock clients against a local stub endpoint.
+
+Usage:
+    python benchmarks/bench_bedrock_pool.py --calls 200 --threads 4
+
+A keep-alive stub answers /model/<id>/invoke locally, so the numbers isolate
+client construction, credential resolution and connection setup. Against the
+real endpoint the pooled path also saves the TLS handshake on every call.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # avoid Nagle + delayed-ACK stalls on keep-alive connections (headers and body are separate writes)
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length", 0))
+        self.rfile.read(length)
+        body = json.dumps({"output": "stub"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def measure(fn, calls: int, threads: int):
+    latencies = []
+
+    def one(_):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        results = list(ex.map(one, range(calls)))
+    ok = sum(1 for r in results if r.get("ok"))
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return ok, statistics.median(latencies) * 1000, p99 * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    server, url = start_stub()
+    os.environ["BEDROCK_ENDPOINT_URL"] = url
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    from backend import handler
+
+    model = handler.BEDROCK_MODEL_ID
+    payload = {"messages": [{"role": "user", "content": "ping"}], "temperature": 0.5, "top_p": 0.9, "max_tokens": 16}
+    cases = {}
+    # the handler no longer imports these at module level (cold start); pull them in here
+    try:
+        import requests
+    except Exception:
+        requests = None
+    try:
+        import boto3
+    except Exception:
+        boto3 = None
+    if requests:
+        def bearer_per_call():
+            invoke_url = f"{url}/model/{model}/invoke"
+            resp = requests.post(invoke_url, data=json.dumps(payload), headers={"Authorization": "Bearer x"}, timeout=60)
+            return {"ok": resp.ok}
+        cases["bearer per-call requests.post"] = bearer_per_call
+        cases["bearer pooled session"] = lambda: handler._invoke_with_bearer(model, payload, "x")
+    if boto3:
+        def client_per_call():
+            client = boto3.client("bedrock-runtime", region_name=handler.AWS_REGION, endpoint_url=url)
+            resp = client.invoke_model(modelId=model, contentType="application/json", body=json.dumps(payload))
+            resp["body"].read()
+            return {"ok": True}
+        cases["boto3 per-call client"] = client_per_call
+        cases["boto3 pooled client"] = lambda: handler._invoke_with_client(model, payload)
+
+    for name, fn in cases.items():
+        fn()  # warm up
+        ok, p50, p99 = measure(fn, args.calls, args.threads)
+        print(f"{name:32s} ok={ok}/{args.calls} p50={p50:.2f}ms p99={p99:.2f}ms")
+    print("pool stats:", handler.get_pool().stats)
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Cold-start benchmark for backend.handler.
+
+Usage:
+    python benchmarks/bench_cold_start.py                      # 10 fresh interpreters, [Task Status]
+    python benchmarks/bench_cold_start.py --runs 20 --prompt "[Task Scheduler] cron=*/5 * * * * ping"
+    python benchmarks/bench_cold_start.py --max-import-ms 150  # exit 1 above the threshold (CI guard)
+
+Every run starts a new Python process, as a fresh Lambda container would, and
+times `import backend.handler` plus the first lambda_handler call. Task,
+scheduler and notification stores are redirected to a temp directory. The
+report lists median/min timings and which heavy modules the request pulled in;
+a lightweight command should load none of them.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("boto3", "botocore", "requests", "numpy", "pyarrow", "openpyxl", "zstandard",
+                 "backend.report_executor")
+
+# Runs inside the child interpreter; argv: repo root, work dir, prompt
+_CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from backend import handler
+imported = time.perf_counter()
+work = sys.argv[2]
+handler.TASKS_DB_PATH = work + "/tasks.db"
+handler.TASKS_PATH = handler.TASKS_FALLBACK_PATH = work + "/tasks.json"
+handler.SCHEDULER_STATE_PATH = work + "/scheduler_state.json"
+handler.NOTIFICATIONS_DB_PATH = work + "/notifications.db"
+resp = handler.lambda_handler({"body": json.dumps({"prompt": sys.argv[3]})}, None)
+done = time.perf_counter()
+print(json.dumps({"importMs": (imported - started) * 1000, "firstCallMs": (done - imported) * 1000,
+                  "status": resp.get("statusCode"), "modules": sorted(sys.modules)}))
+"""
+
+
+def run_once(prompt: str, workdir: str) -> Dict[str, Any]:
+    env = dict(os.environ, METRICS=os.environ.get("METRICS", "true"))
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", _CHILD, str(REPO_ROOT), workdir, prompt],
+                          cwd=workdir, env=env, capture_output=True, text=True, timeout=120)
+    wall = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip() or f"child exited with {proc.returncode}")
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    modules = set(out.pop("modules"))
+    out["processMs"] = wall
+    out["heavy"] = [name for name in HEAVY_MODULES if name in modules]
+    return out
+
+
+def measure(prompt: str, runs: int) -> Dict[str, Any]:
+    samples: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory(prefix="aiaccount-coldstart-") as tmp:
+        for _ in range(runs):
+            samples.append(run_once(prompt, tmp))
+    summary: Dict[str, Any] = {"prompt": prompt, "runs": runs, "python": sys.version.split()[0]}
+    for field in ("importMs", "firstCallMs", "processMs"):
+        values = [s[field] for s in samples]
+        summary[field] = {"median": statistics.median(values), "min": min(values)}
+    summary["status"] = sorted({s["status"] for s in samples})
+    summary["heavyModules"] = sorted({name for s in samples for name in s["heavy"]})
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompt", default="[Task Status]")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-import-ms", type=float, default=0.0,
+                        help="exit 1 when the median import time exceeds this (0 = no check)")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+    summary = measure(args.prompt, args.runs)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"{args.prompt!r} over {args.runs} fresh interpreters (python {summary['python']})")
+        for field in ("importMs", "firstCallMs", "processMs"):
+            print(f"  {field:12s} median={summary[field]['median']:8.1f}ms  min={summary[field]['min']:8.1f}ms")
+        print(f"  heavy modules loaded: {', '.join(summary['heavyModules']) or 'none'}")
+    if args.max_import_ms and summary["importMs"]["median"] > args.max_import_ms:
+        print(f"median import {summary['importMs']['median']:.1f}ms exceeds {args.max_import_ms:.1f}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Compare the row-at-a-time (dict) path with the columnar NumPy path.
+
+Usage:
+    python benchmarks/bench_columnar.py --rows 10000000 --batch-size 65536
+
+Rows are generated lazily so the input itself does not dominate memory.
+Decoding into columns is timed together with the handler, as it would be
+in report_executor.execute.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from backend import columnar
+from backend.reports import anomaly_check, sample_summary
+
+
+def gen_rows(n: int):
+    for i in range(n):
+        amount = -(i % 97) if i % 1000 == 0 else (i % 5000) * 1.25
+        yield {"amount": amount, "date": "2025-11-%02d" % (1 + i % 28), "account": "ACC-%04d" % (i % 500)}
+
+
+def run_dict(module, n: int):
+    return module.process_stream({"rows": gen_rows(n), "params": {}})
+
+
+def run_columnar(module, n: int, batch_size: int):
+    batches = columnar.iter_batches(gen_rows(n), module.COLUMNAR_SCHEMA, batch_size)
+    return module.process_columnar({"batches": batches, "params": {}})
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--batch-size", type=int, default=columnar.DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    if not columnar.available():
+        print("numpy is not installed; columnar path unavailable")
+        return 1
+
+    for module in (anomaly_check, sample_summary):
+        t_dict, r_dict = timed(run_dict, module, args.rows)
+        t_col, r_col = timed(run_columnar, module, args.rows, args.batch_size)
+        same = r_dict["metrics"] == r_col["metrics"]
+        print(f"{module.REPORT_TYPE:16s} rows={args.rows:,} dict={t_dict:.2f}s ({args.rows / t_dict:,.0f} rows/s) "
+              f"columnar={t_col:.2f}s ({args.rows / t_col:,.0f} rows/s) speedup={t_dict / t_col:.2f}x match={same}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
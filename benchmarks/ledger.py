@@ -0,0 +1,133 @@
+"""Deterministic synthetic accounting ledger for benchmarks.
+
+Usage:
+    python benchmarks/ledger.py out/ledger.jsonl --rows 1000000 --extra-columns 20 --anomaly-rate 0.01
+    python benchmarks/ledger.py out/ledger.parquet --rows 1000000
+
+The format follows the file extension (jsonl, json, csv, parquet, xlsx). The
+same --seed always produces the same rows, so timings and results can be
+compared across commits.
+"""
+import argparse
+import csv
+import json
+import random
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Any, Iterator, List
+
+ACCOUNTS = ["1000 Cash", "1200 Accounts Receivable", "1400 Inventory", "2000 Accounts Payable",
+            "2100 Accrued Liabilities", "4000 Revenue", "5000 Cost of Goods Sold", "6100 Rent",
+            "6200 Utilities", "6300 Travel", "6400 Software", "6500 Professional Fees"]
+CURRENCIES = ["USD", "USD", "USD", "EUR", "GBP", "JPY"]
+VENDORS = [f"Vendor {i:03d}" for i in range(250)]
+BASE_COLUMNS = ["id", "date", "account", "vendor", "invoice", "amount", "currency", "memo"]
+# Injected anomaly kinds: negative amounts, 50x spikes, repeated vendor/invoice/amount
+ANOMALY_KINDS = ("negative", "spike", "duplicate")
+
+
+def columns(extra_columns: int = 0) -> List[str]:
+    return BASE_COLUMNS + [f"attr_{i:02d}" for i in range(extra_columns)]
+
+
+def generate_rows(n: int, extra_columns: int = 0, anomaly_rate: float = 0.01, seed: int = 42,
+                  start: date = date(2025, 1, 1)) -> Iterator[Dict[str, Any]]:
+    """Yield n ledger rows; a fraction anomaly_rate carries one of ANOMALY_KINDS."""
+    rng = random.Random(seed)
+    previous = None
+    for i in range(n):
+        vendor = rng.choice(VENDORS)
+        row = {
+            "id": i,
+            "date": (start + timedelta(days=i * 365 // max(n, 1))).isoformat(),
+            "account": rng.choice(ACCOUNTS),
+            "vendor": vendor,
+            "invoice": f"INV-{rng.randrange(10 ** 7):07d}",
+            "amount": round(rng.lognormvariate(5.0, 1.1), 2),
+            "currency": rng.choice(CURRENCIES),
+            "memo": f"{vendor} services batch {rng.randrange(1000)}",
+        }
+        for c in range(extra_columns):
+            row[f"attr_{c:02d}"] = rng.randrange(10 ** 6) if c % 2 else f"tag-{rng.randrange(5000)}"
+        if previous is not None and rng.random() < anomaly_rate:
+            kind = ANOMALY_KINDS[rng.randrange(len(ANOMALY_KINDS))]
+            if kind == "negative":
+                row["amount"] = -row["amount"]
+            elif kind == "spike":
+                row["amount"] = round(row["amount"] * 50, 2)
+            else:
+                row.update(vendor=previous["vendor"], invoice=previous["invoice"], amount=previous["amount"])
+        previous = row
+        yield row
+
+
+def write_ledger(path: Path, rows: Iterator[Dict[str, Any]], fmt: str = "", extra_columns: int = 0) -> Path:
+    """Write rows in the format named by fmt (default: the file extension)."""
+    fmt = fmt or path.suffix.lstrip(".")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    names = columns(extra_columns)
+    if fmt == "jsonl":
+        with path.open("w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    elif fmt == "json":
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(list(rows), f, ensure_ascii=False)
+    elif fmt == "csv":
+        with path.open("w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=names)
+            writer.writeheader()
+            writer.writerows(rows)
+    elif fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        batch: List[Dict[str, Any]] = []
+
+        def flush():
+            nonlocal writer
+            table = pa.Table.from_pylist(batch)
+            if writer is None:
+                writer = pq.ParquetWriter(str(path), table.schema)
+            writer.write_table(table)
+            batch.clear()
+
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= 65536:
+                flush()
+        if batch:
+            flush()
+        if writer is not None:
+            writer.close()
+    elif fmt == "xlsx":
+        import openpyxl
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("ledger")
+        ws.append(names)
+        for row in rows:
+            ws.append([row.get(name) for name in names])
+        wb.save(str(path))
+    else:
+        raise ValueError(f"Unsupported ledger format: {fmt}")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--extra-columns", type=int, default=0)
+    parser.add_argument("--anomaly-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", default="", help="defaults to the file extension")
+    args = parser.parse_args()
+    rows = generate_rows(args.rows, args.extra_columns, args.anomaly_rate, args.seed)
+    write_ledger(args.path, rows, args.format, args.extra_columns)
+    print(f"wrote {args.rows:,} rows to {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Concurrent load test for the dev/API server; reports p50/p99 latency.
+
+Usage:
+    python backend/handler.py            # in another shell
+    python benchmarks/load_test.py --clients 32 --requests 50 --prompt "[Task Status]"
+
+Each client keeps one HTTP/1.1 connection open (keep-alive) and sends its
+requests sequentially, so concurrency equals --clients.
+"""
+import argparse
+import http.client
+import json
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def client_loop(url: str, path: str, body: bytes, count: int, latencies: list, errors: list, lock: threading.Lock):
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=120)
+    headers = {"Content-Type": "application/json"}
+    for _ in range(count):
+        start = time.perf_counter()
+        error = None
+        try:
+            conn.request("POST", path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status >= 400:
+                error = f"http {resp.status}"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            conn.close()
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=120)
+        elapsed = time.perf_counter() - start
+        # one entry per failed request, whether it raised or returned an error status
+        with lock:
+            if error is None:
+                latencies.append(elapsed)
+            elif len(errors) < 1000:
+                errors.append(error)
+    conn.close()
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=50, help="requests per client")
+    parser.add_argument("--prompt", default="[Task Status]")
+    args = parser.parse_args()
+
+    body = json.dumps({"prompt": args.prompt}).encode("utf-8")
+    latencies, errors = [], []
+    lock = threading.Lock()
+    threads = [threading.Thread(target=client_loop, args=(args.url, args.path, body, args.requests, latencies, errors, lock))
+               for _ in range(args.clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    summary = {
+        "clients": args.clients,
+        "requests": args.clients * args.requests,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "throughputRps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50Ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99Ms": round(percentile(latencies, 99) * 1000, 2),
+        "meanMs": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+    print(json.dumps(summary))
+    return 0 if not errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,388 @@
+"""Benchmark suite for the report, API and scheduler hot paths.
+
+Usage:
+    python benchmarks/suite.py run                                  # writes benchmarks/results/<commit>.json
+    python benchmarks/suite.py run --rows 1000000 --only load_input,handler --out new.json
+    python benchmarks/suite.py compare benchmarks/results/1a2b3c4.json new.json --threshold 0.10
+
+Inputs come from benchmarks/ledger.py (deterministic for a given --seed) and
+every store the code under test writes to is redirected to a temp directory.
+Each case runs --repeat times; the JSON result records min/median seconds and
+items/s per case, plus the commit, Python version and which optional
+dependencies were present. compare exits 1 when a case's median regressed by
+more than the threshold.
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from benchmarks.ledger import generate_rows, write_ledger
+
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+OPTIONAL_DEPS = ("numpy", "orjson", "pyarrow", "openpyxl", "zstandard", "boto3")
+# Extra params per report type for handler/route cases (reports that need configuration)
+HANDLER_PARAMS: Dict[str, Dict[str, Any]] = {
+    # a fresh in-memory index per run, so every repetition checks and indexes all rows
+    "duplicate-payments": {"indexPath": ":memory:"},
+    # a trial-balance rollup by account, month and currency with every measure kind
+    "aggregate": {"groupBy": ["account", "date:month as period", "currency"],
+                  "measures": ["count", "sum(amount)", "min(amount)", "max(amount)", "avg(amount)",
+                               "distinct(vendor)", "approx_distinct(invoice)"]},
+}
+
+
+class Bench:
+    def __init__(self, args, workdir: Path):
+        self.args = args
+        self.workdir = workdir
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self._ledgers: Dict[str, Path] = {}
+
+    def ledger(self, fmt: str, rows: int) -> Path:
+        key = f"{fmt}-{rows}"
+        if key not in self._ledgers:
+            path = self.workdir / f"ledger-{rows}.{fmt}"
+            write_ledger(path, generate_rows(rows, self.args.extra_columns, self.args.anomaly_rate, self.args.seed),
+                         fmt, self.args.extra_columns)
+            self._ledgers[key] = path
+        return self._ledgers[key]
+
+    def measure(self, name: str, fn: Callable[[], Any], items: Optional[int] = None,
+                setup: Optional[Callable[[], None]] = None, repeat: Optional[int] = None):
+        runs: List[float] = []
+        for _ in range(repeat or self.args.repeat):
+            if setup:
+                setup()
+            started = time.perf_counter()
+            fn()
+            runs.append(time.perf_counter() - started)
+        best, median = min(runs), statistics.median(runs)
+        entry = {"seconds": best, "median": median, "runs": runs}
+        if items:
+            entry["items"] = items
+            entry["itemsPerSec"] = items / best if best else None
+        self.results[name] = entry
+        rate = f"  {items / best:14,.0f}/s" if items and best else ""
+        print(f"{name:48s} min={best * 1000:10.2f}ms median={median * 1000:10.2f}ms{rate}", flush=True)
+
+
+def bench_load_input(b: Bench):
+    from backend import report_executor
+    formats = ["jsonl", "json", "csv"]
+    if importlib.util.find_spec("pyarrow"):
+        formats.append("parquet")
+    if importlib.util.find_spec("openpyxl"):
+        formats.append("xlsx")
+    for fmt in formats:
+        # XLSX parsing is an order of magnitude slower; keep it to a bounded sample
+        rows = min(b.args.rows, b.args.xlsx_rows) if fmt == "xlsx" else b.args.rows
+        path = b.ledger(fmt, rows)
+        spec = {"source": "local", "format": fmt, "path": str(path)}
+        b.measure(f"load_input.{fmt}", lambda: report_executor.load_input(spec), rows)
+        projected = dict(spec, columns=["amount"])
+        b.measure(f"load_input.{fmt}.projected", lambda: report_executor.load_input(projected), rows)
+
+
+def bench_handlers(b: Bench):
+    from backend import columnar
+    from backend.report_registry import get_registry
+    registry = get_registry()
+    rows = list(generate_rows(b.args.rows, b.args.extra_columns, b.args.anomaly_rate, b.args.seed))
+    for report_type in sorted(registry.list()):
+        params = HANDLER_PARAMS.get(report_type, {})
+        process = registry.get(report_type)
+        stream = registry.get_stream(report_type)
+        if process:
+            b.measure(f"handler.{report_type}.rows", lambda: process({"data": rows, "params": params}), len(rows))
+        if stream:
+            b.measure(f"handler.{report_type}.stream", lambda: stream({"rows": iter(rows), "params": params}), len(rows))
+        handler, mode = registry.resolve(report_type, columnar=columnar.available())
+        if mode == "columnar":
+            schema = registry.columnar_schema(report_type)
+            b.measure(f"handler.{report_type}.columnar",
+                      lambda: handler({"batches": columnar.iter_batches(iter(rows), schema, columnar.DEFAULT_BATCH_SIZE),
+                                       "params": params}), len(rows))
+
+
+def _seed_tasks(n: int, prefix: str = "bench") -> List[Dict[str, Any]]:
+    tasks = []
+    for i in range(n):
+        task = {"taskId": f"{prefix}-{i:05d}", "cron": f"{i % 60} {i % 24} * * *", "enabled": True,
+                "prompt": f"Summarize ledger batch {i}", "outputPath": f"results/{prefix}-{i:05d}-output.txt"}
+        if i % 4 == 0:
+            task["reportEvent"] = {"reportType": "sample-summary", "input": {"path": "resources/ledger.jsonl"}}
+        tasks.append(task)
+    return tasks
+
+
+def bench_routes(b: Bench):
+    from backend import handler
+    from backend.task_store import get_store as get_task_store
+    # point every store the routes touch at the temp directory
+    handler.TASKS_DB_PATH = str(b.workdir / "routes-tasks.db")
+    handler.TASKS_PATH = handler.TASKS_FALLBACK_PATH = str(b.workdir / "routes-tasks.json")
+    handler.SCHEDULER_STATE_PATH = str(b.workdir / "routes-state.json")
+    handler.NOTIFICATIONS_DB_PATH = str(b.workdir / "routes-notifications.db")
+    store = get_task_store(handler.TASKS_DB_PATH)
+    for task in _seed_tasks(b.args.tasks):
+        store.upsert(task)
+    calls = b.args.calls
+
+    def call(prompt: str, n: int):
+        def run():
+            for _ in range(n):
+                resp = handler.lambda_handler({"body": json.dumps({"prompt": prompt})}, None)
+                if resp["statusCode"] != 200:
+                    raise RuntimeError(resp["body"])
+        return run
+
+    b.measure("route.task_status", call("[Task Status]", calls), calls)
+    b.measure("route.task_scheduler", call("[Task Scheduler] cron=*/5 * * * * Summarize payables", calls), calls)
+    rows = min(b.args.rows, b.args.report_rows)
+    event = {"reportType": "sample-summary", "taskId": "bench-route",
+             "input": {"source": "local", "format": "jsonl", "path": str(b.ledger("jsonl", rows))},
+             "output": {"target": "local", "path": str(b.workdir / "route-report.json")}}
+    b.measure("route.run_report", call("[Run Report] " + json.dumps(dict(event, force=True)), 1), rows)
+    b.measure("route.run_report.cached", call("[Run Report] " + json.dumps(event), calls), calls)
+
+
+def bench_notifications(b: Bench):
+    from backend.notification_store import get_store
+    store = get_store(str(b.workdir / "bench-notifications.db"))
+    n = b.args.notifications
+
+    def message(i: int) -> Dict[str, Any]:
+        return {"timestamp": "2025-01-01T00:00:00Z", "taskId": f"bench-{i % 50:05d}", "ok": True,
+                "message": f"Task bench-{i % 50:05d} completed", "outputPath": f"results/bench-{i}.txt"}
+
+    def sequential():
+        for i in range(n):
+            store.append(message(i))
+
+    def threaded(threads: int = 8):
+        def worker(offset: int):
+            for i in range(offset, n, threads):
+                store.append(message(i))
+        pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+
+    b.measure("notifications.append", sequential, n)
+    b.measure("notifications.append.8_threads", threaded, n)
+    b.measure("notifications.query", lambda: store.query(task_id="bench-00007", limit=100), 1)
+
+
+def bench_scheduler(b: Bench):
+    from apscheduler.schedulers.blocking import BlockingScheduler
+    from backend.task_store import get_store as get_task_store
+    from scripts import local_scheduler
+    local_scheduler.STATE_PATH = b.workdir / "scheduler_state.json"
+    local_scheduler.logger.setLevel(logging.WARNING)
+    n = b.args.tasks
+    store = get_task_store(str(b.workdir / "scheduler-tasks.db"))
+    for task in _seed_tasks(n, prefix="sched"):
+        store.upsert(task)
+    tasks_json = str(b.workdir / "scheduler-tasks.json")
+    store.export_json(tasks_json)
+    store.sync_json(tasks_json)
+
+    b.measure(f"scheduler.initial_load.{n}",
+              lambda: local_scheduler.schedule_tasks(BlockingScheduler(timezone="UTC"), store.list(), {}, full=True), n)
+
+    scheduler = BlockingScheduler(timezone="UTC")
+    jobs_index: Dict[str, Dict[str, Any]] = {}
+    local_scheduler.schedule_tasks(scheduler, store.list(), jobs_index, full=True)
+    state = {"version": store.version(), "round": 0}
+
+    def reload():
+        # mirrors local_scheduler.main().reload_tasks
+        store.sync_json(tasks_json)
+        new_version, changed, deleted = store.changes_since(state["version"])
+        if new_version != state["version"]:
+            state["version"] = new_version
+            local_scheduler.schedule_tasks(scheduler, changed, jobs_index, removed=deleted)
+
+    def edit_one_percent():
+        state["round"] += 1
+        for task in store.list()[: max(1, n // 100)]:
+            store.upsert(dict(task, prompt=f"{task['prompt']} (rev {state['round']})"))
+
+    b.measure(f"scheduler.reload_idle.{n}", reload, n)
+    b.measure(f"scheduler.reload_1pct_changed.{n}", reload, n, setup=edit_one_percent)
+
+
+def bench_cold_start(b: Bench):
+    from benchmarks.bench_cold_start import run_once
+    # one fresh interpreter per run; import time is what a new Lambda container pays
+    for name, prompt in (("task_status", "[Task Status]"), ("task_scheduler", "[Task Scheduler] cron=*/5 * * * * ping")):
+        imports: List[float] = []
+        b.measure(f"cold_start.{name}", lambda: imports.append(run_once(prompt, str(b.workdir))["importMs"]))
+        b.results[f"cold_start.{name}"]["importMs"] = statistics.median(imports)
+
+
+def bench_retrieval(b: Bench):
+    from backend import handler
+    from backend.retrieval import RetrievalIndex
+    data = b.ledger("csv", min(b.args.rows, b.args.retrieval_rows)).read_bytes()
+    edited = data + b"INV-9999999,appended correction\n"
+    builds = {"n": 0}
+    index = RetrievalIndex(str(b.workdir / "retrieval.db"))
+    chunks = index.index_bytes("UserStorage/ledger.csv", data)["chunks"]
+
+    def build():
+        builds["n"] += 1
+        RetrievalIndex(str(b.workdir / f"retrieval-build-{builds['n']}.db")).index_bytes("UserStorage/ledger.csv", data)
+
+    def reindex(content: bytes):
+        return lambda: index.index_bytes("UserStorage/ledger.csv", content)
+
+    accounts = ("Travel", "Rent", "Software", "Utilities")
+    queries = [f"Vendor {i % 250:03d} {accounts[i % 4]} invoice INV-{i * 7919 % 10 ** 7:07d} amount"
+               for i in range(b.args.calls)]
+
+    def search():
+        for q in queries:
+            index.search(q, ["UserStorage/ledger.csv"], top_k=5, token_budget=1500)
+
+    b.measure("retrieval.index", build, chunks)
+    b.measure("retrieval.index.unchanged", reindex(data), chunks)
+    # the edit only changes the last chunk; every other chunk is reused by content hash
+    b.measure("retrieval.index.edited", reindex(edited), chunks, setup=reindex(data))
+    b.measure("retrieval.search", search, len(queries))
+
+    # end to end: attachment lookup, search and prompt assembly as the model route does it
+    handler.RETRIEVAL_DB_PATH = str(b.workdir / "retrieval.db")
+    handler.USER_STORAGE_DIR = str(b.workdir / "UserStorage")
+    os.makedirs(handler.USER_STORAGE_DIR, exist_ok=True)
+    (b.workdir / "UserStorage" / "ledger.csv").write_bytes(data)
+    attachments = [{"name": "ledger.csv", "path": str(b.workdir / "UserStorage" / "ledger.csv")}]
+    handler._retrieve_context(queries[0], attachments)  # indexes the file under its attachment key
+    b.measure("retrieval.prompt_context", lambda: [handler._retrieve_context(q, attachments) for q in queries],
+              len(queries))
+
+
+GROUPS: Dict[str, Callable[[Bench], None]] = {
+    "load_input": bench_load_input,
+    "handler": bench_handlers,
+    "route": bench_routes,
+    "notifications": bench_notifications,
+    "scheduler": bench_scheduler,
+    "cold_start": bench_cold_start,
+    "retrieval": bench_retrieval,
+}
+
+
+def _git(*argv: str) -> str:
+    try:
+        return subprocess.run(["git", *argv], cwd=REPO_ROOT, capture_output=True, text=True, timeout=30).stdout.strip()
+    except Exception:
+        return ""
+
+
+def _meta(args) -> Dict[str, Any]:
+    commit = _git("rev-parse", "--short", "HEAD") or "unknown"
+    return {
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "deps": {name: bool(importlib.util.find_spec(name)) for name in OPTIONAL_DEPS},
+        "args": {k: v for k, v in vars(args).items() if k not in ("func", "out")},
+    }
+
+
+def run(args) -> int:
+    groups = [g.strip() for g in args.only.split(",")] if args.only else list(GROUPS)
+    unknown = [g for g in groups if g not in GROUPS]
+    if unknown:
+        print(f"unknown group(s): {', '.join(unknown)}; choose from {', '.join(GROUPS)}")
+        return 2
+    with tempfile.TemporaryDirectory(prefix="aiaccount-bench-") as tmp:
+        workdir = Path(tmp)
+        # caches and checkpoints written by the executor stay inside the temp directory
+        os.environ["REPORT_CACHE_DIR"] = str(workdir / "report-cache")
+        os.environ["REPORT_CHECKPOINT_DIR"] = str(workdir / "checkpoints")
+        os.environ["DUPLICATE_INDEX_DIR"] = str(workdir / "duplicate-index")
+        bench = Bench(args, workdir)
+        for group in groups:
+            GROUPS[group](bench)
+    meta = _meta(args)
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{meta['commit']}{'-dirty' if meta['dirty'] else ''}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with out.open("w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": bench.results}, f, indent=2)
+    print(f"results written to {out}")
+    return 0
+
+
+def compare(args) -> int:
+    with open(args.base, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"base {base['meta'].get('commit')}  ->  new {new['meta'].get('commit')}  (median, threshold {args.threshold:.0%})")
+    regressions = 0
+    for name in sorted(set(base["results"]) | set(new["results"])):
+        old, cur = base["results"].get(name), new["results"].get(name)
+        if not old or not cur:
+            print(f"{name:48s} {'only in base' if old else 'only in new'}")
+            continue
+        change = (cur["median"] - old["median"]) / old["median"] if old["median"] else 0.0
+        # sub-millisecond cases are dominated by noise
+        slower = change > args.threshold and old["median"] >= args.min_seconds
+        regressions += slower
+        flag = "  REGRESSION" if slower else ""
+        print(f"{name:48s} {old['median'] * 1000:10.2f}ms -> {cur['median'] * 1000:10.2f}ms  {change:+7.1%}{flag}")
+    print(f"{regressions} regression(s)")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_run = sub.add_parser("run", help="run the suite and write JSON results")
+    p_run.add_argument("--only", default="", help=f"comma-separated groups: {','.join(GROUPS)}")
+    p_run.add_argument("--rows", type=int, default=100_000)
+    p_run.add_argument("--extra-columns", type=int, default=12)
+    p_run.add_argument("--anomaly-rate", type=float, default=0.01)
+    p_run.add_argument("--seed", type=int, default=42)
+    p_run.add_argument("--xlsx-rows", type=int, default=5_000, help="row cap for the xlsx input")
+    p_run.add_argument("--report-rows", type=int, default=50_000, help="row cap for the [Run Report] route")
+    p_run.add_argument("--tasks", type=int, default=1000, help="tasks in the store for route/scheduler cases")
+    p_run.add_argument("--calls", type=int, default=200, help="requests per route case")
+    p_run.add_argument("--notifications", type=int, default=2000)
+    p_run.add_argument("--retrieval-rows", type=int, default=20_000, help="row cap for the retrieval corpus")
+    p_run.add_argument("--repeat", type=int, default=3)
+    p_run.add_argument("--out", default="", help="defaults to benchmarks/results/<commit>.json")
+    p_run.set_defaults(func=run)
+    p_cmp = sub.add_parser("compare", help="compare two result files")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("new")
+    p_cmp.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown of the median (0.10 = 10%%)")
+    p_cmp.add_argument("--min-seconds", type=float, default=0.001)
+    p_cmp.set_defaults(func=compare)
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
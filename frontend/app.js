@@ -30,6 +30,60 @@ function appendMessage(role, text, isMarkdown=false){
   wrap.appendChild(r); wrap.appendChild(bubble)
   $messages.appendChild(wrap)
   $messages.scrollTop = $messages.scrollHeight
+  return bubble
+}
+
+// files uploaded in this session, sent with every prompt ({name, path})
+const attachments = []
+
+// Stream the reply from /chat/stream (server-sent events) so tokens show as they arrive.
+// Returns false when streaming is unavailable, so the caller falls back to the JSON API.
+async function streamPrompt(text){
+  if (window.__STREAM__ === false || !window.TextDecoder) return false
+  let res
+  try{
+    res = await fetch(apiBase+'/chat/stream', { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ prompt: text, attachments }) })
+  }catch(e){ return false }
+  if (!res.ok || !res.body || !res.body.getReader) return false
+  const reader = res.body.getReader()
+  const decoder = new TextDecoder('utf-8')
+  const bubble = appendMessage('Agent', '')
+  let buf = '', reply = '', error = ''
+  const handle = (frame)=>{
+    let name = 'message', data = ''
+    for (const line of frame.split('\n')){
+      if (line.startsWith('event:')) name = line.slice(6).trim()
+      else if (line.startsWith('data:')) data += line.slice(5).replace(/^ /, '')
+    }
+    if (!data) return
+    const msg = JSON.parse(data)
+    if (name === 'token'){
+      reply += msg.text || ''
+      bubble.textContent = reply
+    } else if (name === 'done'){
+      const md = (msg.markdown || (msg.model_response ? '``' + msg.model_response + '``' : '``' + JSON.stringify(msg) + '``'))
+        + (error ? '\n\nʧ: ' + error : '')
+      if (window.marked){ bubble.innerHTML = window.marked.parse(md) } else { bubble.textContent = md }
+    } else if (name === 'error'){
+      error = msg.error || ''
+      bubble.textContent = reply + '\nʧ: ' + error
+    }
+    $messages.scrollTop = $messages.scrollHeight
+  }
+  try{
+    for (;;){
+      const { value, done } = await reader.read()
+      if (done) break
+      buf += decoder.decode(value, { stream: true })
+      let i
+      while ((i = buf.indexOf('\n\n')) >= 0){
+        handle(buf.slice(0, i))
+        buf = buf.slice(i + 2)
+      }
+    }
+    if (buf.trim()) handle(buf)
+  }catch(e){ bubble.textContent = reply + '\nʧ: ' + e }
+  return true
 }
 
 async function sendPrompt(){
@@ -37,8 +91,9 @@ async function sendPrompt(){
   if (!text) return
   appendMessage('You', text)
   $prompt.value=''
+  if (await streamPrompt(text)) return
   try{
-    const res = await fetch(apiBase+'/', { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ prompt: text }) })
+    const res = await fetch(apiBase+'/', { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ prompt: text, attachments }) })
     const data = await res.json()
     const md = data.markdown || (data.model_response ? '``' + data.model_response + '``' : '``' + JSON.stringify(data) + '``')
     appendMessage('Agent', md, true)
@@ -67,6 +122,8 @@ async function upload(){
   try{
     const res = await fetch(apiBase+'/upload', { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ filename: f.name, contentBase64: b64 }) })
     const data = await res.json()
+    // later prompts carry the upload so the backend can retrieve from it
+    if (data.path) attachments.push({ name: f.name, path: data.path })
     const md = data.markdown || ('ϴɹ: '+ (data.path||''))
     if ($uploadResult){
       $uploadResult.innerHTML = window.marked ? window.marked.parse(md) : md
@@ -1,11 +1,19 @@
+import contextvars
 import os
 import sys
 import json
+import hashlib
+import signal
 import logging
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
+from apscheduler.executors.pool import ThreadPoolExecutor as JobDispatchExecutor
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
 
@@ -16,8 +24,11 @@ if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
 # Import backend Bedrock caller and report executor
-from backend.handler import call_bedrock
-from backend.report_executor import execute as execute_report
+from backend import metrics
+from backend.handler import as_bool, call_bedrock, inflight_calls, response_cache
+from backend.report_executor import execute as execute_report, process_context
+from backend.notification_store import get_store as get_notification_store
+from backend.task_store import get_store as get_task_store, read_tasks_json
 
 logger = logging.getLogger("scheduler")
 logger.setLevel(logging.INFO)
@@ -26,7 +37,15 @@ _handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message
 logger.addHandler(_handler)
 
 STATE_PATH = REPO_ROOT / "resources" / "scheduler_state.json"
-NOTIFY_PATH = REPO_ROOT / "resources" / "notifications.json"
+TASKS_DB_PATH = REPO_ROOT / "resources" / "tasks.db"
+# Seconds between change checks; each check is one version lookup plus a stat() of tasks.json
+POLL_SECONDS = int(os.environ.get("TASK_POLL_SECONDS", "5"))
+NOTIFY_DB_PATH = REPO_ROOT / "resources" / "notifications.db"
+# Worker pools: I/O-bound prompt tasks run on threads, CPU-heavy reports in processes
+THREAD_WORKERS = int(os.environ.get("SCHED_THREAD_WORKERS", "10"))
+PROCESS_WORKERS = int(os.environ.get("SCHED_PROCESS_WORKERS", str(os.cpu_count() or 2)))
+# Default per-task timeout in seconds (0 = none); tasks override with "timeoutSeconds"
+DEFAULT_TIMEOUT = float(os.environ.get("SCHED_DEFAULT_TIMEOUT", "0"))
 
 
 def repo_root() -> Path:
@@ -42,30 +61,14 @@ def find_tasks_file() -> Path:
     return candidates[1]
 
 
-def _read_json_with_fallback(p: Path) -> Any:
-    encodings = ["utf-8", "utf-8-sig", "cp936", "gbk", "latin-1"]
-    last_err = None
-    for enc in encodings:
-        try:
-            with p.open("r", encoding=enc) as f:
-                return json.load(f)
-        except Exception as e:
-            last_err = e
-    raise last_err
-
-
 def load_tasks(tasks_path: Path) -> list:
     if not tasks_path.exists():
         return []
     try:
-        tasks = _read_json_with_fallback(tasks_path)
+        return read_tasks_json(str(tasks_path))
     except Exception:
         logger.exception("Failed to read tasks.json with encoding fallbacks: %s", tasks_path)
         return []
-    if not isinstance(tasks, list):
-        logger.warning("tasks.json is not a JSON array: %s", tasks_path)
-        return []
-    return tasks
 
 
 def ensure_parent_dir(file_path: Path):
@@ -83,44 +86,164 @@ def write_state(jobs: Dict[str, Dict[str, Any]]):
 
 def append_notification(message: Dict[str, Any]):
     try:
-        ensure_parent_dir(NOTIFY_PATH)
-        existing = []
-        if NOTIFY_PATH.exists():
-            with NOTIFY_PATH.open("r", encoding="utf-8") as f:
-                try:
-                    existing = json.load(f) or []
-                except Exception:
-                    existing = []
-        existing.append(message)
-        with NOTIFY_PATH.open("w", encoding="utf-8") as f:
-            json.dump(existing, f, ensure_ascii=False, indent=2)
+        get_notification_store(str(NOTIFY_DB_PATH)).append(message)
     except Exception:
         logger.exception("Failed to append notification")
 
 
-def run_task(task: dict):
-    task_id = task.get("taskId", "unknown")
-    prompt = task.get("prompt")
-    output_path = task.get("outputPath", f"results/{task_id}-output.txt")
-    report_event = task.get("reportEvent")
+class _ReportDeadline(BaseException):
+    # a BaseException so `except Exception` in report code cannot swallow the deadline
+    pass
 
-    logger.info("Running task %s", task_id)
 
-    if report_event and isinstance(report_event, dict):
+def _report_worker(evt: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+    """Runs in a process-pool worker. On POSIX a timer signal interrupts the report
+    at the deadline so the worker is freed for the next task."""
+    use_alarm = bool(timeout) and hasattr(signal, "setitimer")
+    if use_alarm:
+        def _expired(signum, frame):
+            raise _ReportDeadline()
+        signal.signal(signal.SIGALRM, _expired)
+        # keeps firing after the deadline, so one signal lost in a cleanup block cannot disable it
+        signal.setitimer(signal.ITIMER_REAL, timeout, min(timeout, 1.0))
+    try:
         try:
+            return execute_report(evt)
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except _ReportDeadline:
+        raise TimeoutError(f"report exceeded {timeout}s") from None
+
+
+def _prompt_worker(task: Dict[str, Any]) -> Dict[str, Any]:
+    # tasks can opt out of the response cache with "cache": false
+    return call_bedrock(task.get("prompt") or "Hello from AI Accounting Agent",
+                        cache=as_bool(task.get("cache"), True), cache_ttl=task.get("cacheTtlSeconds"))
+
+
+def _timeout_seconds(task: Dict[str, Any]) -> Optional[float]:
+    # hand-edited tasks.json may carry "30"; unparseable values fall back to the default
+    try:
+        timeout = float(task.get("timeoutSeconds", DEFAULT_TIMEOUT) or 0)
+    except (TypeError, ValueError):
+        timeout = DEFAULT_TIMEOUT
+    return timeout if timeout > 0 else None
+
+
+class TaskPools:
+    """Thread and process pools that task bodies are dispatched to.
+
+    APScheduler only fires jobs; run_task submits the body to the pool chosen by
+    the task ("executor": "thread" | "process") and waits up to timeoutSeconds.
+    Timed-out futures are cancelled if still queued; a running report is
+    interrupted inside its worker (POSIX), a running prompt call is abandoned and
+    finishes in the background bounded by its HTTP timeout.
+    """
+
+    def __init__(self, thread_workers: int = THREAD_WORKERS, process_workers: int = PROCESS_WORKERS):
+        self.sizes = {"thread": max(1, thread_workers), "process": max(1, process_workers)}
+        self._pools: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._stats = {name: {"inFlight": 0, "completed": 0, "timedOut": 0, "failed": 0} for name in self.sizes}
+
+    def _pool(self, name: str):
+        with self._lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                if name == "process":
+                    # created from a scheduler thread: forkserver/spawn, never a plain fork
+                    pool = ProcessPoolExecutor(max_workers=self.sizes[name], mp_context=process_context())
+                else:
+                    pool = ThreadPoolExecutor(max_workers=self.sizes[name], thread_name_prefix="task")
+                self._pools[name] = pool
+            return pool
+
+    def _reset(self, name: str):
+        with self._lock:
+            pool = self._pools.pop(name, None)
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def pool_for(task: Dict[str, Any]) -> str:
+        choice = task.get("executor")
+        if choice in ("thread", "process"):
+            return choice
+        return "process" if isinstance(task.get("reportEvent"), dict) else "thread"
+
+    def run(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        task_id = task.get("taskId", "unknown")
+        name = self.pool_for(task)
+        timeout = _timeout_seconds(task)
+        report_event = task.get("reportEvent")
+        if isinstance(report_event, dict):
             evt = dict(report_event)
             evt["taskId"] = task_id
-            result = execute_report(evt)
-        except Exception as e:
-            logger.exception("Task %s report execution failed: %s", task_id, e)
-            result = {"ok": False, "error": str(e)}
-    else:
-        # default to Bedrock prompt flow
+            fn, args = (_report_worker, (evt, timeout)) if name == "process" else (execute_report, (evt,))
+        else:
+            fn, args = _prompt_worker, (task,)
+
+        stats = self._stats[name]
+        with self._lock:
+            stats["inFlight"] += 1
+            queued = max(0, stats["inFlight"] - self.sizes[name])
+        started = time.perf_counter()
         try:
-            result = call_bedrock(prompt or "Hello from AI Accounting Agent")
+            if name == "thread":
+                # run in a copy of this context so spans land in run_task's trace
+                future = self._pool(name).submit(contextvars.copy_context().run, fn, *args)
+            else:
+                future = self._pool(name).submit(fn, *args)
+            result = future.result(timeout=timeout)
+            if name == "process":
+                # the worker process traced execute(); fold its figures into this process
+                metrics.merge(result.get("trace"))
+            outcome = "completed"
+        except FutureTimeout:
+            future.cancel()
+            result = {"ok": False, "error": f"Task timed out after {timeout}s", "timedOut": True}
+            outcome = "timedOut"
+        except TimeoutError as e:
+            result = {"ok": False, "error": str(e), "timedOut": True}
+            outcome = "timedOut"
+        except BrokenProcessPool as e:
+            logger.exception("Process pool broke while running task %s; recreating it", task_id)
+            self._reset(name)
+            result = {"ok": False, "error": str(e)}
+            outcome = "failed"
         except Exception as e:
-            logger.exception("Task %s failed to call bedrock: %s", task_id, e)
-            result = {"ok": False, "error": str(e), "model_response": f"(mock) error: {e}"}
+            logger.exception("Task %s failed: %s", task_id, e)
+            result = {"ok": False, "error": str(e)}
+            outcome = "failed"
+        duration = time.perf_counter() - started
+        with self._lock:
+            stats["inFlight"] -= 1
+            stats[outcome] += 1
+            in_flight = stats["inFlight"]
+        logger.info("pool=%s task=%s outcome=%s duration=%.3fs queued_at_submit=%d in_flight=%d/%d",
+                    name, task_id, outcome, duration, queued, in_flight, self.sizes[name])
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: dict(st) for name, st in self._stats.items()}
+
+    def shutdown(self):
+        for name in list(self._pools):
+            self._reset(name)
+
+
+pools = TaskPools()
+
+
+def run_task(task: dict):
+    task_id = task.get("taskId", "unknown")
+    output_path = task.get("outputPath", f"results/{task_id}-output.txt")
+
+    logger.info("Running task %s", task_id)
+    with metrics.trace() as trace, metrics.span("task.run"):
+        result = pools.run(task)
 
     # Persist output
     try:
@@ -133,6 +256,8 @@ def run_task(task: dict):
             "ok": bool(result.get("ok")),
             "response": result,
         }
+        if trace is not None:
+            line["trace"] = trace.as_dict()
         with dest.open("a", encoding="utf-8") as f:
             f.write(json.dumps(line, ensure_ascii=False) + "\n")
         logger.info("Task %s wrote output to %s", task_id, dest)
@@ -148,62 +273,124 @@ def run_task(task: dict):
     })
 
 
-def schedule_tasks(scheduler: BlockingScheduler, tasks: list, jobs_index: Dict[str, Dict[str, Any]]):
-    enabled = 0
+def task_hash(task: Dict[str, Any]) -> str:
+    """Content hash of a task definition; any edit (cron, prompt, reportEvent, ...) changes it."""
+    return hashlib.sha256(json.dumps(task, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def _unschedule(scheduler: BlockingScheduler, task_id: str, jobs_index: Dict[str, Dict[str, Any]], reason: str) -> bool:
+    if task_id not in jobs_index:
+        return False
+    try:
+        scheduler.remove_job(task_id)
+    except Exception:
+        pass
+    del jobs_index[task_id]
+    logger.info("Unscheduled task %s (%s)", task_id, reason)
+    return True
+
+
+def schedule_tasks(scheduler: BlockingScheduler, tasks: list, jobs_index: Dict[str, Dict[str, Any]],
+                   removed: Optional[list] = None, full: bool = False) -> bool:
+    """Reconcile scheduler jobs with task definitions.
+
+    `tasks` may be only the changed tasks; `removed` lists deleted task ids.
+    With full=True, `tasks` is the complete set and jobs missing from it are
+    removed. Only jobs whose content hash changed are touched, and the state
+    file is written only when something changed. Returns whether it did.
+    """
+    changed = False
+    seen = set()
     for task in tasks:
         if not isinstance(task, dict):
             continue
-        if not task.get("enabled", False):
+        task_id = str(task.get("taskId") or "")
+        if not task_id:
             continue
+        seen.add(task_id)
         cron_expr = task.get("cron")
-        task_id = str(task.get("taskId"))
-        if not cron_expr or not task_id:
+        if not task.get("enabled", False) or not cron_expr:
+            changed |= _unschedule(scheduler, task_id, jobs_index, "disabled")
+            continue
+        digest = task_hash(task)
+        current = jobs_index.get(task_id)
+        if current and current.get("hash") == digest:
             continue
-        if task_id not in jobs_index:
-            try:
-                trigger = CronTrigger.from_crontab(cron_expr)
+        try:
+            trigger = CronTrigger.from_crontab(cron_expr)
+        except Exception:
+            logger.exception("Failed to schedule task %s with cron '%s'", task_id, cron_expr)
+            changed |= _unschedule(scheduler, task_id, jobs_index, "invalid cron")
+            continue
+        try:
+            if current is None:
                 scheduler.add_job(run_task, trigger, args=[task], id=task_id, replace_existing=True, max_instances=1)
-                jobs_index[task_id] = {"cron": cron_expr, "enabled": True}
                 logger.info("Scheduled new task %s with cron '%s' (UTC)", task_id, cron_expr)
-                enabled += 1
-            except Exception:
-                logger.exception("Failed to schedule task %s with cron '%s'", task_id, cron_expr)
-        else:
-            if jobs_index[task_id].get("cron") != cron_expr:
-                try:
-                    scheduler.remove_job(task_id)
-                except Exception:
-                    pass
-                try:
-                    trigger = CronTrigger.from_crontab(cron_expr)
-                    scheduler.add_job(run_task, trigger, args=[task], id=task_id, replace_existing=True, max_instances=1)
-                    jobs_index[task_id] = {"cron": cron_expr, "enabled": True}
-                    logger.info("Updated task %s to cron '%s'", task_id, cron_expr)
-                except Exception:
-                    logger.exception("Failed to update task %s", task_id)
-    write_state(jobs_index)
-    if enabled == 0:
-        logger.info("No new tasks scheduled in this cycle")
+            elif current.get("cron") != cron_expr:
+                scheduler.modify_job(task_id, args=[task])
+                scheduler.reschedule_job(task_id, trigger=trigger)
+                logger.info("Updated task %s to cron '%s'", task_id, cron_expr)
+            else:
+                # same schedule, new definition: rebind args so the next run sees the edit
+                scheduler.modify_job(task_id, args=[task])
+                logger.info("Updated task %s definition", task_id)
+        except Exception:
+            logger.exception("Failed to apply task %s", task_id)
+            continue
+        jobs_index[task_id] = {"cron": cron_expr, "enabled": True, "hash": digest}
+        changed = True
+
+    for task_id in removed or ():
+        changed |= _unschedule(scheduler, str(task_id), jobs_index, "deleted")
+    if full:
+        for task_id in [tid for tid in jobs_index if tid not in seen]:
+            changed |= _unschedule(scheduler, task_id, jobs_index, "no longer defined")
+
+    if changed:
+        write_state(jobs_index)
+    else:
+        logger.info("No task changes in this cycle")
+    return changed
 
 
 def main():
     tasks_path = find_tasks_file()
-    scheduler = BlockingScheduler(timezone="UTC")
+    store = get_task_store(str(TASKS_DB_PATH))
+    # APScheduler threads only dispatch and wait, so size them to cover both pools
+    dispatchers = JobDispatchExecutor(max_workers=pools.sizes["thread"] + pools.sizes["process"] + 1)
+    scheduler = BlockingScheduler(timezone="UTC", executors={"default": dispatchers})
     jobs_index: Dict[str, Dict[str, Any]] = {}
 
-    tasks = load_tasks(tasks_path)
-    schedule_tasks(scheduler, tasks, jobs_index)
+    try:
+        store.sync_json(str(tasks_path))
+    except Exception:
+        logger.exception("Failed to import %s into the task store", tasks_path)
+    version = store.version()
+    if not schedule_tasks(scheduler, store.list(), jobs_index, full=True):
+        write_state(jobs_index)  # replace any state left over from a previous run
 
     def reload_tasks():
-        new_tasks = load_tasks(tasks_path)
-        schedule_tasks(scheduler, new_tasks, jobs_index)
-
-    scheduler.add_job(reload_tasks, "interval", seconds=30, id="__reload__", replace_existing=True)
+        nonlocal version
+        try:
+            store.sync_json(str(tasks_path))
+        except Exception:
+            logger.exception("Failed to import %s into the task store", tasks_path)
+        new_version, changed, deleted = store.changes_since(version)
+        if new_version == version:
+            return
+        logger.info("Task store v%s -> v%s: %d changed, %d deleted", version, new_version, len(changed), len(deleted))
+        version = new_version
+        schedule_tasks(scheduler, changed, jobs_index, removed=deleted)
+        logger.info("Response cache stats: %s; coalescing: %s; pools: %s", response_cache.stats(), inflight_calls.stats(), pools.stats())
+
+    scheduler.add_job(reload_tasks, "interval", seconds=POLL_SECONDS, id="__reload__", replace_existing=True)
     logger.info("Local scheduler started (timezone=UTC). Press Ctrl+C to stop.")
     try:
         scheduler.start()
     except (KeyboardInterrupt, SystemExit):
         logger.info("Scheduler stopped.")
+    finally:
+        pools.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,89 @@
+import argparse
+import json
+import re
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Local stand-in for the Bedrock runtime endpoint, for trying the streaming UI and
+# measuring time-to-first-token without AWS access:
+#
+#   python scripts/mock_bedrock_server.py --port 8001 --delay-ms 40
+#   BEDROCK_ENDPOINT_URL=http://localhost:8001 AWS_BEARER_TOKEN_BEDROCK=dummy python backend/handler.py
+#
+# POST /model/<id>/invoke returns the whole reply; .../invoke-with-response-stream
+# sends it word by word as event-stream "chunk" frames.
+
+CURRENT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = CURRENT_DIR.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from backend.eventstream import encode_chunk
+
+
+def _reply(payload: dict) -> str:
+    messages = payload.get("messages") or [{}]
+    prompt = messages[-1].get("content", "")
+    return f"(mock bedrock) you said: {prompt}"
+
+
+class MockBedrockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    delay = 0.04
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("content-length", 0)))
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            payload = {}
+        if self.path.endswith("/invoke-with-response-stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, word in enumerate(re.findall(r"\S+\s*|\s+", _reply(payload))):
+                if i:
+                    time.sleep(self.delay)
+                frame = encode_chunk({"choices": [{"delta": {"content": word}}]})
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(frame), frame))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        elif self.path.endswith("/invoke"):
+            out = json.dumps({"choices": [{"message": {"content": _reply(payload)}}]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Bedrock runtime endpoint (invoke and response streams).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay-ms", type=float, default=40.0, help="pause between streamed words")
+    args = parser.parse_args(argv)
+    MockBedrockHandler.delay = args.delay_ms / 1000.0
+    server = ThreadingHTTPServer((args.host, args.port), MockBedrockHandler)
+    print(f"Mock Bedrock listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.reports import aggregate
+
+
+def _rows():
+    # XLSX/Parquet-style cells: date and datetime keys, Decimal codes
+    start = date(2024, 1, 1)
+    for i in range(400):
+        day = start + timedelta(days=i % 60)
+        yield {"date": day if i % 2 else datetime(day.year, day.month, day.day, 9, 30),
+               "account": Decimal(1000 + i % 7), "vendor": f"V{i % 11}", "amount": i % 13 + 0.5}
+
+
+def _groups(max_groups):
+    params = {"groupBy": ["date", "date:month", "account"],
+              "measures": ["count", "sum(amount)", "distinct(vendor)", "distinct(date)"],
+              "maxGroups": max_groups, "partitions": 3}
+    return aggregate.process_stream({"rows": _rows(), "params": params})
+
+
+def test_spilled_result_matches_in_memory_result():
+    in_memory, spilled = _groups(100000), _groups(5)
+    assert in_memory["metrics"]["spills"] == 0
+    assert spilled["metrics"]["spills"] > 0
+    assert spilled["data"] == in_memory["data"]
+
+
+def test_incremental_state_with_date_keys_resumes():
+    params = {"groupBy": ["date:quarter", "date"], "measures": ["count"]}
+    rows = list(_rows())
+    first = aggregate.process_stream({"rows": iter(rows[:150]), "params": params, "state": None})
+    # the executor keeps state in checkpoint JSON between runs
+    state = json.loads(json.dumps(first["state"]))
+    second = aggregate.process_stream({"rows": iter(rows[150:]), "params": params, "state": state})
+    whole = aggregate.process_stream({"rows": iter(rows), "params": params})
+    assert second["data"] == whole["data"]
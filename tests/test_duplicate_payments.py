@@ -0,0 +1,43 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.reports import duplicate_payments
+
+
+def _run(rows, tmp_path):
+    params = {"indexPath": str(tmp_path / "index.db")}
+    return duplicate_payments.process_stream({"rows": iter(rows), "params": params})
+
+
+def test_sequential_invoices_are_not_duplicates(tmp_path):
+    rows = [{"id": i, "vendor": "Acme", "invoice": f"INV-{10000 + i}", "amount": 100 + i,
+             "date": f"2024-{1 + i // 28 % 12:02d}-{1 + i % 28:02d}"} for i in range(200)]
+    metrics = _run(rows, tmp_path)["metrics"]
+    assert metrics["count"] == 0
+    assert metrics["invoice"] == 0
+
+
+def test_mistyped_invoice_with_same_amount_is_flagged(tmp_path):
+    rows = [{"id": 1, "vendor": "Acme", "invoice": "INV-10042", "amount": 250, "date": "2024-01-05"},
+            {"id": 2, "vendor": "Acme", "invoice": "INV-10024", "amount": 250, "date": "2024-03-20"}]
+    result = _run(rows, tmp_path)
+    assert result["metrics"]["invoice"] == 1
+    assert result["data"]["duplicates"][0]["kind"] == "invoice"
+
+
+def test_reused_ids_in_a_later_file_are_still_checked(tmp_path):
+    january = [{"id": i, "vendor": "Acme", "invoice": f"INV-{20000 + i}", "amount": 500 + i,
+                "date": f"2024-01-{1 + i % 28:02d}"} for i in range(50)]
+    assert _run(january, tmp_path)["metrics"]["indexed"] == 50
+    # the next export numbers its rows from 0 again; row 5 pays a January invoice a second time
+    february = [{"id": i, "vendor": "Globex", "invoice": f"GX-{30000 + i}", "amount": 900 + i,
+                 "date": f"2024-02-{1 + i % 28:02d}"} for i in range(50)]
+    february[5] = dict(january[7], id=5, date="2024-02-20")
+    metrics = _run(february, tmp_path)["metrics"]
+    assert metrics["known"] == 0
+    assert metrics["indexed"] == 50
+    assert metrics["exact"] == 1
+    # re-running the same export finds nothing new
+    assert _run(february, tmp_path)["metrics"]["known"] == 50